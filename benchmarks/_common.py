@@ -0,0 +1,182 @@
+"""Shared helpers for the FreeDS micro-benchmarks"""
+
+# The benchmarks exercise the parsing/decoding modules of the integration,
+# which don't depend on Home Assistant. Importing them as
+# "custom_components.freeds.*" would run the package's __init__.py (and
+# thus import homeassistant), so the package directory is registered as a
+# bare "freeds" package instead. Relative imports between modules keep working.
+
+import json
+import os
+import sys
+import time
+import types
+
+PACKAGE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "freeds"
+)
+
+if "freeds" not in sys.modules:
+    _package = types.ModuleType("freeds")
+    _package.__path__ = [PACKAGE_DIR]
+    sys.modules["freeds"] = _package
+
+
+# A "jsonweb" event as sent by FreeDS 1.0.7 (flat, no sections)
+SSE_EVENT_1_0 = {
+    "wversion": 25,
+    "Oled": 1,
+    "screenBrightness": 70,
+    "POn": 1,
+    "PwmMan": 0,
+    "SenTemp": 1,
+    "Msg": "",
+    "pwmfrec": 30,
+    "pwm": 42,
+    "loadCalcWatts": 812.4,
+    "baudiosMeter": 9600,
+    "invertedSign": 0,
+    "tempShutdown": 75,
+    "error": 0,
+    "R01": 0,
+    "R02": 1,
+    "R03": 0,
+    "R04": 0,
+    "wsolar": 2875.2,
+    "wgrid": -612.8,
+    "invTemp": 38.5,
+    "wtoday": 11.2,
+    "gridv": 231.4,
+    "pv1c": 7.12,
+    "pv1v": 312.6,
+    "pv1w": 2225.7,
+    "pv2c": 2.04,
+    "pv2v": 318.1,
+    "pv2w": 648.9,
+    "mvoltage": 231.2,
+    "mcurrent": 2.65,
+    "mpowerFactor": 0.98,
+    "mfrequency": 50.01,
+    "mimportActive": 1243.7,
+    "mexportActive": 3310.2,
+    "KwToday": 4.21,
+    "KwYesterday": 6.83,
+    "KwTotal": 1523.4,
+    "KwExportToday": 7.72,
+    "KwExportYesterday": 9.1,
+    "KwExportTotal": 2890.5,
+    "tempTermo": 51.3,
+    "tempTriac": 36.8,
+    "tempCustom": -127.0,
+}
+
+
+def sse_stream(events=1000):
+    """A recorded-like SSE stream: jsonweb events with some noise in between"""
+    frames = []
+    for i in range(events):
+        event = dict(SSE_EVENT_1_0)
+        event["wsolar"] = round(2875.2 + (i % 37) * 3.1, 1)
+        event["wgrid"] = round(-612.8 + (i % 23) * 2.7, 1)
+        event["pwm"] = i % 101
+        frames.append(
+            b"event: jsonweb\r\ndata: "
+            + json.dumps(event, separators=(",", ":")).encode()
+            + b"\r\n\r\n"
+        )
+        if i % 10 == 0:
+            frames.append(b"event: uptime\r\ndata: " + str(i).encode() + b"\r\n\r\n")
+    return b"".join(frames)
+
+
+def chunked(data, sizes=(1460, 536, 2920, 97, 1460, 4380, 13)):
+    """Splits data the way TCP segments arrive over a busy Wi-Fi link"""
+    chunks = []
+    pos = 0
+    i = 0
+    while pos < len(data):
+        size = sizes[i % len(sizes)]
+        chunks.append(data[pos : pos + size])
+        pos += size
+        i += 1
+    return chunks
+
+
+def timeit(func, repeat=5):
+    """Best wall-clock time of several runs of func(), in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+# A /json answer as sent by FreeDS >= 2.0.2 (sectioned, like the 1.1 websocket)
+JSON_SNAPSHOT = {
+    "Web": {
+        "Oled": 1,
+        "screenBrightness": 70,
+        "POn": 1,
+        "PwmMan": 0,
+        "pwmfrec": 30,
+        "pwm": 42,
+        "loadCalcWatts": 812.4,
+        "workingMode": 9,
+        "error": 0,
+    },
+    "Relays": {"R01": 0, "R02": 1, "R03": 0, "R04": 0},
+    "Inverter": {
+        "wsolar": 2875.2,
+        "wgrid": -612.8,
+        "invTemp": 38.5,
+        "gridv": 231.4,
+        "pv1c": 7.12,
+        "pv1v": 312.6,
+        "pv1w": 2225.7,
+        "pv2c": 2.04,
+        "pv2v": 318.1,
+        "pv2w": 648.9,
+    },
+    "Meter": {
+        "mvoltage": 231.2,
+        "mcurrent": 2.65,
+        "mpowerFactor": 0.98,
+        "mfrequency": 50.01,
+    },
+    "Energy": {
+        "KwToday": 4.21,
+        "KwYesterday": 6.83,
+        "KwTotal": 1523.4,
+        "KwExportToday": 7.72,
+        "KwExportYesterday": 9.1,
+        "KwExportTotal": 2890.5,
+    },
+    "Temperature": {"tempTermo": 51.3, "tempTriac": 36.8, "tempCustom": -127.0},
+}
+
+
+def buggy_json_response(body):
+    """/json response framed like firmwares 1.1.0021 and 2.0.0 do"""
+    # Declares an empty body and "Connection: close", then sends the JSON
+    return (
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Connection: close\r\n"
+        b"Content-Length: 0\r\n\r\n" + body
+    )
+
+
+def compliant_json_response(body, keepalive=False):
+    """/json response as sent by firmwares >= 2.0.2"""
+    return (
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: application/json\r\n"
+        + (b"Connection: keep-alive\r\n" if keepalive else b"Connection: close\r\n")
+        + b"Content-Length: "
+        + str(len(body)).encode()
+        + b"\r\n\r\n"
+        + body
+    )
@@ -0,0 +1,71 @@
+"""Micro-benchmark: JSON decoding of FreeDS payloads
+
+Run with: python benchmarks/bench_decode.py [capture]
+
+"capture" is an optional raw recording of a FreeDS /events response body
+(see bench_sse.py). Without it, synthetic 1.0.7-style jsonweb events are
+used. Sectioned /json (and websocket) bodies are measured too.
+
+For each available decoder, the payloads are decoded the way the
+coordinator gets them: SSE event data as a memoryview into the received
+line, /json and websocket bodies as bytes. The previous SSE path (slicing
+the "data: " prefix off the message, then json.loads) is the baseline.
+"""
+
+import json
+import sys
+
+from _common import JSON_SNAPSHOT, sse_stream, timeit
+
+from freeds.jsondecode import DECODER, DECODERS
+from freeds.sse import SSEParser
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as file:
+            stream = file.read()
+        print(f"Recorded stream from {sys.argv[1]}")
+    else:
+        stream = sse_stream(5000)
+        print("Synthetic stream (pass a recorded /events body to use it instead)")
+
+    events = [e.data for e in SSEParser().feed(stream) if e.event == "jsonweb"]
+    messages = [b"event: jsonweb\r\ndata: " + bytes(data) for data in events]
+    sse_size = sum(len(data) for data in events)
+    bodies = [json.dumps(JSON_SNAPSHOT).encode()] * len(events)
+    body_size = sum(len(data) for data in bodies)
+
+    def previous_sse():
+        for message in messages:
+            json.loads(message[22:])
+
+    results = [("SSE, json.loads(msg[22:]) (before)", previous_sse, sse_size)]
+    for name, loads in sorted(DECODERS.items()):
+
+        def sse(loads=loads):
+            for data in events:
+                loads(data)
+
+        def body(loads=loads):
+            for data in bodies:
+                loads(data)
+
+        results.append((f"SSE memoryview, {name}", sse, sse_size))
+        results.append((f"/json body, {name}", body, body_size))
+
+    print(
+        f"{len(events)} payloads of each kind, "
+        f"{sse_size / len(events):.0f} (SSE) and {body_size / len(events):.0f} "
+        f"(/json) bytes each; the integration uses {DECODER}"
+    )
+    for label, func, size in results:
+        elapsed = timeit(func)
+        print(
+            f"{label:>36}: {elapsed / len(events) * 1e6:6.2f} µs/payload "
+            f"{size / elapsed / 1e6:8.1f} MB/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
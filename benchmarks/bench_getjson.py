@@ -0,0 +1,103 @@
+"""Benchmark: per-poll CPU time of /json reads against buggy firmware
+
+Run with: python benchmarks/bench_getjson.py   (needs aiohttp)
+
+A local server answers /json the way firmwares 1.1.0021 and 2.0.0 do
+("Connection: close", empty body, then the JSON anyway). This compares:
+- aiohttp, recovering the JSON from the text of the protocol exception
+  (the previous workaround), and
+- the tolerant RawHTTPClient.
+A compliant (>= 2.0.2) server is measured too, for reference.
+"""
+
+import asyncio
+import json
+import time
+
+import aiohttp
+
+from _common import JSON_SNAPSHOT, buggy_json_response, compliant_json_response
+
+from freeds.rawhttp import RawHTTPClient, decode_json_body
+
+POLLS = 500
+
+
+async def serve(response):
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(response)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+async def poll_aiohttp(port):
+    """The previous workaround: str(err), find "{", raw_decode"""
+    decoder = json.JSONDecoder()
+    recovered = 0
+    async with aiohttp.ClientSession() as session:
+        for _ in range(POLLS):
+            try:
+                async with session.get(
+                    f"http://127.0.0.1:{port}/json",
+                    headers={"Connection": "close"},
+                ) as response:
+                    await response.json(content_type=None)
+                    recovered += 1
+            except Exception as err:
+                error_msg = str(err)
+                if "{" in error_msg:
+                    try:
+                        decoder.raw_decode(error_msg[error_msg.find("{") :])
+                        recovered += 1
+                    except Exception:
+                        pass
+    return recovered
+
+
+async def poll_raw(port):
+    client = RawHTTPClient("127.0.0.1", port)
+    recovered = 0
+    for _ in range(POLLS):
+        response = await client.get("/json")
+        decode_json_body(response.body)
+        recovered += 1
+    return recovered
+
+
+async def measure(label, response, poller):
+    server = await serve(response)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        recovered = await poller(port)
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+
+    # Note that the CPU time includes the (tiny) local server's share
+    print(
+        f"{label:>36}: {cpu / POLLS * 1e6:8.1f} µs CPU/poll "
+        f"{wall / POLLS * 1e6:8.1f} µs wall/poll, "
+        f"{recovered}/{POLLS} snapshots read"
+    )
+
+
+async def main():
+    body = json.dumps(JSON_SNAPSHOT).encode()
+    buggy = buggy_json_response(body)
+    compliant = compliant_json_response(body)
+
+    print(f"{POLLS} polls of a {len(body)}-byte /json body")
+    await measure("buggy fw, aiohttp + exception text", buggy, poll_aiohttp)
+    await measure("buggy fw, tolerant reader", buggy, poll_raw)
+    await measure("compliant fw, aiohttp", compliant, poll_aiohttp)
+    await measure("compliant fw, tolerant reader", compliant, poll_raw)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,254 @@
+"""Load benchmark: N simulated FreeDS devices against the integration
+
+Run with: python benchmarks/bench_load.py [--devices 10] [--firmware 2.0.2]
+          [--rate 1] [--profile moving] [--duration 30] [--warmup 5] [--json]
+          (needs Home Assistant and aiohttp, like the integration itself)
+
+The devices are simulated in a separate process (see simulator.py), so only
+the integration's own work is measured here. Every device gets a
+FreeDSCoordinator and the entities of all platforms, set up by the
+platforms' async_setup_entry(). There's no Home Assistant instance though:
+state writes are counted, not performed.
+
+After a warm-up, the following is measured for --duration seconds:
+- CPU time of this process per message received (the regression number),
+- memory growth (RSS; also the Python heap with --tracemalloc),
+- event loop lag (how late a 10 ms timer fires: p50/p99/max),
+- entity callbacks dispatched/skipped, and state writes.
+--json prints the results as a single JSON object instead, for tracking.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import aiohttp
+
+from _common import PACKAGE_DIR  # noqa: F401 (registers the "freeds" package)
+from simulator import FIRMWARES, MODES, PROFILES
+
+from freeds import binary_sensor, light, sensor, switch
+from freeds.const import DOMAIN, MAX_CONNECTING
+from freeds.coordinator import FreeDSCoordinator
+from freeds.latency import LatencyHistogram
+from freeds.scheduler import FleetScheduler
+
+PLATFORMS = (sensor, binary_sensor, switch, light)
+
+LAG_INTERVAL = 0.01
+
+
+def rss():
+    """Resident memory of this process, in bytes"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current, but still shows growth
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def start_simulator(args):
+    """Starts the simulator process; returns it and the devices' ports"""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulator.py"),
+        f"--firmware={args.firmware}",
+        f"--devices={args.devices}",
+        f"--rate={args.rate}",
+        f"--profile={args.profile}",
+        stdout=asyncio.subprocess.PIPE,
+    )
+    line = await process.stdout.readline()
+    if not line.startswith(b"PORTS "):
+        raise RuntimeError(f"Simulator failed to start: {line!r}")
+    return process, [int(port) for port in line.split()[1:]]
+
+
+async def set_up_device(hass, index, port, args, session, fleet):
+    """Coordinator and entities of one device, with counted state writes"""
+    freeds_id = f"freeds_sim{index}"
+    coordinator = FreeDSCoordinator(
+        hass,
+        "127.0.0.1",
+        port=port,
+        name=f"FreeDS {freeds_id} HTTP client",
+        session=session,
+        fleet=fleet,
+        mode=MODES[FIRMWARES[args.firmware]],
+        # Poll /json at the same rate the other firmwares stream at
+        min_interval=1 / args.rate,
+        max_interval=1 / args.rate,
+    )
+    hass.data.setdefault(DOMAIN, {})[freeds_id] = {
+        "freeds_id": freeds_id,
+        "coordinator": coordinator,
+        "device_info": {"identifiers": {(DOMAIN, freeds_id)}},
+    }
+
+    writes = [0]
+
+    def count_write():
+        writes[0] += 1
+
+    def add_entities(entities):
+        # Sensors get added once the device reports their field, i.e. from
+        # within a coordinator update
+        for entity in entities:
+            if not entity.entity_registry_enabled_default:
+                # Not added by Home Assistant either, unless enabled
+                continue
+            entity.hass = hass
+            entity.async_write_ha_state = count_write
+            hass.loop.create_task(entity.async_added_to_hass())
+
+    entry = SimpleNamespace(
+        data={"uniqueid": freeds_id}, options={}, async_on_unload=lambda func: None
+    )
+    for platform in PLATFORMS:
+        await platform.async_setup_entry(hass, entry, add_entities)
+
+    return coordinator, writes
+
+
+async def measure_loop_lag(histogram):
+    loop = asyncio.get_running_loop()
+    for _ in iter(int, 1):
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        histogram.add(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+
+def totals(devices):
+    """Sums of the counters of all devices"""
+    return {
+        "messages": sum(c.messages_received for c, _ in devices),
+        "bytes": sum(c.bytes_received for c, _ in devices),
+        "parse_failures": sum(c.parse_failures for c, _ in devices),
+        "dispatched": sum(c.dispatched_callbacks for c, _ in devices),
+        "skipped": sum(c.skipped_callbacks for c, _ in devices),
+        "writes": sum(writes[0] for _, writes in devices),
+    }
+
+
+async def run(args):
+    process, ports = await start_simulator(args)
+    hass = SimpleNamespace(loop=asyncio.get_running_loop(), data={})
+    session = aiohttp.ClientSession()
+    fleet = FleetScheduler(MAX_CONNECTING, startup_window=min(3, args.warmup))
+    lag = LatencyHistogram()
+    lag_task = None
+    devices = []
+    try:
+        for index, port in enumerate(ports):
+            devices.append(
+                await set_up_device(hass, index, port, args, session, fleet)
+            )
+
+        await asyncio.sleep(args.warmup)
+        lag_task = asyncio.create_task(measure_loop_lag(lag))
+        if args.tracemalloc:
+            tracemalloc.start()
+        before = totals(devices)
+        rss_before = rss()
+        cpu_before = time.process_time()
+
+        await asyncio.sleep(args.duration)
+
+        cpu = time.process_time() - cpu_before
+        rss_growth = rss() - rss_before
+        heap_growth = None
+        if args.tracemalloc:
+            heap_growth = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+        after = totals(devices)
+    finally:
+        if lag_task is not None:
+            lag_task.cancel()
+        for coordinator, _ in devices:
+            await coordinator.async_shutdown()
+        await session.close()
+        process.terminate()
+        await process.wait()
+
+    counts = {name: after[name] - before[name] for name in after}
+    messages = counts["messages"] or 1
+    return {
+        "firmware": args.firmware,
+        "profile": args.profile,
+        "devices": args.devices,
+        "rate": args.rate,
+        "duration": args.duration,
+        "messages": counts["messages"],
+        "messages_per_second": counts["messages"] / args.duration,
+        "bytes": counts["bytes"],
+        "parse_failures": counts["parse_failures"],
+        "cpu_seconds": cpu,
+        "cpu_us_per_message": cpu / messages * 1e6,
+        "rss_growth_kib": rss_growth / 1024,
+        "heap_growth_kib": None if heap_growth is None else heap_growth / 1024,
+        "loop_lag_p50_ms": (lag.percentile(50) or 0) * 1000,
+        "loop_lag_p99_ms": (lag.percentile(99) or 0) * 1000,
+        "loop_lag_max_ms": lag.max * 1000,
+        "callbacks_dispatched": counts["dispatched"],
+        "callbacks_skipped": counts["skipped"],
+        "state_writes": counts["writes"],
+        "state_writes_per_message": counts["writes"] / messages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--firmware", choices=sorted(FIRMWARES), default="2.0.2")
+    parser.add_argument("--rate", type=float, default=1.0, help="messages/s/device")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="moving")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(results))
+        return
+
+    print(
+        f"{results['devices']} x FreeDS {results['firmware']} "
+        f"({results['profile']} profile, {results['rate']:g} msg/s) "
+        f"for {results['duration']:g} s"
+    )
+    print(
+        f"  {results['messages']} messages ({results['messages_per_second']:.1f}/s, "
+        f"{results['bytes']} bytes, {results['parse_failures']} malformed)"
+    )
+    print(
+        f"  CPU: {results['cpu_seconds']:.2f} s, "
+        f"{results['cpu_us_per_message']:.0f} us per message"
+    )
+    memory = f"  Memory growth: {results['rss_growth_kib']:.0f} KiB RSS"
+    if results["heap_growth_kib"] is not None:
+        memory += f", {results['heap_growth_kib']:.0f} KiB Python heap"
+    print(memory)
+    print(
+        f"  Event loop lag: {results['loop_lag_p50_ms']:.2f} ms p50, "
+        f"{results['loop_lag_p99_ms']:.2f} ms p99, "
+        f"{results['loop_lag_max_ms']:.2f} ms max"
+    )
+    print(
+        f"  Entity callbacks: {results['callbacks_dispatched']} dispatched, "
+        f"{results['callbacks_skipped']} skipped; {results['state_writes']} state "
+        f"writes ({results['state_writes_per_message']:.2f} per message)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Micro-benchmark: turning payloads into the sectioned snapshot
+
+Run with: python benchmarks/bench_normalize.py
+
+Compares the previous hand-written sectioning of 1.0.x SSE events (one
+event.get() per field, new dicts for every section of every event) with
+the table-driven SnapshotNormalizer, both for a stream where the power
+figures and the PWM move (daytime) and for a static one (night), and
+measures the normalization of sectioned (websocket, /json) payloads too.
+"New sections" counts the section dicts not reused, per payload.
+"""
+
+import copy
+
+from _common import JSON_SNAPSHOT, SSE_EVENT_1_0, timeit
+
+from freeds.normalize import SnapshotNormalizer
+
+EVENTS = 20000
+
+
+def section_sse_event(event):
+    """The previous implementation, as it was in the coordinator"""
+    # Sections are the default in 1.1-beta firmware and are added here
+    # for backwards compatibility
+    return {
+        "Web": {
+            "Oled": event.get("Oled"),
+            "screenBrightness": event.get("screenBrightness"),
+            "POn": event.get("POn"),
+            "PwmMan": event.get("PwmMan"),
+            "SenTemp": event.get("SenTemp"),
+            "Msg": event.get("Msg"),
+            "pwmfrec": event.get("pwmfrec"),
+            "pwm": event.get("pwm"),
+            "loadCalcWatts": event.get("loadCalcWatts"),
+            "baudiosMeter": event.get("baudiosMeter"),
+            # "workingMode": event.get('workingMode'),
+            "workingMode": event.get("wversion"),  # Name change
+            # "workingModeName": event.get('workingModeName'),
+            # "masterMode": event.get('masterMode'),
+            # "masterModeName": event.get('masterModeName'),
+            "invertedSign": event.get("invertedSign"),
+            "tempShutdown": event.get("tempShutdown"),
+            "error": event.get("error"),
+        },
+        "Relays": {
+            "R01": event.get("R01"),
+            "R02": event.get("R02"),
+            "R03": event.get("R03"),
+            "R04": event.get("R04"),
+        },
+        "Inverter": {
+            "wsolar": event.get("wsolar"),
+            "wgrid": event.get("wgrid"),
+            "invTemp": event.get("invTemp"),
+            "wtoday": event.get("wtoday"),
+            "gridv": event.get("gridv"),
+            "pv1c": event.get("pv1c"),
+            "pv1v": event.get("pv1v"),
+            "pv1w": event.get("pv1w"),
+            "pv2c": event.get("pv2c"),
+            "pv2v": event.get("pv2v"),
+            "pv2w": event.get("pv2w"),
+        },
+        "Meter": {
+            "mvoltage": event.get("mvoltage"),
+            "mcurrent": event.get("mcurrent"),
+            "mpowerFactor": event.get("mpowerFactor"),
+            "mfrequency": event.get("mfrequency"),
+            "mimportActive": event.get("mimportActive"),
+            "mexportActive": event.get("mexportActive"),
+        },
+        "Energy": {
+            "KwToday": event.get("KwToday"),
+            "KwYesterday": event.get("KwYesterday"),
+            "KwTotal": event.get("KwTotal"),
+            "KwExportToday": event.get("KwExportToday"),
+            "KwExportYesterday": event.get("KwExportYesterday"),
+            "KwExportTotal": event.get("KwExportTotal"),
+        },
+        "Temperature": {
+            "tempTermo": event.get("tempTermo"),
+            "tempTriac": event.get("tempTriac"),
+            "tempCustom": event.get("tempCustom"),
+            # "customSensor": "Temp. Ambiente"
+        },
+    }
+
+
+def events(moving=True):
+    stream = []
+    for i in range(EVENTS):
+        # Decoded JSON: every event is a fresh object, like json.loads gives
+        event = dict(SSE_EVENT_1_0)
+        if moving:
+            event["wsolar"] = round(2875.2 + (i % 37) * 3.1, 1)
+            event["wgrid"] = round(-612.8 + (i % 23) * 2.7, 1)
+            event["pwm"] = i % 101
+        stream.append(event)
+    return stream
+
+
+def snapshots():
+    stream = []
+    for i in range(EVENTS):
+        snapshot = copy.deepcopy(JSON_SNAPSHOT)
+        snapshot["Inverter"]["wsolar"] = round(2875.2 + (i % 37) * 3.1, 1)
+        snapshot["Web"]["pwm"] = i % 101
+        stream.append(snapshot)
+    return stream
+
+
+def sections_built(snapshots):
+    """Average number of section dicts not reused from the previous snapshot"""
+    built = 0
+    previous = {}
+    for snapshot in snapshots:
+        built += sum(
+            1
+            for section, fields in snapshot.items()
+            if fields is not previous.get(section)
+        )
+        previous = snapshot
+    return built / len(snapshots)
+
+
+def main():
+    print(f"{EVENTS} payloads per run")
+    for moving in (True, False):
+        stream = events(moving)
+        label = "moving" if moving else "static"
+
+        def before():
+            return [section_sse_event(event) for event in stream]
+
+        def after():
+            normalizer = SnapshotNormalizer()
+            data = {}
+            snapshots = []
+            for event in stream:
+                data = normalizer.flat(event, data)
+                snapshots.append(data)
+            return snapshots
+
+        for name, func in (("hand-written", before), ("table-driven", after)):
+            elapsed = timeit(func)
+            print(
+                f"{'1.0.x SSE, ' + label + ', ' + name:>36}: "
+                f"{elapsed / EVENTS * 1e6:6.2f} µs/payload, "
+                f"{sections_built(func()):.1f} new sections"
+            )
+
+    stream = snapshots()
+
+    def sectioned():
+        normalizer = SnapshotNormalizer()
+        data = {}
+        snapshots_out = []
+        for payload in stream:
+            data = normalizer.sectioned(payload, data)
+            snapshots_out.append(data)
+        return snapshots_out
+
+    elapsed = timeit(sectioned)
+    print(
+        f"{'sectioned (websocket, /json)':>36}: "
+        f"{elapsed / EVENTS * 1e6:6.2f} µs/payload, "
+        f"{sections_built(sectioned()):.1f} new sections"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Micro-benchmark: incremental SSE parser over an /events stream
+
+Run with: python benchmarks/bench_sse.py [capture]
+
+"capture" is an optional raw recording of a FreeDS /events response body,
+e.g. made with "curl -sN http://freeds.local/events > capture.bin". Without
+it, a synthetic stream (1.0.7-style jsonweb events interleaved with uptime
+events) is used instead.
+"""
+
+import sys
+
+from _common import chunked, sse_stream, timeit
+
+from freeds.sse import SSEParser
+
+
+def count_events(chunks):
+    parser = SSEParser()
+    count = 0
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            if event.event == "jsonweb":
+                count += 1
+    return count
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as file:
+            stream = file.read()
+        print(f"Recorded stream from {sys.argv[1]}")
+    else:
+        stream = sse_stream(5000)
+        print("Synthetic stream (pass a recorded /events body to use it instead)")
+
+    events = count_events([stream])
+    frames = [frame + b"\r\n\r\n" for frame in stream.split(b"\r\n\r\n") if frame]
+    scenarios = {
+        "whole stream, one read": [stream],
+        "TCP-sized reads": chunked(stream),
+        "one event per read": frames,
+        "16-byte reads": chunked(stream, (16,)),
+    }
+
+    print(f"{len(stream)} bytes, {events} jsonweb events")
+    for label, chunks in scenarios.items():
+        assert count_events(chunks) == events
+        elapsed = timeit(lambda: count_events(chunks))
+        print(
+            f"{label:>24}: {len(stream) / elapsed / 1e6:8.2f} MB/s "
+            f"{events / elapsed:12.0f} events/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
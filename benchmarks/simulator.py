@@ -0,0 +1,319 @@
+"""Simulated FreeDS devices, for benchmarks and manual testing
+
+Run with: python benchmarks/simulator.py [--firmware 2.0.2] [--devices 1]
+                                         [--rate 1] [--profile moving]
+
+Each simulated device listens on its own port of 127.0.0.1 (printed on the
+first line of output: "PORTS <port> <port>...") and answers like a given
+firmware generation:
+- 1.0.7: SSE "jsonweb" events (flat) on /events
+- 1.1.0-beta16: /api/common, and one websocket message per section on
+  /jsonWeb (commands can be sent over the websocket too)
+- 2.0.2: /json (sectioned), with HTTP keep-alive
+- 1.1.0021 and 2.0.0: /json with the "Connection: close", empty body, then
+  the JSON anyway responses that strict HTTP parsers refuse
+All of them toggle relays/switches on POST /tooglebuttons?data=<button>.
+
+Streaming firmwares send --rate messages (or sets of messages) per second;
+/json is answered whenever polled. The payload profile decides what moves
+between messages, see PROFILES.
+"""
+
+import argparse
+import asyncio
+import base64
+import copy
+import hashlib
+import json
+import math
+import random
+
+from _common import JSON_SNAPSHOT, SSE_EVENT_1_0
+
+from freeds.const import SSE_FIELDS_1_0
+
+# How each firmware serves its data
+FIRMWARES = {
+    "1.0.7": "sse",
+    "1.1.0-beta16": "websocket",
+    "1.1.0021": "buggy",
+    "2.0.0": "buggy",
+    "2.0.2": "json",
+}
+
+# Coordinator transport mode for each way of serving data
+MODES = {"sse": "sse", "websocket": "websocket", "buggy": "getjson", "json": "getjson"}
+
+# Button indexes of /tooglebuttons, and the field each one toggles
+BUTTONS = {
+    1: ("Relays", "R01"),
+    2: ("Relays", "R02"),
+    3: ("Relays", "R03"),
+    4: ("Relays", "R04"),
+    5: ("Web", "Oled"),
+    6: ("Web", "POn"),
+    7: ("Web", "PwmMan"),
+}
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+NOT_FOUND = b"HTTP/1.1 404 Not Found\r\nConnection: close\r\nContent-Length: 0\r\n\r\n"
+
+
+def _static(snapshot, i, rng):
+    pass
+
+
+def _moving(snapshot, i, rng):
+    # A sunny day with clouds: production swings by hundreds of watts, the
+    # PWM follows the surplus, the energy counters creep up.
+    inverter = snapshot["Inverter"]
+    solar = 2500 + 800 * math.sin(i / 20) + rng.uniform(-50, 50)
+    inverter["wsolar"] = round(solar, 1)
+    inverter["wgrid"] = round(-solar * 0.2 + rng.uniform(-30, 30), 1)
+    inverter["pv1w"] = round(solar * 0.77, 1)
+    inverter["pv2w"] = round(solar * 0.23, 1)
+    web = snapshot["Web"]
+    web["pwm"] = max(0, min(100, int(40 + 30 * math.sin(i / 20))))
+    web["loadCalcWatts"] = round(solar * 0.3, 1)
+    energy = snapshot["Energy"]
+    energy["KwToday"] = round(energy["KwToday"] + 0.001, 3)
+    energy["KwTotal"] = round(energy["KwTotal"] + 0.001, 3)
+
+
+def _noisy(snapshot, i, rng):
+    # Nothing really moves, but the readings jitter (below the default
+    # deadbands of the sensors)
+    inverter = snapshot["Inverter"]
+    base = JSON_SNAPSHOT["Inverter"]
+    for field in ("wsolar", "wgrid", "pv1w", "pv2w"):
+        inverter[field] = round(base[field] + rng.uniform(-2, 2), 1)
+    inverter["gridv"] = round(base["gridv"] + rng.uniform(-0.2, 0.2), 1)
+    meter = snapshot["Meter"]
+    meter["mfrequency"] = round(50 + rng.uniform(-0.02, 0.02), 2)
+
+
+def _busy(snapshot, i, rng):
+    # Worst case: every number changes in every message
+    for section, fields in snapshot.items():
+        for field, value in fields.items():
+            if isinstance(value, float) and value != -127.0:
+                fields[field] = round(value * rng.uniform(0.9, 1.1), 2)
+
+
+# What moves between two messages
+PROFILES = {"static": _static, "moving": _moving, "noisy": _noisy, "busy": _busy}
+
+
+def flatten(snapshot):
+    """A sectioned snapshot as a firmware 1.0.x "jsonweb" event"""
+    event = dict(SSE_EVENT_1_0)
+    for section, fields in SSE_FIELDS_1_0.items():
+        values = snapshot.get(section, {})
+        for field, key in fields.items():
+            if field in values:
+                event[key] = values[field]
+    return event
+
+
+def websocket_frame(payload, opcode=0x1):
+    """An unmasked (server to client) websocket frame"""
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x80 | opcode, length))
+    elif length < 65536:
+        header = bytes((0x80 | opcode, 126)) + length.to_bytes(2, "big")
+    else:
+        header = bytes((0x80 | opcode, 127)) + length.to_bytes(8, "big")
+    return header + payload
+
+
+async def read_websocket_frame(reader):
+    """Reads a (masked, client to server) frame; returns (opcode, payload)"""
+    head = await reader.readexactly(2)
+    length = head[1] & 0x7F
+    if length == 126:
+        length = int.from_bytes(await reader.readexactly(2), "big")
+    elif length == 127:
+        length = int.from_bytes(await reader.readexactly(8), "big")
+    mask = await reader.readexactly(4) if head[1] & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask is not None:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return head[0] & 0x0F, payload
+
+
+class SimulatedFreeDS:
+    """A FreeDS of a given firmware version, listening on a local port."""
+
+    def __init__(self, firmware="2.0.2", rate=1.0, profile="moving", seed=0):
+        self.firmware = firmware
+        self.serves = FIRMWARES[firmware]
+        self.mode = MODES[self.serves]
+        self.interval = 1 / rate
+        self.profile = PROFILES[profile]
+        self.snapshot = copy.deepcopy(JSON_SNAPSHOT)
+        self.port = None
+        self.messages_sent = 0
+        self.toggles = 0
+        self._random = random.Random(seed)
+        self._step = 0
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Starts listening; returns the port"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def next_snapshot(self):
+        """Moves the readings as per the profile; returns the new snapshot"""
+        self._step += 1
+        self.profile(self.snapshot, self._step, self._random)
+        return self.snapshot
+
+    def toggle(self, button):
+        section, field = BUTTONS[button]
+        fields = self.snapshot[section]
+        fields[field] = 0 if fields[field] else 1
+        self.toggles += 1
+
+    async def _handle(self, reader, writer):
+        try:
+            for _ in iter(int, 1):
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                path, _, query = target.partition("?")
+
+                if method == "POST" and path == "/tooglebuttons":
+                    self.toggle(int(query.partition("=")[2]))
+                    writer.write(
+                        b"HTTP/1.1 200 OK\r\nConnection: close\r\n"
+                        b"Content-Length: 2\r\n\r\nOK"
+                    )
+                elif path == "/events" and self.serves == "sse":
+                    await self._stream_sse(writer)
+                elif path == "/api/common" and self.serves == "websocket":
+                    body = json.dumps(
+                        {"version": self.firmware, "title": "FreeDS (freeds_sim)"}
+                    ).encode()
+                    writer.write(
+                        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                        b"Connection: close\r\nContent-Length: %d\r\n\r\n" % len(body)
+                        + body
+                    )
+                elif path == "/jsonWeb" and self.serves == "websocket":
+                    await self._stream_websocket(reader, writer, headers)
+                elif path == "/json" and self.serves in ("json", "buggy"):
+                    body = json.dumps(self.next_snapshot()).encode()
+                    self.messages_sent += 1
+                    if self.serves == "buggy":
+                        writer.write(
+                            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                            b"Connection: close\r\nContent-Length: 0\r\n\r\n" + body
+                        )
+                    else:
+                        keepalive = headers.get("connection") == "keep-alive"
+                        writer.write(
+                            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                            b"Connection: %s\r\nContent-Length: %d\r\n\r\n"
+                            % (b"keep-alive" if keepalive else b"close", len(body))
+                            + body
+                        )
+                        if keepalive:
+                            await writer.drain()
+                            continue
+                else:
+                    writer.write(NOT_FOUND)
+                await writer.drain()
+                break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _stream_sse(self, writer):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n"
+        )
+        for _ in iter(int, 1):
+            event = json.dumps(flatten(self.next_snapshot())).encode()
+            writer.write(b"event: jsonweb\r\ndata: " + event + b"\r\n\r\n")
+            self.messages_sent += 1
+            if self._step % 10 == 0:
+                writer.write(b"event: uptime\r\ndata: %d\r\n\r\n" % self._step)
+            await writer.drain()
+            await asyncio.sleep(self.interval)
+
+    async def _stream_websocket(self, reader, writer, headers):
+        accept = base64.b64encode(
+            hashlib.sha1(
+                (headers["sec-websocket-key"] + WEBSOCKET_GUID).encode()
+            ).digest()
+        )
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+            b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+        commands = asyncio.create_task(self._read_websocket(reader, writer))
+        try:
+            while not commands.done():
+                # Firmware 1.1 splits each update into one message per section
+                for section, fields in self.next_snapshot().items():
+                    payload = json.dumps({section: fields}).encode()
+                    writer.write(websocket_frame(payload))
+                    self.messages_sent += 1
+                await writer.drain()
+                await asyncio.sleep(self.interval)
+        finally:
+            commands.cancel()
+
+    async def _read_websocket(self, reader, writer):
+        for _ in iter(int, 1):
+            opcode, payload = await read_websocket_frame(reader)
+            if opcode == 0x8:
+                writer.write(websocket_frame(payload[:2], 0x8))
+                return
+            if opcode == 0x9:
+                writer.write(websocket_frame(payload, 0xA))
+            elif opcode == 0x1:
+                command = json.loads(payload)
+                if command.get("command") == "tooglebuttons":
+                    self.toggle(int(command["data"]))
+
+
+async def serve(firmware, devices, rate, profile):
+    simulators = [
+        SimulatedFreeDS(firmware, rate, profile, seed=i) for i in range(devices)
+    ]
+    ports = [await simulator.start() for simulator in simulators]
+    print("PORTS " + " ".join(str(port) for port in ports), flush=True)
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated FreeDS devices")
+    parser.add_argument("--firmware", choices=sorted(FIRMWARES), default="2.0.2")
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=1.0, help="messages/s")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="moving")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.firmware, args.devices, args.rate, args.profile))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
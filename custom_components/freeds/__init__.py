@@ -1,14 +1,51 @@
 """FreeDS client"""
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.typing import ConfigType
 
 from . import sensor
-from .const import DOMAIN
+from .const import (
+    CONF_AGGREGATION_WINDOW,
+    CONF_KEEPALIVE,
+    CONF_MAX_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_RECORD,
+    CONF_REPLAY_FILE,
+    CONF_REPLAY_SPEED,
+    CONF_SENSITIVITY,
+    CONF_STALE_AFTER,
+    CONF_TRACE_LATENCY,
+    DEFAULT_AGGREGATION_WINDOW,
+    DEFAULT_KEEPALIVE,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_RECORD,
+    DEFAULT_REPLAY_FILE,
+    DEFAULT_REPLAY_SPEED,
+    DEFAULT_SENSITIVITY,
+    DEFAULT_STALE_AFTER,
+    DEFAULT_TRACE_LATENCY,
+    DATA_FLEET,
+    DOMAIN,
+    MAX_CONNECTING,
+)
 from .coordinator import FreeDSCoordinator
+from .scheduler import FleetScheduler
+from .services import async_setup_services
+from .session import async_close_session, async_get_session
 
 PLATFORMS: list[str] = ["sensor", "binary_sensor", "switch", "light"]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the FreeDS services."""
+    async_setup_services(hass)
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up a FreeDS sensor from a config entry."""
@@ -24,6 +61,22 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     else:
         configuration_url = f"http://{user}:{passwd}@{host}:{port}"
 
+    @callback
+    def store_mode(mode, fwversion):
+        """Remembers the transport mode (and firmware) for the next startup."""
+        data = {**entry.data, "mode": mode}
+        if fwversion is not None:
+            data["fwversion"] = fwversion
+        hass.config_entries.async_update_entry(entry, data=data)
+
+    # Debugging: record what the device sends, and/or replay a recording
+    record_path = None
+    if entry.options.get(CONF_RECORD, DEFAULT_RECORD):
+        record_path = hass.config.path(f"freeds_{uniqueid}.rec")
+    replay_path = None
+    if entry.options.get(CONF_REPLAY_FILE, DEFAULT_REPLAY_FILE):
+        replay_path = hass.config.path(entry.options[CONF_REPLAY_FILE])
+
     coordinator = FreeDSCoordinator(
         hass,
         host,
@@ -31,9 +84,26 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         user=user,
         passwd=passwd,
         name=f"FreeDS {uniqueid} HTTP client",
+        session=async_get_session(hass),
+        fleet=hass.data.setdefault(DATA_FLEET, FleetScheduler(MAX_CONNECTING)),
+        mode=entry.data.get("mode"),
+        on_mode_detected=store_mode,
+        keepalive=entry.options.get(CONF_KEEPALIVE, DEFAULT_KEEPALIVE),
+        min_interval=entry.options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+        max_interval=entry.options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL),
+        sensitivity=entry.options.get(CONF_SENSITIVITY, DEFAULT_SENSITIVITY),
+        aggregation_window=entry.options.get(
+            CONF_AGGREGATION_WINDOW, DEFAULT_AGGREGATION_WINDOW
+        ),
+        stale_after=entry.options.get(CONF_STALE_AFTER, DEFAULT_STALE_AFTER),
+        trace_latency=entry.options.get(CONF_TRACE_LATENCY, DEFAULT_TRACE_LATENCY),
+        record_path=record_path,
+        replay_path=replay_path,
+        replay_speed=entry.options.get(CONF_REPLAY_SPEED, DEFAULT_REPLAY_SPEED),
     )
 
-    # TODO:(re-)fetch FW version from coordinator
+    # The firmware version gets refreshed (in the config entry data) whenever
+    # the coordinator has to detect the transport mode again.
 
     # Stores a ref to the coordinator & device info in the HASS data. This will
     # be fetched by the different domains (sensors, buttons, binary sensors)
@@ -50,6 +120,18 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         },
     }
 
+    # Changing the options re-creates the coordinator with the new settings
+    options = dict(entry.options)
+
+    async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+        """Reload a config entry when its options change."""
+        # Storing the detected mode also updates the entry; that alone
+        # doesn't need a reload.
+        if dict(entry.options) != options:
+            await hass.config_entries.async_reload(entry.entry_id)
+
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     return True
 
@@ -61,8 +143,14 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # details
     # print ("freeds unload entry", entry.data)
 
-    unload_ok = await hass.config_entries.async_forward_entry_unload(entry, PLATFORMS)
-    # if unload_ok:
-    # hass.data[DOMAIN].pop(entry.entry_id)
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        # With all entities gone, the coordinator loops stop by themselves
+        common_data = hass.data[DOMAIN].pop(entry.data["uniqueid"])
+        await common_data["coordinator"].async_shutdown()
+
+        # The session belongs to the integration, not to any single device
+        if not hass.data[DOMAIN]:
+            await async_close_session(hass)
 
     return unload_ok
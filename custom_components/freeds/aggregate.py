@@ -0,0 +1,59 @@
+"""Windowed aggregation of sensor values"""
+
+
+class WindowAggregator:
+    """Time-weighted mean, min, max and sample count of a value over a window."""
+
+    # A value holds until the next sample replaces it, so the mean over a
+    # window is the area under that step function divided by the window's
+    # duration. Every sample only adds one rectangle, so it's O(1) per sample
+    # however fast the device sends them. The value at the end of a window
+    # carries over into the next one.
+
+    __slots__ = ("_value", "_at", "_start", "_area", "_min", "_max", "_count")
+
+    def __init__(self):
+        self._value = None
+        self._at = None
+        self._start = None
+        self._area = 0.0
+        self._min = None
+        self._max = None
+        self._count = 0
+
+    def add(self, value, now):
+        """Takes a sample into account"""
+        if self._value is None:
+            self._start = now
+            self._min = self._max = value
+        else:
+            self._area += self._value * (now - self._at)
+            if value < self._min:
+                self._min = value
+            elif value > self._max:
+                self._max = value
+        self._value = value
+        self._at = now
+        self._count += 1
+
+    def close(self, now):
+        """Ends the window; returns (mean, min, max, samples), or None if empty"""
+        if self._value is None:
+            return None
+
+        area = self._area + self._value * (now - self._at)
+        duration = now - self._start
+        mean = area / duration if duration > 0 else self._value
+        result = (mean, self._min, self._max, self._count)
+
+        self._start = self._at = now
+        self._area = 0.0
+        self._min = self._max = self._value
+        self._count = 0
+        return result
+
+    def clear(self):
+        """Forgets everything, e.g. when the device stopped sending data"""
+        self._value = None
+        self._area = 0.0
+        self._count = 0
@@ -1,6 +1,8 @@
 """Platform for sensor integration."""
 from __future__ import annotations
 
+from dataclasses import dataclass
+
 from homeassistant.components.binary_sensor import (
     BinarySensorDeviceClass,
     BinarySensorEntity,
@@ -11,7 +13,12 @@ from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 from homeassistant.helpers.entity import EntityCategory
 
-from .entity import FreeDSEntity
+from .entity import (
+    FreeDSEntity,
+    FreeDSEntityDescription,
+    descriptions_by_firmware,
+    descriptions_for,
+)
 
 from homeassistant.const import (
     UnitOfPower,
@@ -29,6 +36,29 @@ from .const import DOMAIN
 import traceback
 
 
+@dataclass(frozen=True, kw_only=True)
+class FreeDSBinarySensorEntityDescription(
+    FreeDSEntityDescription, BinarySensorEntityDescription
+):
+    """Describes a FreeDS binary sensor"""
+
+
+# The binary sensors of a FreeDS, by section (every firmware has them all)
+BINARY_SENSORS = {
+    "Web": (
+        FreeDSBinarySensorEntityDescription(
+            key="error",
+            json_section="Web",
+            name="Error",
+            device_class=BinarySensorDeviceClass.PROBLEM,
+        ),
+    ),
+}
+
+# {firmware generation: {section: descriptions}}
+BINARY_SENSORS_BY_FIRMWARE = descriptions_by_firmware(BINARY_SENSORS)
+
+
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Add sensors for passed config_entry in HA."""
 
@@ -37,27 +67,24 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     # "data" is a dict like {coordinator, device_info, freeds_id}
     common_data = hass.data[DOMAIN][config_entry.data["uniqueid"]]
 
-    sensors = [
-        FreeDSBinarySensor(
-            name="Error",
-            device_class=BinarySensorDeviceClass.PROBLEM,
-            # icon="mdi:alert",
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Web",
-            json_field="error",
-            **common_data,
-        ),
-    ]
-
-    async_add_entities(sensors)
+    descriptions = descriptions_for(
+        BINARY_SENSORS_BY_FIRMWARE, BINARY_SENSORS, config_entry.data.get("mode")
+    )
+    async_add_entities(
+        [
+            FreeDSBinarySensor(description, **common_data)
+            for section in descriptions.values()
+            for description in section
+        ]
+    )
 
 
 class FreeDSBinarySensor(FreeDSEntity, BinarySensorEntity):
     """An individual FreeDSSensor entry for binary states."""
 
-    def __init__(self, **kwargs):
+    def __init__(self, description, **kwargs):
         # Init FreeDSEntity
-        super().__init__(**kwargs)
+        super().__init__(description, **kwargs)
 
         # Instance attributes built into BinarySensorEntity
         self._attr_is_on = None
@@ -0,0 +1,152 @@
+"""Queue of the toggle commands sent to a FreeDS"""
+
+import asyncio
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait for the device to report the state a command asked for,
+# before deciding that it disagrees
+SETTLE_TIMEOUT = 5
+
+# Toggles sent again for a command, when the device still disagrees
+MAX_RETRIES = 2
+
+
+class CommandQueue:
+    """Serializes, coalesces and reconciles the toggle commands of one FreeDS."""
+
+    # FreeDS only has a "toggle button N" command, which is not idempotent:
+    # deciding to toggle from a stale state (the device reports every few
+    # seconds at best) or toggling twice in a row ends up in the wrong state.
+    #
+    # So entities don't send commands, they set the state they want for a
+    # button. One task per device sends the toggles, one at a time (the ESP32
+    # never gets concurrent requests), and only while the reported state
+    # differs from the wanted one. After each toggle it waits for the device
+    # to report the wanted state; only when it doesn't within SETTLE_TIMEOUT
+    # does it toggle again. Requests made in the meantime simply replace the
+    # wanted state, so a burst of on/off/on turns into at most one toggle.
+
+    def __init__(self, send, read, wait_for_update, name="FreeDS"):
+        # send(button_idx, retry) sends a toggle (retry: the previous one
+        # didn't get confirmed); read(section, field) returns the
+        # reported value of a field (or None); wait_for_update() returns an
+        # awaitable resolved with the next device report.
+        self._send = send
+        self._read = read
+        self._wait_for_update = wait_for_update
+        self.name = name
+        # button_idx -> (json_section, json_field) of its reported state
+        self._buttons = {}
+        # button_idx -> callbacks, called when the wanted state is settled
+        self._listeners = {}
+        # button_idx -> wanted state, for buttons with a command pending
+        self._wanted = {}
+        self._task = None
+
+        self.commands_sent = 0
+        self.commands_coalesced = 0
+        self.commands_retried = 0
+        self.commands_failed = 0
+        # Time from sending a command to the device reporting the wanted
+        # state, for commands that got confirmed
+        self.commands_confirmed = 0
+        self.command_latency = None
+        self.command_latency_total = 0.0
+
+    def add_button(self, button_idx, section, field, settled_callback):
+        """Declares where a button's state is reported; returns a remover"""
+        self._buttons[button_idx] = (section, field)
+        callbacks = self._listeners.setdefault(button_idx, [])
+        callbacks.append(settled_callback)
+        return lambda: callbacks.remove(settled_callback)
+
+    def wanted(self, button_idx):
+        """The state a pending command wants for the button, or None"""
+        return self._wanted.get(button_idx)
+
+    def request(self, button_idx, state):
+        """Asks for a button to be turned on (True) or off (False)"""
+        if button_idx in self._wanted:
+            self.commands_coalesced += 1
+        self._wanted[button_idx] = state
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def reported(self, button_idx):
+        """The state of the button as last reported by the device, or None"""
+        try:
+            return bool(int(self._read(*self._buttons[button_idx])))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def cancel(self):
+        """Drops all pending commands"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._wanted.clear()
+
+    async def _run(self):
+        while self._wanted:
+            button_idx = next(iter(self._wanted))
+            try:
+                await self._settle(button_idx)
+            finally:
+                self._wanted.pop(button_idx, None)
+                for settled_callback in list(self._listeners.get(button_idx, ())):
+                    settled_callback()
+
+    async def _settle(self, button_idx):
+        toggles = 0
+        sent_at = None
+        for _ in iter(int, 1):
+            reported = self.reported(button_idx)
+            if reported is None:
+                _LOGGER.warning(
+                    f"{self.name}: state of button {button_idx} unknown, "
+                    f"not sending any command"
+                )
+                self.commands_failed += 1
+                return
+            if reported == self._wanted[button_idx]:
+                if sent_at is not None:
+                    self.commands_confirmed += 1
+                    self.command_latency = time.monotonic() - sent_at
+                    self.command_latency_total += self.command_latency
+                return
+            if toggles > MAX_RETRIES:
+                _LOGGER.warning(
+                    f"{self.name}: button {button_idx} still not "
+                    f"{'on' if self._wanted[button_idx] else 'off'} after "
+                    f"{toggles} toggles, giving up"
+                )
+                self.commands_failed += 1
+                return
+
+            if toggles:
+                self.commands_retried += 1
+            else:
+                sent_at = time.monotonic()
+            self.commands_sent += 1
+            try:
+                await self._send(button_idx, toggles > 0)
+            except Exception as err:
+                _LOGGER.warning(f"{self.name}: toggling button {button_idx} failed: {err}")
+                # Whether the toggle went through is only known from the
+                # next report, just like after a successful request
+
+            toggles += 1
+            await self._wait_for_state(button_idx)
+
+    async def _wait_for_state(self, button_idx):
+        """Waits until the device reports the wanted state, or SETTLE_TIMEOUT"""
+        try:
+            async with asyncio.timeout(SETTLE_TIMEOUT):
+                while self.reported(button_idx) != self._wanted[button_idx]:
+                    await self._wait_for_update()
+        except TimeoutError:
+            pass
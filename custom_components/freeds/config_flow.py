@@ -1,11 +1,43 @@
 from homeassistant import config_entries
-from .const import DOMAIN
+from homeassistant.core import callback
+from .const import (
+    CONF_AGGREGATION_WINDOW,
+    CONF_DEADBAND_PREFIX,
+    CONF_KEEPALIVE,
+    CONF_MAX_INTERVAL,
+    CONF_MAX_WRITE_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_MIN_WRITE_INTERVAL,
+    CONF_RECORD,
+    CONF_REPLAY_FILE,
+    CONF_REPLAY_SPEED,
+    CONF_SENSITIVITY,
+    CONF_STALE_AFTER,
+    CONF_TRACE_LATENCY,
+    DEFAULT_AGGREGATION_WINDOW,
+    DEFAULT_DEADBANDS,
+    DEFAULT_KEEPALIVE,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MAX_WRITE_INTERVAL,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_MIN_WRITE_INTERVAL,
+    DEFAULT_RECORD,
+    DEFAULT_REPLAY_FILE,
+    DEFAULT_REPLAY_SPEED,
+    DEFAULT_SENSITIVITY,
+    DEFAULT_STALE_AFTER,
+    DEFAULT_TRACE_LATENCY,
+    DOMAIN,
+)
 from homeassistant.const import CONF_HOST, CONF_PORT, CONF_USERNAME, CONF_PASSWORD
 from homeassistant.helpers.service_info.zeroconf import ZeroconfServiceInfo
 import voluptuous as vol
 import logging
+import os
 from typing import Any, Final
 from homeassistant.data_entry_flow import FlowResult
+from .session import async_get_session
+from .throttle import parse_deadband
 import aiohttp
 import re
 
@@ -27,6 +59,11 @@ class FreeDSConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self.default_host = None
         self.default_port = 80
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        return FreeDSOptionsFlow()
+
     async def async_step_zeroconf(
         self, discovery_info: ZeroconfServiceInfo
     ) -> FlowResult:
@@ -34,6 +71,11 @@ class FreeDSConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         # ignore discovery if so.
         for entry in self.hass.config_entries.async_entries():
             if entry.domain == DOMAIN and entry.data.get("host") == discovery_info.host:
+                # The device announced itself again (e.g. it's back after a
+                # power or network outage): don't wait for the backoff.
+                device = self.hass.data.get(DOMAIN, {}).get(entry.data["uniqueid"])
+                if device is not None:
+                    device["coordinator"].async_reconnect_now()
                 return self.async_abort(reason="single_instance_allowed")
 
         self.default_host = discovery_info.host
@@ -119,7 +161,8 @@ class FreeDSConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def _async_get_info(self, host, port=80, user=None, passwd=None):
 
-        session = aiohttp.ClientSession()
+        # The integration-wide session: nothing to close on any exit path
+        session = async_get_session(self.hass)
 
         auth = None
         if user is not None:
@@ -136,8 +179,8 @@ class FreeDSConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         )
 
         try:
-            resp = await session.get(f"http://{host}:{port}/", auth=auth)
-            _LOGGER.info(f"Status response from http://{host}:{port}/ is {resp.status}")
+            async with session.get(f"http://{host}:{port}/", auth=auth) as resp:
+                _LOGGER.info(f"Status response from http://{host}:{port}/ is {resp.status}")
 
             if resp.status == 401:
                 return {"error": "invalid_auth"}
@@ -158,7 +201,6 @@ class FreeDSConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 f"Fetched hostname: {hostname} with unique ID {uniqueid}, firmware version {json['version']}."
             )
 
-            await session.close()
             return {
                 "uniqueid": uniqueid,
                 "fwversion": json["version"],
@@ -176,13 +218,13 @@ class FreeDSConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         )
 
         try:
-            resp = await session.get(f"http://{host}:{port}/", auth=auth)
-            _LOGGER.info(f"Status response from http://{host}:{port}/ is {resp.status}")
+            async with session.get(f"http://{host}:{port}/", auth=auth) as resp:
+                _LOGGER.info(f"Status response from http://{host}:{port}/ is {resp.status}")
 
-            if resp.status == 401:
-                return {"error": "invalid_auth"}
+                if resp.status == 401:
+                    return {"error": "invalid_auth"}
 
-            html = await resp.text()
+                html = await resp.text()
 
             _LOGGER.info(f"Successfully loaded http://{host}:{port}/ .")
 
@@ -237,7 +279,6 @@ class FreeDSConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 f"Scrapped hostname: {hostname} with unique ID {uniqueid}. All scrapping successful."
             )
 
-            await session.close()
             return {
                 "uniqueid": uniqueid,
                 "fwversion": fwversion,
@@ -248,9 +289,108 @@ class FreeDSConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 f"Scraping failed ({err}). The device at {host} doesn't seem to be a FreeDS 1.0.7."
             )
 
-            await session.close()
-
             # raise Exception("invalid_host")
             # _LOGGER.error(Exception(err))
 
             return {"uniqueid": None, "error": "invalid_host", "mode": "sse"}
+
+
+class FreeDSOptionsFlow(config_entries.OptionsFlow):
+    """Options for an already configured FreeDS."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        errors: dict[str, str] = {}
+        if user_input is not None:
+            if user_input[CONF_MIN_INTERVAL] > user_input[CONF_MAX_INTERVAL]:
+                errors["base"] = "invalid_interval"
+            elif user_input[CONF_MIN_WRITE_INTERVAL] > user_input[CONF_MAX_WRITE_INTERVAL]:
+                errors["base"] = "invalid_write_interval"
+            elif user_input.get(CONF_REPLAY_FILE) and not await self.hass.async_add_executor_job(
+                os.path.isfile, self.hass.config.path(user_input[CONF_REPLAY_FILE])
+            ):
+                errors["base"] = "invalid_replay_file"
+            else:
+                try:
+                    for device_class in DEFAULT_DEADBANDS:
+                        parse_deadband(user_input[CONF_DEADBAND_PREFIX + device_class])
+                except ValueError:
+                    errors["base"] = "invalid_deadband"
+                else:
+                    return self.async_create_entry(data=user_input)
+
+        options = user_input or self.config_entry.options
+
+        # One deadband per sensor device class, e.g. "deadband_power"
+        deadbands = {
+            vol.Required(
+                CONF_DEADBAND_PREFIX + device_class,
+                default=options.get(CONF_DEADBAND_PREFIX + device_class, default),
+            ): str
+            for device_class, default in DEFAULT_DEADBANDS.items()
+        }
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_KEEPALIVE,
+                        default=options.get(CONF_KEEPALIVE, DEFAULT_KEEPALIVE),
+                    ): bool,
+                    vol.Required(
+                        CONF_MIN_INTERVAL,
+                        default=options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=600)),
+                    vol.Required(
+                        CONF_MAX_INTERVAL,
+                        default=options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=600)),
+                    vol.Required(
+                        CONF_SENSITIVITY,
+                        default=options.get(CONF_SENSITIVITY, DEFAULT_SENSITIVITY),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                    vol.Required(
+                        CONF_STALE_AFTER,
+                        default=options.get(CONF_STALE_AFTER, DEFAULT_STALE_AFTER),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=5, max=3600)),
+                    vol.Required(
+                        CONF_MIN_WRITE_INTERVAL,
+                        default=options.get(
+                            CONF_MIN_WRITE_INTERVAL, DEFAULT_MIN_WRITE_INTERVAL
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=3600)),
+                    vol.Required(
+                        CONF_MAX_WRITE_INTERVAL,
+                        default=options.get(
+                            CONF_MAX_WRITE_INTERVAL, DEFAULT_MAX_WRITE_INTERVAL
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=1, max=86400)),
+                    **deadbands,
+                    vol.Required(
+                        CONF_AGGREGATION_WINDOW,
+                        default=options.get(
+                            CONF_AGGREGATION_WINDOW, DEFAULT_AGGREGATION_WINDOW
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=3600)),
+                    vol.Required(
+                        CONF_TRACE_LATENCY,
+                        default=options.get(CONF_TRACE_LATENCY, DEFAULT_TRACE_LATENCY),
+                    ): bool,
+                    vol.Required(
+                        CONF_RECORD,
+                        default=options.get(CONF_RECORD, DEFAULT_RECORD),
+                    ): bool,
+                    vol.Optional(
+                        CONF_REPLAY_FILE,
+                        default=options.get(CONF_REPLAY_FILE, DEFAULT_REPLAY_FILE),
+                    ): str,
+                    vol.Required(
+                        CONF_REPLAY_SPEED,
+                        default=options.get(CONF_REPLAY_SPEED, DEFAULT_REPLAY_SPEED),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=1000)),
+                }
+            ),
+            errors=errors,
+        )
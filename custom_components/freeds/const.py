@@ -1,5 +1,157 @@
 DOMAIN = "freeds"
 
+# Key in hass.data of the scheduler shared by all devices
+DATA_FLEET = f"{DOMAIN}_fleet"
+
+# Connection attempts (probes, polls, reconnections) in flight at any time,
+# across all FreeDS devices
+MAX_CONNECTING = 8
+
+# Options (set through the options flow)
+
+CONF_KEEPALIVE = "keepalive"
+DEFAULT_KEEPALIVE = False
+
+# Bounds (in seconds) of the adaptive /json polling interval, and the change
+# in solar/grid power (in watts) that makes it poll as fast as possible
+CONF_MIN_INTERVAL = "min_interval"
+DEFAULT_MIN_INTERVAL = 1
+CONF_MAX_INTERVAL = "max_interval"
+DEFAULT_MAX_INTERVAL = 30
+CONF_SENSITIVITY = "sensitivity"
+DEFAULT_SENSITIVITY = 50
+
+# Seconds without any valid data from the device before its entities
+# become unavailable
+CONF_STALE_AFTER = "stale_after"
+DEFAULT_STALE_AFTER = 20
+
+# Sensor state writes: a value is written when it moves away from the last
+# written one by more than a deadband, but not more often than every
+# min_write_interval seconds; a value within the deadband is still written
+# after max_write_interval seconds (a heartbeat).
+CONF_MIN_WRITE_INTERVAL = "min_write_interval"
+DEFAULT_MIN_WRITE_INTERVAL = 0
+CONF_MAX_WRITE_INTERVAL = "max_write_interval"
+DEFAULT_MAX_WRITE_INTERVAL = 300
+
+# Length (in seconds) of the windows over which measurement sensors are
+# aggregated (time-weighted mean, plus min/max/samples attributes); 0 turns
+# aggregation off, so every significant change gets written instead.
+CONF_AGGREGATION_WINDOW = "aggregation_window"
+DEFAULT_AGGREGATION_WINDOW = 0
+
+# Whether to time each stage of the messages' way through the integration
+# (see latency.py); the results are in the diagnostics
+CONF_TRACE_LATENCY = "trace_latency"
+DEFAULT_TRACE_LATENCY = False
+
+# Debugging: record the raw data received to freeds_<id>.rec (in the
+# configuration directory, see recording.py), and/or replay such a file
+# instead of connecting to the device, at replay_speed times real time (0:
+# as fast as possible). An empty replay_file means no replay.
+CONF_RECORD = "record"
+DEFAULT_RECORD = False
+CONF_REPLAY_FILE = "replay_file"
+DEFAULT_REPLAY_FILE = ""
+CONF_REPLAY_SPEED = "replay_speed"
+DEFAULT_REPLAY_SPEED = 1
+
+# Deadbands per sensor device class, as an absolute value in the sensor's
+# unit ("5") or a percentage of the last written value ("2%"). Option keys
+# are CONF_DEADBAND_PREFIX + the device class.
+CONF_DEADBAND_PREFIX = "deadband_"
+DEFAULT_DEADBANDS = {
+    "power": "5",
+    "voltage": "0.5",
+    "current": "0.05",
+    "energy": "0",
+    "frequency": "0.05",
+    "power_factor": "0.01",
+    "temperature": "0.2",
+}
+
+# Consecutive failures on reused HTTP connections before falling back to
+# one connection per request
+KEEPALIVE_MAX_FAILURES = 3
+
+# Consecutive failures of a stored transport mode, without it ever working,
+# before probing the device again
+REPROBE_AFTER_FAILURES = 3
+
+# Seconds between logging the coordinator counters (debug logging only)
+STATS_LOG_INTERVAL = 300
+
+# Firmware generation of a FreeDS, by the transport mode it's reached with
+# (see FreeDSCoordinator): each generation reports different fields, see
+# the entity descriptions of each platform.
+FIRMWARE_GENERATIONS = {"sse": "1.0", "websocket": "1.1", "getjson": "2.0"}
+
+# Fields of a FreeDS 1.0.x SSE "jsonweb" event, grouped into the sections
+# used by firmware 1.1 and newer (and thus by every entity), as
+# {section: {field: name of the field in the flat 1.0.x event}}
+
+SSE_FIELDS_1_0 = {
+    "Web": {
+        "Oled": "Oled",
+        "screenBrightness": "screenBrightness",
+        "POn": "POn",
+        "PwmMan": "PwmMan",
+        "SenTemp": "SenTemp",
+        "Msg": "Msg",
+        "pwmfrec": "pwmfrec",
+        "pwm": "pwm",
+        "loadCalcWatts": "loadCalcWatts",
+        "baudiosMeter": "baudiosMeter",
+        "workingMode": "wversion",  # Name change between 1.0.x and 1.1-beta
+        # "workingModeName", "masterMode" and "masterModeName" are 1.1-only
+        "invertedSign": "invertedSign",
+        "tempShutdown": "tempShutdown",
+        "error": "error",
+    },
+    "Relays": {
+        "R01": "R01",
+        "R02": "R02",
+        "R03": "R03",
+        "R04": "R04",
+    },
+    "Inverter": {
+        "wsolar": "wsolar",
+        "wgrid": "wgrid",
+        "invTemp": "invTemp",
+        "wtoday": "wtoday",
+        "gridv": "gridv",
+        "pv1c": "pv1c",
+        "pv1v": "pv1v",
+        "pv1w": "pv1w",
+        "pv2c": "pv2c",
+        "pv2v": "pv2v",
+        "pv2w": "pv2w",
+    },
+    "Meter": {
+        "mvoltage": "mvoltage",
+        "mcurrent": "mcurrent",
+        "mpowerFactor": "mpowerFactor",
+        "mfrequency": "mfrequency",
+        "mimportActive": "mimportActive",
+        "mexportActive": "mexportActive",
+    },
+    "Energy": {
+        "KwToday": "KwToday",
+        "KwYesterday": "KwYesterday",
+        "KwTotal": "KwTotal",
+        "KwExportToday": "KwExportToday",
+        "KwExportYesterday": "KwExportYesterday",
+        "KwExportTotal": "KwExportTotal",
+    },
+    "Temperature": {
+        "tempTermo": "tempTermo",
+        "tempTriac": "tempTriac",
+        "tempCustom": "tempCustom",
+        # "customSensor": "Temp. Ambiente"
+    },
+}
+
 # Working modes as defined for FW version 1.0.7
 
 WORKING_MODES_1_0 = {
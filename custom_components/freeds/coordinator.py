@@ -5,8 +5,8 @@ import logging
 import asyncio
 import aiohttp
 import websockets
-import json
 import sys
+import time
 
 from homeassistant.core import callback
 
@@ -17,11 +17,79 @@ from homeassistant.helpers.update_coordinator import (
     UpdateFailed,
 )
 
-from .const import DOMAIN
+from .aggregate import WindowAggregator
+from .commands import CommandQueue
+from .const import (
+    DEFAULT_AGGREGATION_WINDOW,
+    DEFAULT_STALE_AFTER,
+    DEFAULT_KEEPALIVE,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_SENSITIVITY,
+    DOMAIN,
+    KEEPALIVE_MAX_FAILURES,
+    REPROBE_AFTER_FAILURES,
+    STATS_LOG_INTERVAL,
+)
+from .jsondecode import loads
+from .latency import LatencyTracer
+from .normalize import SnapshotNormalizer
+from .profiling import ProfiledCoroutine
+from .rawhttp import RawHTTPClient, decode_json_body, recover_json_body
+from .recording import (
+    JSON_BODY,
+    SSE_CHUNK,
+    WEBSOCKET_MESSAGE,
+    StreamRecorder,
+    read_records,
+)
+from .scheduler import AdaptivePollInterval, FleetScheduler, ReconnectBackoff
+from .session import timeout
+from .sse import SSEParser
 
 _LOGGER = logging.getLogger(__name__)
 
-timeout = aiohttp.ClientTimeout(total=None, sock_read=3)
+GETJSON_TIMEOUT = 10
+
+# Seconds after a command before polling /json again, to confirm it
+CONFIRMATION_DELAY = 0.2
+
+# Toggle command sent over the /jsonWeb websocket. The firmware's websocket
+# command format isn't documented: this mirrors the HTTP request (path and
+# "data" parameter). Commands that don't get confirmed make the coordinator
+# fall back to HTTP for good, see async_send_toggle_button().
+WEBSOCKET_TOGGLE = '{{"command":"tooglebuttons","data":{}}}'
+probe_timeout = aiohttp.ClientTimeout(total=10)
+
+# Returned by a transport loop when the transport never worked
+REPROBE = object()
+
+_MISSING = object()
+
+
+def changed_fields(previous, data):
+    """Returns the set of (section, field) keys that differ between two snapshots.
+
+    A (section, None) key is added for every section with any change, for
+    entities that depend on more than one field of a section.
+    """
+    changed = set()
+    for section in previous.keys() | data.keys():
+        old = previous.get(section)
+        new = data.get(section)
+        if old is new or old == new:
+            continue
+
+        changed.add((section, None))
+        if not isinstance(old, dict):
+            old = {}
+        if not isinstance(new, dict):
+            new = {}
+        for field in old.keys() | new.keys():
+            if old.get(field, _MISSING) != new.get(field, _MISSING):
+                changed.add((section, field))
+
+    return changed
 
 
 class FreeDSCoordinator(DataUpdateCoordinator):
@@ -40,11 +108,31 @@ class FreeDSCoordinator(DataUpdateCoordinator):
     session = None
     resp = None
     host = ""
-    retries = 1
     running = False
+    mode = None
 
     def __init__(
-        self, hass, host, port=80, user=None, passwd=None, name="FreeDS client"
+        self,
+        hass,
+        host,
+        port=80,
+        user=None,
+        passwd=None,
+        name="FreeDS client",
+        session=None,
+        fleet=None,
+        mode=None,
+        on_mode_detected=None,
+        keepalive=DEFAULT_KEEPALIVE,
+        min_interval=DEFAULT_MIN_INTERVAL,
+        max_interval=DEFAULT_MAX_INTERVAL,
+        sensitivity=DEFAULT_SENSITIVITY,
+        aggregation_window=DEFAULT_AGGREGATION_WINDOW,
+        stale_after=DEFAULT_STALE_AFTER,
+        trace_latency=False,
+        record_path=None,
+        replay_path=None,
+        replay_speed=1,
     ):
         """Initialize coordinator."""
         super().__init__(hass, _LOGGER, name=name)
@@ -52,229 +140,724 @@ class FreeDSCoordinator(DataUpdateCoordinator):
         self.port = port
         self.name = name
         self.data = {}
-        self.session = aiohttp.ClientSession(timeout=timeout)
         self.last_http_error = None
-        self._mode = None
+
+        # Transport mode ("getjson", "websocket" or "sse"). When known from a
+        # previous run, it's used straight away and only re-probed if it
+        # never works; newly detected modes are reported to on_mode_detected
+        # (with the firmware version, if known) so they can be stored.
+        self._mode = mode
+        self._fwversion = None
+        self._on_mode_detected = on_mode_detected
+
+        # GET/JSON polling: connection reuse and its metrics
+        self._poll_requested = asyncio.Event()
+        self._confirmation = None
+        self.keepalive = keepalive
+        self._keepalive_failures = 0
+        self.poll_count = 0
+        self.poll_latency = None
+        self.poll_latency_total = 0.0
+        self.poll_interval = AdaptivePollInterval(
+            min_interval, max_interval, sensitivity
+        )
+
+        # All devices share the integration's session (and its connection
+        # pool); a coordinator created without one uses a private session.
+        self._own_session = session is None
+        if session is None:
+            session = aiohttp.ClientSession(timeout=timeout)
+        self.session = session
+
+        # Stale data watchdog: entities become unavailable when no valid data
+        # has arrived for stale_after seconds, whatever the transport. It's a
+        # single timer, only re-armed when it fires and finds fresh data.
+        self.stale_after = stale_after
+        self._fresh_until = None
+        self._watchdog = None
+
+        # Delays between reconnection attempts, for all transports. The
+        # backoff sleep can be cut short by async_reconnect_now().
+        self.backoff = ReconnectBackoff()
+        self._reconnect_requested = asyncio.Event()
+
+        # Spreads delays/connections across all devices; see FleetScheduler
+        self.fleet = fleet or FleetScheduler()
+        self.fleet_key = f"{host}:{port}"
+
+        # Fields aggregated over windows of aggregation_window seconds:
+        # {(json_section, json_field): [WindowAggregator, callbacks...]}
+        self.aggregation_window = aggregation_window
+        self._aggregates = {}
+        self._aggregate_timer = None
+
+        # Every transport's payload ends up as the same sectioned snapshot
+        self.normalizer = SnapshotNormalizer()
+
+        # Per-field dispatch: set of (json_section, json_field) contexts whose
+        # value changed in the latest snapshot, or None to notify everyone.
+        self._changed = None
+        # Contexts of listeners added since the last dispatch; they haven't
+        # seen any data yet, so they're notified regardless of changes.
+        self._new_contexts = set()
+        self.dispatched_callbacks = 0
+        self.skipped_callbacks = 0
+        self._stats_logged_at = time.monotonic()
+
+        # Traffic counters, for the diagnostic sensors and diagnostics dump.
+        # They're plain numbers bumped in place by the transport loops, cheap
+        # enough to always be on. A message is an SSE "jsonweb" event, a
+        # websocket message or a /json response body.
+        self.counters_since = time.monotonic()
+        self.messages_received = 0
+        self.bytes_received = 0
+        # Messages that aren't valid JSON, and dropped
+        self.parse_failures = 0
+        # /json bodies with garbage around the JSON object, decoded anyway
+        self.recovered_payloads = 0
+        # Reconnection attempts (or polls after a failed one)
+        self.reconnects = 0
+        self.last_message_at = None
+
+        # Optional timing of each stage of the messages' way through the
+        # integration, see LatencyTracer; None when not tracing.
+        self.latency = LatencyTracer() if trace_latency else None
+        # cProfile profiler enabled during the steps of the loop task, see
+        # ProfiledCoroutine; set by the freeds.profile service
+        self.profiler = None
+
+        # Debugging: the raw data received can be recorded to a file, and a
+        # recording can be replayed instead of connecting to the device
+        # (the "replay" mode), at replay_speed times real time, or as fast as
+        # possible with a replay_speed of 0.
+        self.recorder = None if record_path is None else StreamRecorder(record_path)
+        self.replay_path = replay_path
+        self.replay_speed = replay_speed
+        if replay_path is not None:
+            self._mode = "replay"
+
+        # Toggle commands go through a queue, see CommandQueue; it waits for
+        # device reports through async_wait_for_update().
+        self._update_waiters = []
+        # In websocket mode, commands are sent over the open websocket until
+        # one of them doesn't get confirmed; otherwise over HTTP.
+        self._websocket = None
+        self.websocket_commands = True
+        self.command_transport = None
+        self.commands_via_websocket = 0
+        self.commands_via_http = 0
+        self.commands = CommandQueue(
+            self.async_send_toggle_button,
+            self._read_field,
+            self.async_wait_for_update,
+            name,
+        )
 
         if user is None:
             self.auth = None
         else:
             self.auth = aiohttp.BasicAuth(user, passwd)
 
+        # /json is read with a tolerant client of its own, since some
+        # firmwares send responses that aiohttp refuses to parse.
+        self.json_client = RawHTTPClient(
+            host,
+            port,
+            headers=None if self.auth is None else {"Authorization": self.auth.encode()},
+            timeout=GETJSON_TIMEOUT,
+        )
+
+    @property
+    def connection_setups(self):
+        """Number of TCP connections opened to poll /json"""
+        return self.json_client.connection_setups
+
+    @property
+    def last_message_age(self):
+        """Seconds since the last message from the device, if any"""
+        if self.last_message_at is None:
+            return None
+        return time.monotonic() - self.last_message_at
+
     @callback
     def async_add_listener(self, update_callback, context):
         remove_handler = super().async_add_listener(update_callback, context)
+        self._new_contexts.add(context)
 
         if not self.running:
             self.running = True
-            asyncio.create_task(self.loop())
+            asyncio.create_task(ProfiledCoroutine(self.loop(), self))
 
         return remove_handler
 
+    @callback
+    def async_add_aggregate(self, section, field, update_callback):
+        """Aggregates a field over windows, calling back with each window's result.
+
+        The callback gets the (mean, min, max, samples) of each window, or
+        None when no data arrived. Returns a function removing the callback.
+        """
+        key = (section, field)
+        aggregate = self._aggregates.setdefault(key, [WindowAggregator()])
+        aggregate.append(update_callback)
+
+        if self._aggregate_timer is None:
+            self._aggregate_timer = self.hass.loop.call_later(
+                self.aggregation_window, self._async_close_windows
+            )
+
+        @callback
+        def remove_aggregate():
+            aggregate.remove(update_callback)
+            if len(aggregate) == 1:
+                del self._aggregates[key]
+            if not self._aggregates and self._aggregate_timer is not None:
+                self._aggregate_timer.cancel()
+                self._aggregate_timer = None
+
+        return remove_aggregate
+
+    @callback
+    def _async_close_windows(self):
+        now = time.monotonic()
+        self._aggregate_timer = self.hass.loop.call_later(
+            self.aggregation_window, self._async_close_windows
+        )
+        for aggregator, *update_callbacks in list(self._aggregates.values()):
+            result = aggregator.close(now)
+            for update_callback in update_callbacks:
+                update_callback(result)
+
+    @callback
+    def _async_check_stale(self):
+        """Watchdog: marks the data as stale unless some arrived meanwhile"""
+        if self.hass.loop.time() < self._fresh_until:
+            self._watchdog = self.hass.loop.call_at(
+                self._fresh_until, self._async_check_stale
+            )
+            return
+
+        self._watchdog = None
+        self.logger.info(
+            f"{self.name}: no data for {self.stale_after} s "
+            f"(last error: {self.last_http_error})"
+        )
+        # Returns null data to mark entities as "not available"
+        self.data = {}
+        self.async_set_update_error(
+            Exception(f"No data for {self.stale_after} s: {self.last_http_error}")
+        )
+
+    @callback
+    def async_set_update_error(self, err):
+        # Values from before the error don't belong to the next window
+        for aggregate in self._aggregates.values():
+            aggregate[0].clear()
+        super().async_set_update_error(err)
+
+    @callback
+    def async_set_updated_data(self, data):
+        """Replaces the data snapshot, notifying only the entities whose field changed."""
+        if self._aggregates:
+            # Every snapshot is a sample, whether the value changed or not
+            now = time.monotonic()
+            for (section, field), aggregate in self._aggregates.items():
+                try:
+                    value = float(data[section][field])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                aggregate[0].add(value, now)
+
+        if self.last_update_success and self.data:
+            self._changed = changed_fields(self.data, data)
+            self._changed.update(self._new_contexts)
+        else:
+            # After an error (or for the very first snapshot) every entity
+            # needs to re-evaluate its availability.
+            self._changed = None
+        self._new_contexts = set()
+        self.backoff.succeeded(time.monotonic())
+
+        self._fresh_until = self.hass.loop.time() + self.stale_after
+        if self._watchdog is None:
+            self._watchdog = self.hass.loop.call_at(
+                self._fresh_until, self._async_check_stale
+            )
+
+        latency = self.latency
+        if latency is not None:
+            start = time.perf_counter()
+        try:
+            super().async_set_updated_data(data)
+        finally:
+            self._changed = None
+        if latency is not None:
+            latency.lap("dispatch", start)
+
+        waiters = self._update_waiters
+        if waiters:
+            self._update_waiters = []
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(data)
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            now = time.monotonic()
+            if now - self._stats_logged_at >= STATS_LOG_INTERVAL:
+                self._stats_logged_at = now
+                self._log_stats()
+
+    @callback
+    def async_merge_updated_data(self, payload):
+        """Merges some sections into the data snapshot, keeping the others."""
+        # Each websocket message only carries some sections (categories).
+        # Replacing the whole snapshot with it would make every entity of the
+        # other sections unavailable until their next message. After an
+        # error, the snapshot starts over from the sections that arrive.
+        latency = self.latency
+        if latency is not None:
+            start = time.perf_counter()
+        data = dict(self.data) if self.last_update_success else {}
+        data.update(self.normalizer.sectioned(payload, data))
+        if latency is not None:
+            latency.lap("normalize", start)
+        self.async_set_updated_data(data)
+
+    def async_wait_for_update(self):
+        """Returns a future resolved with the next data snapshot"""
+        waiter = self.hass.loop.create_future()
+        self._update_waiters.append(waiter)
+        return waiter
+
+    def _read_field(self, section, field):
+        return self.data[section][field]
+
+    def _log_stats(self):
+        """Logs the coordinator's counters (only with debug logging enabled)"""
+        self.logger.debug(
+            f"{self.name} stats: {self.dispatched_callbacks} entity callbacks "
+            f"dispatched, {self.skipped_callbacks} skipped (field unchanged)"
+        )
+        self.logger.debug(
+            f"{self.name} stats: {self.messages_received} messages "
+            f"({self.bytes_received} bytes) received, "
+            f"{self.parse_failures} malformed, "
+            f"{self.recovered_payloads} recovered, "
+            f"{self.reconnects} reconnections"
+        )
+        commands = self.commands
+        if commands.commands_confirmed:
+            self.logger.debug(
+                f"{self.name} stats: {commands.commands_sent} toggles sent, "
+                f"{commands.commands_coalesced} requests coalesced, "
+                f"{commands.commands_retried} retried, "
+                f"{commands.commands_failed} failed, "
+                f"{commands.command_latency_total / commands.commands_confirmed * 1000:.0f} ms "
+                f"mean command-to-confirmed-state latency, "
+                f"{commands.command_latency * 1000:.0f} ms last"
+            )
+        if self.backoff.recoveries:
+            self.logger.debug(
+                f"{self.name} stats: recovered from {self.backoff.recoveries} "
+                f"connection failures, last time after "
+                f"{self.backoff.recovery_time:.1f} s"
+            )
+        if self.poll_count:
+            self.logger.debug(
+                f"{self.name} stats: {self.poll_count} GET/JSON polls "
+                f"({'keep-alive' if self.keepalive else 'close'} connections), "
+                f"{self.connection_setups} TCP connections set up, "
+                f"{self.poll_latency_total / self.poll_count * 1000:.1f} ms "
+                f"mean poll latency, {self.poll_latency * 1000:.1f} ms last, "
+                f"polling every {self.poll_interval.interval:.1f} s"
+            )
+
+    async def async_shutdown(self):
+        """Stops using the network; called when the config entry is unloaded."""
+        await super().async_shutdown()
+        self.commands.cancel()
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        if self._confirmation is not None:
+            self._confirmation.cancel()
+            self._confirmation = None
+        if self._aggregate_timer is not None:
+            self._aggregate_timer.cancel()
+            self._aggregate_timer = None
+        await self.json_client.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self._own_session:
+            await self.session.close()
+
+    @callback
+    def async_update_listeners(self):
+        """Calls the listeners whose context is in the set of changed fields."""
+        changed = self._changed
+        if changed is None:
+            self.dispatched_callbacks += len(self._listeners)
+            return super().async_update_listeners()
+
+        for update_callback, context in list(self._listeners.values()):
+            if context is None or context in changed:
+                self.dispatched_callbacks += 1
+                update_callback()
+            else:
+                self.skipped_callbacks += 1
+
     async def loop(self):
+        # Don't connect at the very same time as every other FreeDS
+        await asyncio.sleep(self.fleet.startup_delay(self.fleet_key))
+
         for _ in iter(int, 1):
             _LOGGER.info(f"Determining sse/websockets/getjson mode for {self.name}")
             mode = await self.query_mode()
             self.mode = mode
-            
+
             if mode == "getjson":
-                return await self.loop_getjson()
+                result = await self.loop_getjson()
             elif mode == "websocket":
-                return await self.loop_websocket()
+                result = await self.loop_websocket()
             elif mode == "sse":
-                return await self.loop_sse()
-            await asyncio.sleep(10 * self.retries)
-            self.retries += 1
-            _LOGGER.info(
-                f"Could not determine sse/websockets/getjson mode for {self.name}, retrying."
-            )
-            self.async_set_update_error("Could not connect")
+                result = await self.loop_sse()
+            elif mode == "replay":
+                result = await self.loop_replay()
+            else:
+                await self._sleep_before_reconnecting()
+                _LOGGER.info(
+                    f"Could not determine sse/websockets/getjson mode for {self.name}, retrying."
+                )
+                continue
+
+            if result is not REPROBE:
+                return
+
+            # The known transport never worked (e.g. the firmware has been
+            # upgraded since the mode was stored): detect it again.
+            _LOGGER.info(f"{self.name}: {mode} mode keeps failing, re-probing")
+            self._mode = None
 
     async def query_mode(self):
         if self._mode is not None:
             return self._mode
 
+        # All candidate endpoints are probed at once. They're awaited in order
+        # of preference, so the first successful one wins as soon as all the
+        # preferred ones have failed; the rest are cancelled.
+        probes = {
+            "getjson": asyncio.create_task(self._probe_getjson()),
+            "websocket": asyncio.create_task(self._probe_websocket()),
+            "sse": asyncio.create_task(self._probe_sse()),
+        }
         try:
-            # Does the host respond at all?
-            resp = await self.session.get(
-                f"http://{self.host}:{self.port}/", auth=self.auth
-            )
-            _LOGGER.info(
-                f"Status response from http://{self.host}:{self.port}/ is {resp.status}"
-            )
+            for mode, probe in probes.items():
+                try:
+                    if await probe:
+                        self._mode = mode
+                        break
+                except Exception as err:
+                    _LOGGER.debug(f"{self.name}: {mode} probe failed: {err}")
+        finally:
+            for probe in probes.values():
+                probe.cancel()
 
-            if resp.status != 200:
-                return
-        except Exception:
-            return
+        if self._mode is not None and self._on_mode_detected is not None:
+            self._on_mode_detected(self._mode, self._fwversion)
 
-        try:
-            # Look for firmware with GET/JSON methode => 2.0.2
-            resp = await self.session.get(
-                f"http://{self.host}:{self.port}/json", auth=self.auth
-            )
-            json = await resp.json()
-            _LOGGER.info(f"{self.name}: /json endpoint detected. Enabling GET-JSON.")
-            self._mode = "getjson"
-            return self._mode
+        return self._mode
 
-        except Exception as err:
-             #If aiohttp throws an exception (like 'Data after Connection: close'),
-             #it confirms the endpoint is active and responding, even if non-compliant.
-             #Workarround for bugy firmware versions 1.1.0021 and 2.0.0
-            error_msg = str(err)
-            if any(indicator in error_msg for indicator in ["200", "400", "Data after"]):
-                _LOGGER.info(f"{self.name}: /json detected via protocol error hint. Status:{resp.status} Enabling GET-JSON.")
-                self._mode = "getjson"
-                return self._mode
-
-            _LOGGER.debug(f"{self.name}: /json endpoint check failed: {err}")
-            pass
+    async def _probe_getjson(self):
+        # Look for firmware with GET/JSON methode => 2.0.2
+        # The tolerant client also reads the non-compliant responses of
+        # buggy firmware versions 1.1.0021 and 2.0.0
+        async with self.fleet.connecting():
+            response = await self.json_client.get("/json")
+        _LOGGER.info(
+            f"Status response from http://{self.host}:{self.port}/json is {response.status}"
+        )
+        if response.status != 200:
+            return False
+        decode_json_body(response.body)
+        _LOGGER.info(f"{self.name}: /json endpoint detected. Enabling GET-JSON.")
+        return True
 
-        try:
-            # Look for firmware 1.1 endpoint; fw 1.1 implements websockets
-            resp = await self.session.get(
-                f"http://{self.host}:{self.port}/api/common", auth=self.auth
-            )
+    async def _probe_websocket(self):
+        # Look for firmware 1.1 endpoint; fw 1.1 implements websockets
+        async with self.fleet.connecting(), self.session.get(
+            f"http://{self.host}:{self.port}/api/common",
+            auth=self.auth,
+            timeout=probe_timeout,
+        ) as resp:
             _LOGGER.info(
                 f"Status response from http://{self.host}:{self.port}/api/common is {resp.status}"
             )
             json = await resp.json()
-            _LOGGER.info(f"Fetched version {json['version']}. Starting WebSocket mode.")
-            self._fwversion = json["version"]
-            self._mode = "websocket"
-            return self._mode
-        except Exception as err:
-            pass
+        _LOGGER.info(f"Fetched version {json['version']}. Starting WebSocket mode.")
+        self._fwversion = json["version"]
+        return True
 
-        try:
-            # Look for SSE endpoint
-            resp = await self.session.get(
-                f"http://{self.host}:{self.port}/events", auth=self.auth
-            )
+    async def _probe_sse(self):
+        # Look for SSE endpoint. It's an endless stream, so don't read it:
+        # leaving the context manager drops the connection.
+        async with self.fleet.connecting(), self.session.get(
+            f"http://{self.host}:{self.port}/events",
+            auth=self.auth,
+            timeout=probe_timeout,
+        ) as resp:
             _LOGGER.info(
                 f"Status response from http://{self.host}:{self.port}/events is {resp.status}"
             )
-            status = resp.status
-            resp.close()
-            if status == 200:
+            if resp.status == 200:
                 _LOGGER.info(f"Starting SSE mode.")
-                self._mode = "sse"
-                return self._mode
-        except Exception as err:
-            pass
+                return True
+        return False
 
     async def loop_getjson(self):
         #Firmwares >= V2.0.2 and workaround for buggy firmwares V1.1.0021 and V2.0.0
-        """Main loop: polling GET/JSON endpoint with protocol error recovery."""
-        self.logger.info(f"Starting GET/JSON loop for {self.name}")
-        url = f"http://{self.host}:{self.port}/json"
-        headers = {"Connection": "close"}
-        decoder = json.JSONDecoder()
+        """Main loop: polling GET/JSON endpoint with a tolerant HTTP client."""
+        self.logger.info(
+            f"Starting GET/JSON loop for {self.name} "
+            f"({'keep-alive' if self.keepalive else 'close'} connections)"
+        )
+        worked = False
+        failures = 0
 
         while self._listeners:
+            # In keep-alive mode, the connection from the previous poll is
+            # reused; otherwise each poll opens and closes its own.
+            reused = False
+            clean = False
+            delay = None
+            latency = self.latency
+            start = time.perf_counter()
             try:
-                # Use the existing coordinator session
-                async with self.session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                    if response.status == 200:
-                        # Standard firmware behavior. Firmwares >= V2.0.2
-                        data = await response.json()
-                        self.getjson_ok = True
-                        self.async_set_updated_data(data)
-                    else:
-                        self.logger.warning(f"{self.name} GET failed with status {response.status}")
-                        self.getjson_ok = False
-                        asyncio.create_task(self.error_getjson(Exception(f"HTTP {response.status}")))
+                async with self.fleet.connecting():
+                    response = await self.json_client.get(
+                        "/json", keepalive=self.keepalive
+                    )
+                reused = response.reused
+                if response.status == 200:
+                    # Compliant and buggy firmwares alike end up here: the
+                    # client reads the body even when the framing is wrong.
+                    if latency is not None:
+                        latency.lap("read", start)
+                    if self.recorder is not None:
+                        self.recorder.record(JSON_BODY, response.body)
+                    data = self._handle_json_body(response.body)
+                    clean = True
+                    delay = self.poll_interval.update(data)
+                    self.async_set_updated_data(data)
+                else:
+                    self.last_http_error = f"HTTP {response.status}"
+                    self.logger.warning(f"{self.name} GET failed with status {response.status}")
 
             except Exception as err:
-                # workaround for buggy firmwares V1.1.0021 and V2.0.0
-                # STRATEGY: aiohttp throws 'Data after Connection: close' BEFORE we can read the body.
-                # The valid JSON is usually inside the error message itself.
-                error_msg = str(err)
-                if "{" in error_msg:
-                    try:
-                        json_start = error_msg.find("{")
-                        # decoder.raw_decode extracts the JSON object and ignores the trailing garbage
-                        data, _ = decoder.raw_decode(error_msg[json_start:])
-
-                        self.getjson_ok = True
-                        self.async_set_updated_data(data)
-                        self.logger.debug(f"Recovered JSON from protocol exception for {self.name}")
-                    except Exception:
-                        self.getjson_ok = False
-                        self.logger.debug(f"Could not recover JSON from error: {err}")
+                # Genuine connection error, or a body that isn't JSON
+                self.last_http_error = err
+                self.logger.debug(f"Connection error for {self.name}: {err}")
+
+            self.poll_count += 1
+            self.poll_latency = time.perf_counter() - start
+            self.poll_latency_total += self.poll_latency
+
+            if self.keepalive and reused:
+                # Only polls over reused connections tell whether the firmware
+                # handles keep-alive: a successful poll over a fresh connection
+                # right after a failed reused one proves nothing.
+                if clean:
+                    self._keepalive_failures = 0
                 else:
-                    # Genuine connection error
-                    self.getjson_ok = False
-                    self.logger.debug(f"Connection error for {self.name}: {err}")
-                    asyncio.create_task(self.error_getjson(err))
+                    self._keepalive_failed(self.last_http_error)
+
+            if clean:
+                worked = True
+            else:
+                failures += 1
+                if not worked and failures >= REPROBE_AFTER_FAILURES:
+                    await self.json_client.close()
+                    return REPROBE
 
-            # Wait 5 seconds before next poll
-            await asyncio.sleep(5)
+            # Poll again sooner when things are moving, later when static;
+            # after a failure, as per the reconnection backoff.
+            if delay is None:
+                self.poll_interval.failed()
+                delay = self.backoff.failed(time.monotonic())
+                self.reconnects += 1
+            await self._sleep_until_poll(delay)
 
+        await self.json_client.close()
         self.logger.info(f"GET/JSON loop stopped for {self.name}")
         self.running = False
 
-    async def error_getjson(self, err):
-        """Returns null data to mark entities as "not available" after some time"""
-        await asyncio.sleep(20)
-        if not self.getjson_ok:
-            self.data = {}
-            self.async_set_update_error(Exception(err))
+    def _handle_json_body(self, body):
+        """Decodes and normalizes a /json body; returns the snapshot"""
+        self.messages_received += 1
+        self.bytes_received += len(body)
+        self.last_message_at = time.monotonic()
+        latency = self.latency
+        if latency is not None:
+            lap = time.perf_counter()
+        data = self._decode_json_body(body)
+        if latency is not None:
+            lap = latency.lap("decode", lap)
+        data = self.normalizer.sectioned(data, self.data)
+        if latency is not None:
+            latency.lap("normalize", lap)
+        return data
 
+    def _decode_json_body(self, body):
+        """Decodes a /json body, counting the ones with garbage around the JSON"""
+        try:
+            return loads(body)
+        except ValueError:
+            pass
+        try:
+            data = recover_json_body(body)
+        except ValueError:
+            self.parse_failures += 1
+            raise
+        self.recovered_payloads += 1
+        return data
+
+    async def _sleep_until_poll(self, delay):
+        """Sleeps before the next poll, unless a poll is requested sooner"""
+        try:
+            async with asyncio.timeout(self.fleet.delay(self.fleet_key, delay)):
+                await self._poll_requested.wait()
+        except TimeoutError:
+            pass
+        self._poll_requested.clear()
+
+    async def _sleep_before_reconnecting(self, minimum=0):
+        """Sleeps before the next connection attempt, as per the backoff"""
+        delay = max(minimum, self.backoff.failed(time.monotonic()))
+        self.reconnects += 1
+        try:
+            async with asyncio.timeout(delay):
+                await self._reconnect_requested.wait()
+        except TimeoutError:
+            pass
+        self._reconnect_requested.clear()
+
+    @callback
+    def async_reconnect_now(self):
+        """Cuts the current reconnection delay short, e.g. when the device
+        has been seen on the network again"""
+        self.logger.debug(f"{self.name}: reconnecting right away")
+        self._reconnect_requested.set()
+        self._poll_requested.set()
+
+    @callback
+    def async_poll_soon(self):
+        """Makes the /json loop poll CONFIRMATION_DELAY seconds from now"""
+        # Single flight: a burst of commands only causes one extra poll
+        if self._confirmation is None:
+            self._confirmation = self.hass.loop.call_later(
+                CONFIRMATION_DELAY, self._request_poll
+            )
+
+    @callback
+    def _request_poll(self):
+        self._confirmation = None
+        self._poll_requested.set()
+
+    def _keepalive_failed(self, err):
+        """Falls back to close-per-request if reused connections keep failing"""
+        # Some ESP32 firmwares advertise keep-alive but drop idle connections
+        # (or answer errors/garbage on them), so polls on reused connections
+        # fail. A few of those without a clean one in between are enough
+        # to tell.
+        self._keepalive_failures += 1
+        if self._keepalive_failures >= KEEPALIVE_MAX_FAILURES:
+            self.logger.warning(
+                f"{self.name} fails on reused connections ({err}); "
+                f"disabling HTTP keep-alive"
+            )
+            self.keepalive = False
+            self._keepalive_failures = 0
 
     async def loop_websocket(self):
         """Main loop: receive websockets"""
         self.logger.info(f"Starting websocket loop for {self.name}")
+        url = f"ws://{self.host}:{self.port}/jsonWeb"
+        worked = False
+        failures = 0
 
-        async for websocket in websockets.connect(
-            f"ws://{self.host}:{self.port}/jsonWeb"
-        ):
+        while self._listeners:
             try:
-                async for message in websocket:
-                    if not self._listeners:
-                        break
-                    self.websocket_ok = True
-                    # The websocket messages from firmware 1.1-beta16 are split
-                    # into several categories: web, relays, energy, temperature
-                    self.async_set_updated_data(json.loads(message))
-
-            except websockets.ConnectionClosed as err:
-                if not self._listeners:
-                    break
-
-                self.websocket_ok = False
-                asyncio.create_task(self.error_websocket(err))
-                await asyncio.sleep(10)
-                self.logger.info(
-                    f"{self.name} ({self.host}:{self.port}) reconnecting websocket..."
-                )
+                async with self.fleet.connecting():
+                    websocket = await websockets.connect(url)
+                self._websocket = websocket
+                try:
+                    while self._listeners:
+                        latency = self.latency
+                        if latency is not None:
+                            lap = time.perf_counter()
+                        # Raw bytes, even for text frames: the decoder doesn't
+                        # need them converted to str first
+                        message = await websocket.recv(decode=False)
+                        worked = True
+                        if latency is not None:
+                            latency.lap("read", lap)
+                        if self.recorder is not None:
+                            self.recorder.record(WEBSOCKET_MESSAGE, message)
+                        self._handle_websocket_message(message)
+                finally:
+                    self._websocket = None
+                    await websocket.close()
 
-                continue
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as err:
+                self.last_http_error = err
+
+            if not self._listeners:
+                break
+
+            if not worked:
+                failures += 1
+                if failures >= REPROBE_AFTER_FAILURES:
+                    return REPROBE
+
+            await self._sleep_before_reconnecting()
+            self.logger.info(
+                f"{self.name} ({self.host}:{self.port}) reconnecting websocket..."
+            )
 
         self.logger.info(f"Websocket loop stopped for {self.name} (no entities)")
         self.running = False
 
-    async def error_websocket(self, err):
-        """Returns null data to mark entities as "not available" after some time"""
-        await asyncio.sleep(20)
-        if not self.websocket_ok:
-            self.data = {}
-            self.async_set_update_error(Exception(err))
-
     async def loop_sse(self):
         """Main loop: creates HTTP connection and fetches data via SSE"""
         self.logger.info(f"Starting SSE request loop for {self.name}")
 
+        # Events can span several reads (and a read can hold several events),
+        # hence an incremental parser. It's kept across reconnections so that
+        # the last event ID and the server-set "retry:" time survive them.
+        parser = SSEParser()
+        worked = False
+        failures = 0
+
         for _ in iter(int, 1):
+            parser.reset()
+            self.resp = None
+            headers = None
+            if parser.last_event_id:
+                headers = {"Last-Event-ID": parser.last_event_id}
             try:
-                self.resp = await self.session.get(
-                    f"http://{self.host}:{self.port}/events", auth=self.auth
-                )
+                async with self.fleet.connecting():
+                    self.resp = await self.session.get(
+                        f"http://{self.host}:{self.port}/events",
+                        auth=self.auth,
+                        headers=headers,
+                    )
                 # print(f'http://{self.host}/events', self.resp.status)
                 self.logger.info(
                     f"Status response from http://{self.host}:{self.port}/events is {self.resp.status}"
                 )
+                if self.resp.status != 200:
+                    self.last_http_error = f"HTTP {self.resp.status}"
+                    self.resp.close()
+                    self.resp = None
             except Exception as err:
                 # print("error connecting", err)
                 # self.async_set_update_error(Exception(err))
@@ -285,9 +868,14 @@ class FreeDSCoordinator(DataUpdateCoordinator):
                     if not self._listeners:
                         break
 
+                    latency = self.latency
+                    if latency is not None:
+                        lap = time.perf_counter()
                     try:
                         assert not self.resp.content.at_eof()
-                        msg = await self.resp.content.readany()
+                        chunk = await self.resp.content.readany()
+                        if latency is not None:
+                            latency.lap("read", lap)
                     except Exception as err:
                         # print("error reading", err)
                         # self.async_set_update_error(Exception(err))
@@ -295,95 +883,10 @@ class FreeDSCoordinator(DataUpdateCoordinator):
 
                         break
                     else:
-                        self.retries = 1
-                        if msg.startswith(b"event: jsonweb\r\ndata:"):
-                            try:
-                                event = json.loads(msg[22:])
-                            except Exception:
-                                # async_set_update_error(Exception("Incomplete JSON message, ignoring."))
-                                self.logger.debug("Incomplete JSON message, ignoring.")
-                                pass
-                            else:
-                                # Send the entire event to the listening
-                                # entities - they'll fetch the appropriate field.
-
-                                # Sections are the default in 1.1-beta firmware
-                                # and are added here for backwards compatibility
-
-                                sectionedEvent = {
-                                    "Web": {
-                                        "Oled": event.get("Oled"),
-                                        "screenBrightness": event.get(
-                                            "screenBrightness"
-                                        ),
-                                        "POn": event.get("POn"),
-                                        "PwmMan": event.get("PwmMan"),
-                                        "SenTemp": event.get("SenTemp"),
-                                        "Msg": event.get("Msg"),
-                                        "pwmfrec": event.get("pwmfrec"),
-                                        "pwm": event.get("pwm"),
-                                        "loadCalcWatts": event.get("loadCalcWatts"),
-                                        "baudiosMeter": event.get("baudiosMeter"),
-                                        # "workingMode": event.get('workingMode'),
-                                        "workingMode": event.get(
-                                            "wversion"
-                                        ),  # Name change
-                                        # "workingModeName": event.get('workingModeName'),
-                                        # "masterMode": event.get('masterMode'),
-                                        # "masterModeName": event.get('masterModeName'),
-                                        "invertedSign": event.get("invertedSign"),
-                                        "tempShutdown": event.get("tempShutdown"),
-                                        "error": event.get("error"),
-                                    },
-                                    "Relays": {
-                                        "R01": event.get("R01"),
-                                        "R02": event.get("R02"),
-                                        "R03": event.get("R03"),
-                                        "R04": event.get("R04"),
-                                    },
-                                    "Inverter": {
-                                        "wsolar": event.get("wsolar"),
-                                        "wgrid": event.get("wgrid"),
-                                        "invTemp": event.get("invTemp"),
-                                        "wtoday": event.get("wtoday"),
-                                        "gridv": event.get("gridv"),
-                                        "pv1c": event.get("pv1c"),
-                                        "pv1v": event.get("pv1v"),
-                                        "pv1w": event.get("pv1w"),
-                                        "pv2c": event.get("pv2c"),
-                                        "pv2v": event.get("pv2v"),
-                                        "pv2w": event.get("pv2w"),
-                                    },
-                                    "Meter": {
-                                        "mvoltage": event.get("mvoltage"),
-                                        "mcurrent": event.get("mcurrent"),
-                                        "mpowerFactor": event.get("mpowerFactor"),
-                                        "mfrequency": event.get("mfrequency"),
-                                        "mimportActive": event.get("mimportActive"),
-                                        "mexportActive": event.get("mexportActive"),
-                                    },
-                                    "Energy": {
-                                        "KwToday": event.get("KwToday"),
-                                        "KwYesterday": event.get("KwYesterday"),
-                                        "KwTotal": event.get("KwTotal"),
-                                        "KwExportToday": event.get("KwExportToday"),
-                                        "KwExportYesterday": event.get(
-                                            "KwExportYesterday"
-                                        ),
-                                        "KwExportTotal": event.get("KwExportTotal"),
-                                    },
-                                    "Temperature": {
-                                        "tempTermo": event.get("tempTermo"),
-                                        "tempTriac": event.get("tempTriac"),
-                                        "tempCustom": event.get("tempCustom"),
-                                        # "customSensor": "Temp. Ambiente"
-                                    },
-                                }
-
-                                self.async_set_updated_data(sectionedEvent)
-                        else:
-                            # Ignore any messages that are not events (uptime, etc)
-                            pass
+                        worked = True
+                        if self.recorder is not None:
+                            self.recorder.record(SSE_CHUNK, chunk)
+                        self._handle_sse_chunk(parser, chunk)
 
             if self.resp is not None:
                 self.resp.close()
@@ -391,31 +894,166 @@ class FreeDSCoordinator(DataUpdateCoordinator):
             if not self._listeners:
                 break
 
-            if self.retries > 1:
-                # Marks entities as "not available" at the *second* consecutive
-                # error
-                self.data = {}
-                self.async_set_update_error(Exception(self.last_http_error))
+            if not worked:
+                failures += 1
+                if failures >= REPROBE_AFTER_FAILURES:
+                    return REPROBE
 
-            await asyncio.sleep(10 * self.retries)
-            self.retries += 1
+            # The server can set its preferred reconnection time (in ms) with
+            # a "retry:" field; don't reconnect any sooner than that.
+            await self._sleep_before_reconnecting(
+                0 if parser.retry is None else parser.retry / 1000
+            )
             self.logger.info(f"{self.name} ({self.host}:{self.port}) reconnecting...")
 
         self.logger.info(f"SSE request loop stopped for {self.name} (no entities)")
         self.running = False
 
-    async def async_send_toggle_button(self, button_idx):
-        """Sends a HTTP POST query to toggle a button"""
+    async def loop_replay(self):
+        """Main loop: feeds a recording (see recording.py) to the entities"""
+        speed = f"{self.replay_speed:g}x" if self.replay_speed else "full speed"
+        self.logger.info(f"Replaying {self.replay_path} for {self.name} ({speed})")
+        try:
+            # Recordings are size-bounded: they're read in one go
+            records = await self.hass.loop.run_in_executor(
+                None, list, read_records(self.replay_path)
+            )
+        except (OSError, ValueError) as err:
+            self.logger.error(f"{self.name} can't replay {self.replay_path}: {err}")
+            self.running = False
+            return
+
+        parser = SSEParser()
+        loop = self.hass.loop
+        started = loop.time()
+        first = records[0][0] if records else 0
+
+        for timestamp, kind, data in records:
+            if not self._listeners:
+                break
+
+            # Keeps the pace of the recording; as fast as possible still
+            # lets everything else run between two records
+            delay = 0
+            if self.replay_speed:
+                delay = started + (timestamp - first) / self.replay_speed - loop.time()
+            await asyncio.sleep(max(0, delay))
+
+            if kind == SSE_CHUNK:
+                self._handle_sse_chunk(parser, data)
+            elif kind == WEBSOCKET_MESSAGE:
+                self._handle_websocket_message(data)
+            elif kind == JSON_BODY:
+                try:
+                    snapshot = self._handle_json_body(data)
+                except ValueError:
+                    continue
+                self.async_set_updated_data(snapshot)
+
+        self.logger.info(f"Replay of {self.replay_path} done for {self.name}")
+        self.running = False
+
+    def _handle_sse_chunk(self, parser, chunk):
+        """Feeds a chunk of the /events stream to the parser, handles its events"""
+        self.bytes_received += len(chunk)
+        for event in parser.feed(chunk):
+            if event.event == "jsonweb":
+                self._handle_sse_event(event)
+            # Ignore any events that are not "jsonweb" (uptime, etc)
+
+    def _handle_websocket_message(self, message):
+        """Decodes a websocket message and merges it into the data snapshot"""
+        self.messages_received += 1
+        self.bytes_received += len(message)
+        self.last_message_at = time.monotonic()
+        latency = self.latency
+        if latency is not None:
+            lap = time.perf_counter()
+        try:
+            payload = loads(message)
+        except ValueError:
+            self.parse_failures += 1
+            self.logger.debug(f"Malformed JSON in websocket message, ignoring: {message!r}")
+            return
+
+        if latency is not None:
+            latency.lap("decode", lap)
+        # The websocket messages from firmware 1.1-beta16 are split
+        # into several categories: web, relays, energy, temperature
+        self.async_merge_updated_data(payload)
+
+    def _handle_sse_event(self, event):
+        """Decodes a "jsonweb" SSE event and sends it to the listening entities"""
+        self.messages_received += 1
+        self.last_message_at = time.monotonic()
+        latency = self.latency
+        if latency is not None:
+            lap = time.perf_counter()
+        try:
+            payload = loads(event.data)
+        except ValueError:
+            self.parse_failures += 1
+            self.logger.debug(f"Malformed JSON in SSE event, ignoring: {event!r}")
+            return
+
+        if latency is not None:
+            lap = latency.lap("decode", lap)
+        # Sections are the default in 1.1-beta firmware and are added
+        # here for backwards compatibility
+        data = self.normalizer.flat(payload, self.data)
+        if latency is not None:
+            latency.lap("normalize", lap)
+        self.async_set_updated_data(data)
+
+    async def async_send_toggle_button(self, button_idx, retry=False):
+        """Sends a command to toggle a button, over the websocket or HTTP
+
+        retry tells that the previous toggle of this command didn't get
+        confirmed by the device.
+        """
+        if self.mode == "replay":
+            # The recording won't act on it, and the device might be real
+            self.logger.info(f"Not toggling button {button_idx}: replaying a recording")
+            return
+
+        if retry and self.command_transport == "websocket" and self.websocket_commands:
+            self.logger.warning(
+                f"{self.name} didn't act on a command sent over the websocket, "
+                f"sending commands over HTTP from now on"
+            )
+            self.websocket_commands = False
+
+        websocket = self._websocket
+        if websocket is not None and self.websocket_commands:
+            self.logger.info(f"Sending websocket command to toggle button {button_idx}")
+            try:
+                await websocket.send(WEBSOCKET_TOGGLE.format(button_idx))
+            except websockets.WebSocketException as err:
+                self.logger.debug(f"{self.name}: websocket command failed ({err})")
+            else:
+                self.command_transport = "websocket"
+                self.commands_via_websocket += 1
+                self.poll_interval.poke()
+                return
+
         self.logger.info(f"Sending HTTP POST to toggle button {button_idx}")
 
         # Note the typo in the URL: "toogle" instead of "toggle". The firmware
         # uses "toogle".
 
-        post_response = await self.session.post(
+        self.command_transport = "http"
+        self.commands_via_http += 1
+        async with self.session.post(
             f"http://{self.host}:{self.port}/tooglebuttons?data={button_idx}",
             auth=self.auth,
-        )
+        ) as post_response:
+            self.logger.info(
+                f"Response status to button toggle: {post_response.status}"
+            )
+            await post_response.text()
 
-        self.logger.info(f"Response status to button toggle: {post_response.status}")
-        await post_response.text()
-             
+        # A relay/PWM change moves the power figures, keep a close eye on them;
+        # and when polling, don't wait for the next poll to see the result.
+        self.poll_interval.poke()
+        if self.mode == "getjson":
+            self.async_poll_soon()
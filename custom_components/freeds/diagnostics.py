@@ -0,0 +1,61 @@
+"""Diagnostics support for FreeDS"""
+
+import time
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """Return diagnostics for a config entry."""
+    coordinator = hass.data[DOMAIN][entry.data["uniqueid"]]["coordinator"]
+    uptime = time.monotonic() - coordinator.counters_since
+
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "mode": coordinator.mode,
+        "connection": {
+            "consecutive_failures": coordinator.backoff.failures,
+            "recoveries": coordinator.backoff.recoveries,
+            "last_time_to_recovery": coordinator.backoff.recovery_time,
+            "reconnects": coordinator.reconnects,
+        },
+        "traffic": {
+            "messages_received": coordinator.messages_received,
+            "mean_messages_per_second": coordinator.messages_received / uptime,
+            "bytes_received": coordinator.bytes_received,
+            "parse_failures": coordinator.parse_failures,
+            "recovered_payloads": coordinator.recovered_payloads,
+            "last_message_age": coordinator.last_message_age,
+            "counting_for": uptime,
+        },
+        "dispatch": {
+            "dispatched_callbacks": coordinator.dispatched_callbacks,
+            "skipped_callbacks": coordinator.skipped_callbacks,
+        },
+        "polling": {
+            "polls": coordinator.poll_count,
+            "connection_setups": coordinator.connection_setups,
+            "keepalive": coordinator.keepalive,
+            "interval": coordinator.poll_interval.interval,
+            "last_latency": coordinator.poll_latency,
+            "mean_latency": (
+                coordinator.poll_latency_total / coordinator.poll_count
+                if coordinator.poll_count
+                else None
+            ),
+        },
+        "latency": None if coordinator.latency is None else coordinator.latency.report(),
+        "commands": {
+            "transport": coordinator.command_transport,
+            "websocket_commands_enabled": coordinator.websocket_commands,
+            "via_websocket": coordinator.commands_via_websocket,
+            "via_http": coordinator.commands_via_http,
+        },
+    }
@@ -1,47 +1,103 @@
+from dataclasses import dataclass
+from time import perf_counter
+
+from homeassistant.core import callback
+from homeassistant.helpers.entity import EntityDescription
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
     DataUpdateCoordinator,
     UpdateFailed,
 )
 
-from .const import DOMAIN
+from .const import DOMAIN, FIRMWARE_GENERATIONS
+
+
+@dataclass(frozen=True, kw_only=True)
+class FreeDSEntityDescription(EntityDescription):
+    """Where a FreeDS entity's value is: the key is the field, in json_section"""
+
+    json_section: str | None = None
+    # Firmware generations (see FIRMWARE_GENERATIONS) reporting the field
+    firmwares: frozenset = frozenset(FIRMWARE_GENERATIONS.values())
+    has_entity_name: bool = True
+
+    def __post_init__(self):
+        # The coordinator context (see FreeDSCoordinator), built once for
+        # all the devices rather than per entity
+        object.__setattr__(self, "context", (self.json_section, self.key))
+
+
+def descriptions_by_firmware(catalogue):
+    """Splits a {section: descriptions} catalogue by firmware generation, as
+    {generation: {section: descriptions}}"""
+    return {
+        firmware: {
+            section: tuple(d for d in descriptions if firmware in d.firmwares)
+            for section, descriptions in catalogue.items()
+        }
+        for firmware in sorted(set(FIRMWARE_GENERATIONS.values()))
+    }
+
+
+def descriptions_for(by_firmware, catalogue, mode):
+    """The descriptions for a device using the given transport mode: all of
+    the catalogue's when the firmware isn't known yet"""
+    return by_firmware.get(FIRMWARE_GENERATIONS.get(mode), catalogue)
 
 
 class FreeDSEntity(CoordinatorEntity):
     """Funcionality common to all FreeDS entities"""
 
+    # Names, icons, units, section and field all come from the (shared,
+    # module-level) entity description; only the per-device state lives in
+    # the entity.
+    entity_description: FreeDSEntityDescription
+    _attr_should_poll = False
+
     def __init__(
         self,
-        name=None,
-        icon=None,
-        entity_category=None,
-        device_class=None,
+        description,
         device_info=None,
         freeds_id=None,
         coordinator=None,
-        json_field=None,
-        json_section=None,
     ):
         """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator, context=json_field)
+        # The context lets the coordinator notify this entity only when its
+        # field (or, without a field, anything in its section) changes.
+        super().__init__(coordinator, context=description.context)
+        self.entity_description = description
 
         # Instance attributes built into Entity:
-        self._attr_icon = icon
-        self._attr_entity_category = entity_category
-        self._attr_has_entity_name = True
-        self._attr_name = name
-        self._attr_unique_id = f"{freeds_id}_{json_field}"
-        self._attr_device_class = device_class
+        self._attr_unique_id = f"{freeds_id}_{description.key}"
         self._attr_available = False
-        self._attr_should_poll = False
         self._attr_device_info = device_info
 
         # FreeDS-specific attributes
-        self.coordinator = coordinator
-        self.json_section = json_section
-        self.json_field = json_field
         self.freeds_id = freeds_id
 
+    @property
+    def json_section(self):
+        return self.entity_description.json_section
+
+    @property
+    def json_field(self):
+        return self.entity_description.key
+
+    def is_reported(self, value):
+        """Whether a value of the entity's field means the device has it"""
+        return value is not None
+
+    @callback
+    def async_write_ha_state(self) -> None:
+        """Writes the state, timing it when the coordinator traces latency"""
+        latency = self.coordinator.latency
+        if latency is None:
+            super().async_write_ha_state()
+            return
+        start = perf_counter()
+        super().async_write_ha_state()
+        latency.lap("write", start)
+
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
 
@@ -49,8 +105,9 @@ class FreeDSEntity(CoordinatorEntity):
         # Sensors should store this in _attr_native_value, while switches and
         # binary sensors should store this in _attr_is_on.
 
+        description = self.entity_description
         try:
-            value = self.coordinator.data[self.json_section][self.json_field]
+            value = self.coordinator.data[description.json_section][description.key]
         except:
             value = None
 
@@ -61,3 +118,58 @@ class FreeDSEntity(CoordinatorEntity):
 
         # elif (self.json_section in self.coordinator.data.keys()):
         return value
+
+
+@callback
+def async_add_entities_when_reported(coordinator, entities, async_add_entities):
+    """Adds each entity once the device reports its field
+
+    Depending on its working mode and wiring, a FreeDS only reports some of
+    the fields there are entities for (see FreeDSEntity.is_reported); the
+    other entities would stay unavailable forever. Entities get added from
+    the first snapshot on, and later on if their field shows up. Returns a
+    function to stop waiting for the fields not reported yet.
+    """
+    # Entities waiting for their field, by section, and the section dicts
+    # already looked at: sections are only looked at again when they change
+    # (the normalizer reuses unchanged section dicts).
+    pending = {}
+    for entity in entities:
+        pending.setdefault(entity.json_section, []).append(entity)
+    seen = {}
+    removed = False
+
+    @callback
+    def async_check_fields():
+        data = coordinator.data
+        if not data or not coordinator.last_update_success:
+            return
+
+        reported = []
+        for section, waiting in list(pending.items()):
+            fields = data.get(section)
+            if not isinstance(fields, dict) or fields is seen.get(section):
+                continue
+            seen[section] = fields
+            for entity in list(waiting):
+                if entity.is_reported(fields.get(entity.json_field)):
+                    waiting.remove(entity)
+                    reported.append(entity)
+            if not waiting:
+                del pending[section]
+
+        if reported:
+            async_add_entities(reported)
+        if not pending:
+            async_stop()
+
+    @callback
+    def async_stop():
+        nonlocal removed
+        if not removed:
+            removed = True
+            remove_listener()
+
+    remove_listener = coordinator.async_add_listener(async_check_fields, None)
+    async_check_fields()
+    return async_stop
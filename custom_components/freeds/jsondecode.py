@@ -0,0 +1,27 @@
+"""JSON decoding of FreeDS payloads, with orjson when it's available"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def stdlib_loads(data):
+    """Decodes JSON from bytes, bytearray, memoryview or str, with the stdlib"""
+    # json.loads() takes bytes, but not memoryviews
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+# Available decoders, by name. All of them take any of bytes, bytearray,
+# memoryview or str, and raise ValueError (or a subclass) on invalid JSON.
+DECODERS = {"json": stdlib_loads}
+if orjson is not None:
+    # orjson parses straight from the buffer (no copy, no str conversion)
+    DECODERS["orjson"] = orjson.loads
+
+DECODER = "orjson" if orjson is not None else "json"
+loads = DECODERS[DECODER]
@@ -0,0 +1,122 @@
+"""Per-stage latency histograms of the messages from a FreeDS"""
+
+import math
+from time import perf_counter
+
+# The stages of a message's way through the integration:
+# - read: the socket read (SSE/websocket: includes waiting for the device to
+#   send something) or the whole HTTP GET (/json)
+# - decode: JSON decoding
+# - normalize: turning the payload into a sectioned snapshot
+# - dispatch: notifying the entities whose field changed, which includes
+#   their state writes
+# - write: each entity's state write, on its own
+STAGES = ("read", "decode", "normalize", "dispatch", "write")
+
+# Buckets are a quarter of an octave wide (each bound is ~19% above the
+# previous one), from 1 µs up to ~16 s. Latencies outside of that range go
+# to the first/last bucket.
+BUCKETS_PER_OCTAVE = 4
+OCTAVES = 24
+MIN_LATENCY = 1e-6
+
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyHistogram:
+    """Distribution of latencies, in a fixed number of logarithmic buckets."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (BUCKETS_PER_OCTAVE * OCTAVES)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Counts a latency (in seconds)"""
+        if seconds > MIN_LATENCY:
+            index = min(
+                int(math.log2(seconds / MIN_LATENCY) * BUCKETS_PER_OCTAVE),
+                len(self.counts) - 1,
+            )
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """The given percentile (in seconds), or None without any latency yet
+
+        That's the upper bound of the bucket it falls in (but no more than the
+        maximum latency), i.e. an overestimate by less than 19%. Beyond the
+        last bucket, that's the maximum latency.
+        """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if index == len(self.counts) - 1:
+            return self.max
+        bound = MIN_LATENCY * 2 ** ((index + 1) / BUCKETS_PER_OCTAVE)
+        return min(bound, self.max)
+
+    def clear(self):
+        counts = self.counts
+        counts[:] = [0] * len(counts)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class LatencyTracer:
+    """One LatencyHistogram per stage (see STAGES) for a device."""
+
+    # Timing goes like this, each lap() recording the time since the previous:
+    #
+    #     start = perf_counter()
+    #     payload = loads(message)
+    #     start = tracer.lap("decode", start)
+    #     data = normalize(payload)
+    #     tracer.lap("normalize", start)
+
+    __slots__ = ("stages",)
+
+    def __init__(self):
+        self.stages = {stage: LatencyHistogram() for stage in STAGES}
+
+    def lap(self, stage, start):
+        """Records the time from start (a perf_counter() value) to now, for the
+        given stage; returns now"""
+        now = perf_counter()
+        self.stages[stage].add(now - start)
+        return now
+
+    def report(self):
+        """Count, mean, percentiles and max of each stage, in milliseconds"""
+        report = {}
+        for stage, histogram in self.stages.items():
+            if not histogram.count:
+                report[stage] = {"count": 0}
+                continue
+            stats = {
+                "count": histogram.count,
+                "mean_ms": round(histogram.total / histogram.count * 1000, 3),
+            }
+            for percent in PERCENTILES:
+                stats[f"p{percent}_ms"] = round(histogram.percentile(percent) * 1000, 3)
+            stats["max_ms"] = round(histogram.max * 1000, 3)
+            report[stage] = stats
+        return report
+
+    def clear(self):
+        for histogram in self.stages.values():
+            histogram.clear()
@@ -1,9 +1,12 @@
 """Platform for sensor integration."""
 from __future__ import annotations
 
+from dataclasses import dataclass
+
 from homeassistant.components.light import (
     ColorMode,
     LightEntity,
+    LightEntityDescription,
     LightEntityFeature,
 )
 from homeassistant.core import HomeAssistant
@@ -11,7 +14,12 @@ from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 from homeassistant.helpers.entity import EntityCategory
 
-from .entity import FreeDSEntity
+from .entity import (
+    FreeDSEntity,
+    FreeDSEntityDescription,
+    descriptions_by_firmware,
+    descriptions_for,
+)
 
 from homeassistant.const import (
     UnitOfPower,
@@ -29,6 +37,36 @@ from .const import DOMAIN
 import traceback
 
 
+@dataclass(frozen=True, kw_only=True)
+class FreeDSLightEntityDescription(FreeDSEntityDescription, LightEntityDescription):
+    """Describes a FreeDS light: on/off is the key, in json_section"""
+
+    button_idx: int
+    brightness_field: str
+
+    def __post_init__(self):
+        # Notified of any change in the section: on/off and brightness
+        object.__setattr__(self, "context", (self.json_section, None))
+
+
+# The lights of a FreeDS, by section (every firmware has them all)
+LIGHTS = {
+    "Web": (
+        FreeDSLightEntityDescription(
+            key="Oled",
+            json_section="Web",
+            name="Backlight",
+            entity_category=EntityCategory.DIAGNOSTIC,
+            button_idx=5,
+            brightness_field="screenBrightness",
+        ),
+    ),
+}
+
+# {firmware generation: {section: descriptions}}
+LIGHTS_BY_FIRMWARE = descriptions_by_firmware(LIGHTS)
+
+
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Add lights for passed config_entry in HA."""
 
@@ -37,28 +75,29 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     # "data" is a dict like {coordinator, device_info, freeds_id}
     common_data = hass.data[DOMAIN][config_entry.data["uniqueid"]]
 
-    lights = [
-        FreeDSLight(
-            name="Backlight",
-            # icon="mdi:alert",
-            entity_category=EntityCategory.DIAGNOSTIC,
-            button_idx=5,
-            json_section="Web",
-            # json_field_on="Oled",
-            # json_field_brightness="screenBrightness",
-            **common_data,
-        ),
-    ]
-
-    async_add_entities(lights)
+    descriptions = descriptions_for(
+        LIGHTS_BY_FIRMWARE, LIGHTS, config_entry.data.get("mode")
+    )
+    async_add_entities(
+        [
+            FreeDSLight(description, **common_data)
+            for section in descriptions.values()
+            for description in section
+        ]
+    )
 
 
 class FreeDSLight(FreeDSEntity, LightEntity):
     """An individual FreeDSSensor entry for binary states."""
 
-    def __init__(self, button_idx=None, **kwargs):
+    entity_description: FreeDSLightEntityDescription
+
+    def __init__(self, description, **kwargs):
         # Init FreeDSEntity
-        super().__init__(**kwargs)
+        super().__init__(description, **kwargs)
+
+        # As when the backlight had no field of its own
+        self._attr_unique_id = f"{self.freeds_id}_None"
 
         # Instance attributes built into ToggleEntity
         self._attr_is_on = None
@@ -69,15 +108,22 @@ class FreeDSLight(FreeDSEntity, LightEntity):
         self._attr_color_mode = ColorMode.BRIGHTNESS
 
         # FreeDS-specific
-        self._button_idx = button_idx
+        self._button_idx = description.button_idx
 
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
 
-        self.json_field = "Oled"
-        value_on = super()._handle_coordinator_update()
-        self.json_field = "screenBrightness"
-        value_bright = super()._handle_coordinator_update()
+        description = self.entity_description
+        try:
+            fields = self.coordinator.data[description.json_section]
+            value_on = fields[description.key]
+            value_bright = fields.get(description.brightness_field)
+        except:
+            value_on = value_bright = None
+
+        if not self.coordinator.last_update_success or value_on is None:
+            self._attr_available = False
+            self.async_write_ha_state()
 
         if value_on is not None:
             value_on = bool(int(value_on))
@@ -98,14 +144,28 @@ class FreeDSLight(FreeDSEntity, LightEntity):
         else:
             return 1 + self._attr_brightness * 254 / 100
 
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # Once a command is settled, the reported state shows again
+        self.async_on_remove(
+            self.coordinator.commands.add_button(
+                self._button_idx,
+                self.json_section,
+                self.json_field,
+                self.async_write_ha_state,
+            )
+        )
+
+    @property
+    def is_on(self):
+        # Optimistic: while a command is pending, show the state it asked for
+        wanted = self.coordinator.commands.wanted(self._button_idx)
+        return self._attr_is_on if wanted is None else wanted
+
     async def async_turn_on(self, **kwargs):
-        if self.is_on:
-            pass
-        else:
-            return await self.coordinator.async_send_toggle_button(self._button_idx)
+        self.coordinator.commands.request(self._button_idx, True)
+        self.async_write_ha_state()
 
     async def async_turn_off(self, **kwargs):
-        if self.is_on:
-            return await self.coordinator.async_send_toggle_button(self._button_idx)
-        else:
-            pass
+        self.coordinator.commands.request(self._button_idx, False)
+        self.async_write_ha_state()
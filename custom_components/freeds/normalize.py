@@ -0,0 +1,80 @@
+"""Normalization of every transport's payload into one snapshot shape"""
+
+from operator import itemgetter
+
+from .const import SSE_FIELDS_1_0
+
+
+def _getter(keys):
+    """Returns a function fetching the given keys of a dict, as a tuple"""
+    if len(keys) == 1:
+        # itemgetter() of a single key returns the bare value
+        key = keys[0]
+        return lambda event: (event[key],)
+    return itemgetter(*keys)
+
+
+class SnapshotNormalizer:
+    """Turns SSE, websocket and /json payloads into sectioned snapshots."""
+
+    # Entities read coordinator.data[section][field]. Firmware 1.0.x sends
+    # flat SSE events, which get sectioned through a field table; newer
+    # firmwares already send sections.
+    #
+    # Either way, a section whose values didn't change since the previous
+    # snapshot is not re-created: the previous snapshot's dict is reused.
+    # Besides saving allocations, that lets change detection skip unchanged
+    # sections with an identity check.
+
+    __slots__ = ("_sections", "_event", "_values", "_snapshot")
+
+    def __init__(self, table=SSE_FIELDS_1_0):
+        # Precompiled table: (section, field names, keys in the flat event,
+        # a getter for all those keys at once)
+        sections = []
+        for section, fields in table.items():
+            keys = tuple(fields.values())
+            sections.append((section, tuple(fields), keys, _getter(keys)))
+        self._sections = tuple(sections)
+        # The last flat event, its values per section, and its snapshot
+        self._event = None
+        self._values = {}
+        self._snapshot = None
+
+    def flat(self, event, previous):
+        """Sections a flat (1.0.x) event, reusing unchanged sections of previous."""
+        if previous is self._snapshot and event == self._event:
+            # Nothing moved (e.g. at night): same snapshot as before
+            return previous
+
+        cached = self._values if previous is self._snapshot else {}
+        values_by_section = {}
+        snapshot = {}
+        for section, fields, keys, getter in self._sections:
+            try:
+                values = getter(event)
+            except KeyError:
+                # Not every firmware version sends every field
+                values = tuple(map(event.get, keys))
+            values_by_section[section] = values
+
+            if cached.get(section) == values:
+                snapshot[section] = previous[section]
+            else:
+                snapshot[section] = dict(zip(fields, values))
+
+        self._event = event
+        self._values = values_by_section
+        self._snapshot = snapshot
+        return snapshot
+
+    def sectioned(self, payload, previous):
+        """Copies a sectioned payload, reusing unchanged sections of previous."""
+        snapshot = {}
+        for section, fields in payload.items():
+            old = previous.get(section)
+            if old is not None and old == fields:
+                snapshot[section] = old
+            else:
+                snapshot[section] = fields
+        return snapshot
@@ -0,0 +1,159 @@
+"""Minimal, tolerant HTTP/1.x client for the FreeDS /json endpoint"""
+
+import asyncio
+import json
+
+from .jsondecode import loads
+
+
+class HTTPProtocolError(Exception):
+    """The device's answer doesn't even look like an HTTP response."""
+
+
+class RawResponse:
+    """Status and body of a response, as read by RawHTTPClient."""
+
+    __slots__ = ("status", "body", "reused")
+
+    def __init__(self, status, body, reused):
+        self.status = status
+        self.body = body
+        # Whether the request went over a kept-alive connection
+        self.reused = reused
+
+
+class RawHTTPClient:
+    """Reads responses straight off the socket, tolerating framing violations."""
+
+    # Firmwares 1.1.0021 and 2.0.0 answer /json with a response that
+    # declares "Connection: close" and an empty body, and then send the JSON
+    # anyway. Strict parsers (like aiohttp's) bail out with "Data after
+    # Connection: close" before the body can be read.
+    #
+    # This client only needs to understand enough HTTP/1.x to poll a FreeDS:
+    # when the connection is to be closed (either side said so), the body is
+    # everything up to EOF, whatever the headers claim. Only kept-alive
+    # connections rely on Content-Length/chunked framing, and any garbage
+    # found where a status line should be makes the request fail, which the
+    # coordinator takes as a sign to stop using keep-alive.
+
+    def __init__(self, host, port=80, headers=None, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._headers = "".join(
+            f"{name}: {value}\r\n" for name, value in (headers or {}).items()
+        )
+        self._reader = None
+        self._writer = None
+        self.connection_setups = 0
+
+    async def get(self, path, keepalive=False):
+        """Performs a GET request, returns a RawResponse."""
+        reused = self._writer is not None
+        try:
+            async with asyncio.timeout(self.timeout):
+                if not reused:
+                    self._reader, self._writer = await asyncio.open_connection(
+                        self.host, self.port
+                    )
+                    self.connection_setups += 1
+
+                self._writer.write(
+                    (
+                        f"GET {path} HTTP/1.1\r\n"
+                        f"Host: {self.host}:{self.port}\r\n"
+                        f"Connection: {'keep-alive' if keepalive else 'close'}\r\n"
+                        f"{self._headers}\r\n"
+                    ).encode("latin-1")
+                )
+                status, body, close = await self._read_response(keepalive)
+        except BaseException:
+            await self.close()
+            raise
+
+        if close:
+            await self.close()
+
+        return RawResponse(status, body, reused)
+
+    async def _read_response(self, keepalive):
+        reader = self._reader
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+
+        status_line = lines[0].split(" ", 2)
+        if len(status_line) < 2 or not status_line[0].startswith("HTTP/1."):
+            raise HTTPProtocolError(f"Not an HTTP response: {lines[0][:40]!r}")
+        status = int(status_line[1])
+
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        close = (
+            not keepalive
+            or connection == "close"
+            or (status_line[0] == "HTTP/1.0" and connection != "keep-alive")
+        )
+
+        if close:
+            # Tolerant path: ignore framing, the body ends when the socket does
+            return status, await reader.read(), True
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            return status, await self._read_chunked(), False
+
+        if "content-length" in headers:
+            length = int(headers["content-length"])
+            return status, await reader.readexactly(length), False
+
+        # No framing at all: the body can only end with the connection
+        return status, await reader.read(), True
+
+    async def _read_chunked(self):
+        reader = self._reader
+        chunks = []
+        for _ in iter(int, 1):
+            size_line = await reader.readuntil(b"\r\n")
+            size = int(size_line.split(b";", 1)[0], 16)
+            if size == 0:
+                # Skip trailers, up to the final empty line
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    async def close(self):
+        """Closes the kept-alive connection, if any."""
+        writer = self._writer
+        self._reader = self._writer = None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+_decoder = json.JSONDecoder()
+
+
+def decode_json_body(body):
+    """Decodes a JSON body, ignoring any garbage around the JSON object."""
+    try:
+        return loads(body)
+    except ValueError:
+        return recover_json_body(body)
+
+
+def recover_json_body(body):
+    """Decodes the JSON object in a body with garbage around it"""
+    # Some firmwares pad the body; skip up to the first "{" and ignore
+    # anything after the end of the object.
+    text = body.decode("utf-8", "replace")
+    return _decoder.raw_decode(text, text.index("{"))[0]
@@ -0,0 +1,88 @@
+"""Recordings of the raw data received from a FreeDS, for debugging"""
+
+import os
+import struct
+import time
+
+# What a record holds, i.e. how the coordinator received it
+SSE_CHUNK = 0
+WEBSOCKET_MESSAGE = 1
+JSON_BODY = 2
+
+# A recording starts with MAGIC, followed by records: a header (wall-clock
+# time as a double, kind, length of the data) then the data, as received.
+MAGIC = b"FreeDS raw stream 1\n"
+_HEADER = struct.Struct("<dBI")
+
+# Recordings are rotated (to .1, .2) when they'd grow beyond RECORD_MAX_BYTES
+RECORD_MAX_BYTES = 10 * 2**20
+RECORD_BACKUPS = 2
+
+
+class StreamRecorder:
+    """Appends what a coordinator receives to a file, rotating it by size."""
+
+    # The file is only opened once something is recorded, and writes are
+    # buffered: the event loop only blocks (briefly) when a buffer's worth
+    # has to be written out, or on rotation.
+
+    def __init__(self, path, max_bytes=RECORD_MAX_BYTES, backups=RECORD_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+        self._size = 0
+
+    def record(self, kind, data, now=None):
+        """Appends some data, as received now (or at the given time.time())"""
+        if self._file is None:
+            self._open()
+        size = _HEADER.size + len(data)
+        if self._size + size > self.max_bytes and self._size > len(MAGIC):
+            self._rotate()
+        self._file.write(_HEADER.pack(time.time() if now is None else now, kind, len(data)))
+        self._file.write(data)
+        self._size += size
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        if not self._size:
+            self._file.write(MAGIC)
+            self._size = len(MAGIC)
+
+    def _rotate(self):
+        self.close()
+        for backup in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{backup}"):
+                os.replace(f"{self.path}.{backup}", f"{self.path}.{backup + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+def read_records(path):
+    """Yields the (time, kind, data) records of a recording
+
+    Raises ValueError if the file isn't a recording. A record cut short
+    (e.g. recorded when Home Assistant stopped) ends the recording.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a FreeDS recording")
+        for _ in iter(int, 1):
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            timestamp, kind, length = _HEADER.unpack(header)
+            data = file.read(length)
+            if len(data) < length:
+                return
+            yield timestamp, kind, data
@@ -0,0 +1,196 @@
+"""Scheduling of the network activity of FreeDS devices"""
+
+import asyncio
+import random
+import zlib
+
+# Fields whose variation drives the polling interval
+POWER_FIELDS = (("Inverter", "wsolar"), ("Inverter", "wgrid"))
+PWM_FIELD = ("Web", "pwm")
+SWITCH_FIELDS = (
+    ("Relays", "R01"),
+    ("Relays", "R02"),
+    ("Relays", "R03"),
+    ("Relays", "R04"),
+    ("Web", "POn"),
+    ("Web", "PwmMan"),
+)
+
+# A change of this many PWM percentage points counts as fast-moving
+PWM_THRESHOLD = 5
+
+# How much the interval grows after each poll where nothing moved
+BACKOFF_FACTOR = 1.5
+
+# Reconnection delays (in seconds): the first retry is immediate, then up to
+# RECONNECT_BASE, twice that, etc. but never more than RECONNECT_CAP
+RECONNECT_BASE = 1
+RECONNECT_CAP = 60
+
+
+def _number(data, section, field):
+    try:
+        return float(data[section][field])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class AdaptivePollInterval:
+    """Picks the delay before the next poll from the recent signal dynamics."""
+
+    # When the solar/grid power moves by at least `sensitivity` watts between
+    # two polls, the PWM moves noticeably, or a relay/PWM switch flips (or a
+    # command was just sent), the interval drops to `min_interval`.
+    # Otherwise it grows geometrically, up to `max_interval`; at night (no
+    # production, nothing moving) that's where it stays.
+
+    __slots__ = ("min_interval", "max_interval", "sensitivity", "interval", "_last")
+
+    def __init__(self, min_interval, max_interval, sensitivity):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.sensitivity = sensitivity
+        self.interval = min_interval
+        self._last = None
+
+    def update(self, data):
+        """Takes a new snapshot into account; returns the next interval."""
+        last = self._last
+        self._last = data
+
+        if last is None or self._moving(last, data):
+            self.interval = self.min_interval
+        else:
+            self._back_off()
+
+        return self.interval
+
+    def failed(self):
+        """A poll failed; returns the next interval."""
+        self._back_off()
+        return self.interval
+
+    def poke(self):
+        """Something happened (e.g. a command), poll soon."""
+        self.interval = self.min_interval
+
+    def _back_off(self):
+        self.interval = min(self.interval * BACKOFF_FACTOR, self.max_interval)
+
+    def _moving(self, last, data):
+        for section, field in POWER_FIELDS:
+            old = _number(last, section, field)
+            new = _number(data, section, field)
+            if old is not None and new is not None:
+                if abs(new - old) >= self.sensitivity:
+                    return True
+
+        old = _number(last, *PWM_FIELD)
+        new = _number(data, *PWM_FIELD)
+        if old is not None and new is not None and abs(new - old) >= PWM_THRESHOLD:
+            return True
+
+        for section, field in SWITCH_FIELDS:
+            if _number(last, section, field) != _number(data, section, field):
+                return True
+
+        return False
+
+
+class ReconnectBackoff:
+    """Delays between reconnection attempts, and the time it took to recover."""
+
+    # Capped exponential backoff with full jitter: after the n-th consecutive
+    # failure, wait a random time between 0 and min(cap, base * 2**(n-1)).
+    # The first retry is immediate (most failures are a dropped connection,
+    # not a device that's gone), the cap keeps a device that was offline all
+    # night from taking many minutes to come back, and the jitter spreads
+    # the reconnections of many devices after a network outage.
+
+    __slots__ = (
+        "base",
+        "cap",
+        "failures",
+        "failed_at",
+        "recovery_time",
+        "recoveries",
+        "_random",
+    )
+
+    def __init__(self, base=RECONNECT_BASE, cap=RECONNECT_CAP):
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+        # When the current run of failures started, if any
+        self.failed_at = None
+        # Time from the first failure to the next success, last time
+        self.recovery_time = None
+        self.recoveries = 0
+        self._random = random.Random()
+
+    def failed(self, now):
+        """A connection attempt failed (or an established one dropped);
+        returns the delay before the next attempt."""
+        if self.failed_at is None:
+            self.failed_at = now
+        failures = self.failures
+        self.failures += 1
+        if not failures:
+            return 0
+        return self._random.uniform(0, min(self.cap, self.base * 2 ** (failures - 1)))
+
+    def succeeded(self, now):
+        """Data arrived: resets the backoff"""
+        if self.failed_at is not None:
+            self.recovery_time = now - self.failed_at
+            self.recoveries += 1
+            self.failed_at = None
+        self.failures = 0
+
+
+class FleetScheduler:
+    """Spreads the network activity of all FreeDS devices over time."""
+
+    # Left alone, every coordinator starts at the same time (when Home
+    # Assistant starts) and sleeps for the same fixed delays, so after a
+    # Wi-Fi outage all devices get polled/reconnected in the same
+    # millisecond. The scheduler:
+    # - delays the start of each device by a deterministic offset (from a
+    #   hash of its key) within a startup window,
+    # - stretches/shrinks every delay by a per-device factor (also
+    #   deterministic), so that devices drift apart instead of staying in
+    #   phase, plus some random jitter,
+    # - caps the number of connection attempts in flight, fleet-wide.
+
+    def __init__(self, max_connecting=8, startup_window=3, spread=0.1, jitter=0.1):
+        self.startup_window = startup_window
+        self.spread = spread
+        self.jitter = jitter
+        self._connecting = asyncio.Semaphore(max_connecting)
+        self._random = random.Random()
+
+    @staticmethod
+    def phase(key):
+        """A stable pseudo-random number in [0, 1) for the given device key"""
+        return zlib.crc32(key.encode()) / 2**32
+
+    def startup_delay(self, key):
+        """Seconds to wait before a device first connects"""
+        return self.phase(key) * self.startup_window
+
+    def delay(self, key, base):
+        """Spreads a delay (in seconds) for the given device"""
+        factor = (
+            1
+            + self.spread * (2 * self.phase(key) - 1)
+            + self.jitter * self._random.uniform(-1, 1)
+        )
+        return base * factor
+
+    async def sleep(self, key, base):
+        """Sleeps for a spread version of the given delay"""
+        await asyncio.sleep(self.delay(key, base))
+
+    def connecting(self):
+        """Async context manager holding one of the connection attempt slots"""
+        return self._connecting
@@ -1,9 +1,12 @@
 """Platform for sensor integration."""
 from __future__ import annotations
 
+from dataclasses import dataclass
+
 from homeassistant.components.sensor import (
     SensorDeviceClass,
     SensorEntity,
+    SensorEntityDescription,
     SensorStateClass,
 )
 from homeassistant.core import HomeAssistant
@@ -18,22 +21,61 @@ from homeassistant.const import (
     UnitOfElectricPotential,
     UnitOfElectricCurrent,
     UnitOfFrequency,
+    UnitOfInformation,
+    UnitOfTime,
     PERCENTAGE,
 )
 
 import random
+import time
+
+from homeassistant.core import callback
 
 from .const import (
+    CONF_DEADBAND_PREFIX,
+    CONF_MAX_WRITE_INTERVAL,
+    CONF_MIN_WRITE_INTERVAL,
+    DEFAULT_DEADBANDS,
+    DEFAULT_MAX_WRITE_INTERVAL,
+    DEFAULT_MIN_WRITE_INTERVAL,
     DOMAIN,
     WORKING_MODES_1_0,
     WORKING_MODES_1_1,
 )
 
-from .entity import FreeDSEntity
+from .entity import (
+    FreeDSEntity,
+    FreeDSEntityDescription,
+    async_add_entities_when_reported,
+    descriptions_by_firmware,
+    descriptions_for,
+)
+from .throttle import WriteFilter, parse_deadband
 
 import traceback
 
 
+@dataclass(frozen=True, kw_only=True)
+class FreeDSSensorEntityDescription(FreeDSEntityDescription, SensorEntityDescription):
+    """Describes a FreeDS sensor; entity_class defaults to FreeDSNumericSensor"""
+
+    entity_class: type | None = None
+
+
+@dataclass(frozen=True, kw_only=True)
+class FreeDSDiagnosticSensorEntityDescription(FreeDSSensorEntityDescription):
+    """Describes a sensor showing a coordinator attribute (the key, by default)"""
+
+    attribute: str | None = None
+    entity_category: EntityCategory | None = EntityCategory.DIAGNOSTIC
+    entity_registry_enabled_default: bool = False
+
+    def __post_init__(self):
+        super().__post_init__()
+        if self.attribute is None:
+            object.__setattr__(self, "attribute", self.key)
+
+
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Add sensors for passed config_entry in HA."""
 
@@ -42,423 +84,658 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     # "data" is a dict like {coordinator, device_info, freeds_id}
     common_data = hass.data[DOMAIN][config_entry.data["uniqueid"]]
 
+    # The sensors of the device's firmware generation, if known already
+    descriptions = descriptions_for(
+        SENSORS_BY_FIRMWARE, SENSORS, config_entry.data.get("mode")
+    )
     sensors = [
-        FreeDSNumericSensor(
+        (description.entity_class or FreeDSNumericSensor)(description, **common_data)
+        for section in descriptions.values()
+        for description in section
+    ]
+
+    # Figures about the connection to the FreeDS rather than from it; see
+    # FreeDSDiagnosticSensor
+    diagnostics = [
+        (description.entity_class or FreeDSDiagnosticSensor)(description, **common_data)
+        for description in DIAGNOSTIC_SENSORS
+    ]
+
+    aggregate = common_data["coordinator"].aggregation_window > 0
+    for sensor in sensors:
+        sensor.write_filter = write_filter(sensor.device_class, config_entry.options)
+        if isinstance(sensor, FreeDSNumericSensor):
+            # Energy counters and such are never averaged
+            sensor.aggregate = (
+                aggregate and sensor.state_class == SensorStateClass.MEASUREMENT
+            )
+
+    # Only the sensors whose field the FreeDS actually reports get added;
+    # the diagnostic ones always are.
+    async_add_entities(diagnostics)
+    config_entry.async_on_unload(
+        async_add_entities_when_reported(
+            common_data["coordinator"], sensors, async_add_entities
+        )
+    )
+
+
+def write_filter(device_class, options):
+    """Builds the state write filter of a sensor, from the entry options"""
+    deadband = options.get(
+        CONF_DEADBAND_PREFIX + str(device_class), DEFAULT_DEADBANDS.get(device_class, "0")
+    )
+    try:
+        deadband, relative = parse_deadband(deadband)
+    except ValueError:
+        deadband, relative = parse_deadband(DEFAULT_DEADBANDS.get(device_class, "0"))
+
+    return WriteFilter(
+        deadband,
+        relative,
+        options.get(CONF_MIN_WRITE_INTERVAL, DEFAULT_MIN_WRITE_INTERVAL),
+        options.get(CONF_MAX_WRITE_INTERVAL, DEFAULT_MAX_WRITE_INTERVAL),
+    )
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class FreeDSSensor(FreeDSEntity, SensorEntity):
+    """An individual FreeDSsensor entry."""
+
+    def __init__(self, description, **kwargs):
+        # Init FreeDSEntity
+        super().__init__(description, **kwargs)
+
+        # Instance attributes built into SensorEntity:
+        self._attr_native_value = None
+
+        # All sensors should start as unavailable. Some of them will never be,
+        # depending on the FreeDS Working Mode.
+        self._attr_available = False
+
+        # Holds back writes of insignificant changes (see WriteFilter); set
+        # from the entry options when the sensors are set up.
+        self.write_filter = None
+        self._pending_write = None
+        self._pending_value = None
+
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+
+        value = super()._handle_coordinator_update()
+
+        if value is not None and (
+            not self._attr_available or value != self._attr_native_value
+        ):
+            self._async_write_value(value)
+
+    @callback
+    def _async_write_value(self, value):
+        """Writes a new value, now or later, unless the write filter drops it"""
+        number = _number(value)
+        if self.write_filter is None or number is None or not self._attr_available:
+            # Becoming available is always written straight away
+            self._async_write_now(value)
+            return
+
+        delay = self.write_filter.check(number, time.monotonic())
+        if delay is None:
+            # Back within the deadband of the written value
+            self._async_cancel_pending_write()
+        elif delay:
+            # Too soon after the last write: write the latest value later
+            self._pending_value = value
+            if self._pending_write is None:
+                self._pending_write = self.hass.loop.call_later(
+                    delay, self._async_write_pending
+                )
+        else:
+            self._async_write_now(value)
+
+    @callback
+    def _async_write_now(self, value):
+        self._async_cancel_pending_write()
+        self._attr_available = True
+        self._attr_native_value = value
+        self.async_write_ha_state()
+
+        number = _number(value)
+        if self.write_filter is not None and number is not None:
+            self.write_filter.written(number, time.monotonic())
+
+    @callback
+    def _async_write_pending(self):
+        self._pending_write = None
+        if self._attr_available and self.coordinator.last_update_success:
+            self._async_write_now(self._pending_value)
+
+    @callback
+    def _async_cancel_pending_write(self):
+        if self._pending_write is not None:
+            self._pending_write.cancel()
+            self._pending_write = None
+
+    async def async_will_remove_from_hass(self) -> None:
+        self._async_cancel_pending_write()
+        await super().async_will_remove_from_hass()
+
+    @property
+    def available(self):
+        return self._attr_available and self._attr_native_value is not None
+
+
+class FreeDSNumericSensor(FreeDSSensor):
+    """A FreeDS Sensor which ignores non-numerical values"""
+
+    # When aggregating, the state is only written once per window (set in
+    # the options), with the time-weighted mean of the window as the value
+    # and its min, max and number of samples as attributes.
+    aggregate = False
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        if self.aggregate:
+            self.async_on_remove(
+                self.coordinator.async_add_aggregate(
+                    self.json_section, self.json_field, self._async_write_aggregate
+                )
+            )
+
+    @callback
+    def _async_write_aggregate(self, result):
+        """Writes the result of an aggregation window"""
+        if result is None or not self._attr_available:
+            return
+        mean, minimum, maximum, samples = result
+        self._attr_native_value = round(mean, 3)
+        self._attr_extra_state_attributes = {
+            "min": minimum,
+            "max": maximum,
+            "samples": samples,
+        }
+        self.async_write_ha_state()
+
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+
+        description = self.entity_description
+        try:
+            value = float(
+                self.coordinator.data[description.json_section][description.key]
+            )
+        except:
+            value = None
+
+        if value is not None and self.coordinator.last_update_success:
+            if not self._attr_available:
+                self._async_write_value(value)
+            elif not self.aggregate and value != self._attr_native_value:
+                # (Aggregated values only get written at the end of a window)
+                self._async_write_value(value)
+        else:
+            self._async_cancel_pending_write()
+            self._attr_available = False
+            self._attr_native_value = value
+            self.async_write_ha_state()
+
+
+class FreeDSDiagnosticSensor(FreeDSEntity, SensorEntity):
+    """A figure about the connection to the FreeDS: one of the coordinator's counters"""
+
+    # The counters are bumped on every message, so rather than being written
+    # that often, these sensors are polled (every 30 seconds, the sensor
+    # platform's default). They're disabled by default.
+
+    entity_description: FreeDSDiagnosticSensorEntityDescription
+
+    def __init__(self, description, **kwargs):
+        super().__init__(description, **kwargs)
+        self._attr_available = True
+
+    @property
+    def should_poll(self):
+        # CoordinatorEntity never polls, whatever _attr_should_poll says
+        return True
+
+    @property
+    def available(self):
+        # Most interesting precisely when the device can't be reached
+        return True
+
+    def _handle_coordinator_update(self) -> None:
+        # Polled instead, see async_update()
+        pass
+
+    async def async_update(self) -> None:
+        value = getattr(self.coordinator, self.entity_description.attribute)
+        if isinstance(value, float):
+            value = round(value, 3)
+        self._attr_native_value = value
+
+
+class FreeDSRateSensor(FreeDSDiagnosticSensor):
+    """A counter's rate of change (per second) since the previous poll"""
+
+    _last = None
+
+    async def async_update(self) -> None:
+        now = time.monotonic()
+        count = getattr(self.coordinator, self.entity_description.attribute)
+        if self._last is not None:
+            last_now, last_count = self._last
+            if now > last_now:
+                self._attr_native_value = round((count - last_count) / (now - last_now), 2)
+        self._last = (now, count)
+
+
+class FreeDSTemperatureSensor(FreeDSSensor):
+    # As FreeDSSensor, but handles the literal "-127.0" string as being
+    # not available. FreeDS sends "-127.0" as the temperature value when
+    # there is no temperature probe.
+
+    def is_reported(self, value):
+        # No probe (yet): no entity
+        return value is not None and _number(value) != -127
+
+    @property
+    def available(self):
+        return self._attr_available and self._attr_native_value != "-127.0"
+
+
+class FreeDSPWMFrequencySensor(FreeDSSensor):
+    # As FreeDSSensor, but the value displayed is one tenth of the received one.
+    # For whatever reason, FreeDS reports pwm frequency values in decihertz, not
+    # in hertz/kilohertz.
+
+    @property
+    def native_value(self):
+        return int(self._attr_native_value) / 10
+
+
+class FreeDSWorkingModeSensor(FreeDSSensor):
+    # As FreeDSSensor, but translates the (known) numerical working modes into
+    # readable strings, as per the defined constants. e.g. working mode 25
+    # gets translated to "Shelly EM"
+
+    @property
+    def native_value(self):
+        if self._attr_native_value is None:
+            return None
+        elif self.coordinator.mode == "websocket":
+            return (
+                WORKING_MODES_1_1.get(self._attr_native_value)
+                or self._attr_native_value
+            )
+        else:
+            return (
+                WORKING_MODES_1_0.get(self._attr_native_value)
+                or self._attr_native_value
+            )
+
+
+# The sensors there are for a FreeDS, by section (see SSE_FIELDS_1_0). They
+# come after the entity classes, which some of them name.
+
+SENSORS = {
+    "Inverter": (
+        FreeDSSensorEntityDescription(
+            key="wsolar",
+            json_section="Inverter",
             name="Solar Power",
-            unit=UnitOfPower.WATT,
+            native_unit_of_measurement=UnitOfPower.WATT,
             device_class=SensorDeviceClass.POWER,
             icon="mdi:solar-power",
             state_class=SensorStateClass.MEASUREMENT,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="wsolar",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="wgrid",
+            json_section="Inverter",
             name="Grid Power",
-            unit=UnitOfPower.WATT,
+            native_unit_of_measurement=UnitOfPower.WATT,
             device_class=SensorDeviceClass.POWER,
-            # icon="mdi:transmission-tower",
             state_class=SensorStateClass.MEASUREMENT,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="wgrid",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="gridv",
+            json_section="Inverter",
             name="Grid Voltage",
-            unit=UnitOfElectricPotential.VOLT,
+            native_unit_of_measurement=UnitOfElectricPotential.VOLT,
             device_class=SensorDeviceClass.VOLTAGE,
-            # icon="mdi:transmission-tower",
             state_class=SensorStateClass.MEASUREMENT,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="gridv",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="wbattery",
+            json_section="Inverter",
             name="Battery Power",
-            unit=UnitOfPower.WATT,
+            native_unit_of_measurement=UnitOfPower.WATT,
             device_class=SensorDeviceClass.POWER,
             icon="mdi:battery-charging",
             state_class=SensorStateClass.MEASUREMENT,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="wbattery",
-            **common_data,
-        ),
-        FreeDSNumericSensor(
-            name="Surplus Load",
-            unit=UnitOfPower.WATT,
-            device_class=SensorDeviceClass.POWER,
-            # icon="mdi:flash",
-            state_class=SensorStateClass.MEASUREMENT,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Web",
-            json_field="loadCalcWatts",
-            **common_data,
-        ),
-        FreeDSPWMFrequencySensor(
-            name="PWM frequency",
-            unit=UnitOfFrequency.HERTZ,
-            device_class=SensorDeviceClass.FREQUENCY,
-            icon="mdi:square-wave",
-            state_class=SensorStateClass.MEASUREMENT,
-            entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Web",
-            json_field="pwmfrec",
-            **common_data,
-        ),
-        FreeDSNumericSensor(
-            name="PWM %",
-            unit=PERCENTAGE,
-            icon="mdi:square-wave",
-            state_class=SensorStateClass.MEASUREMENT,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Web",
-            json_field="pwm",
-            **common_data,
+            # Not in the 1.0.x events
+            firmwares=frozenset({"1.1", "2.0"}),
         ),
-        FreeDSTemperatureSensor(
-            name="Heater Temperature",
-            unit=UnitOfTemperature.CELSIUS,
-            device_class=SensorDeviceClass.TEMPERATURE,
-            icon="mdi:thermometer-water",
-            state_class=SensorStateClass.MEASUREMENT,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Temperature",
-            json_field="tempTermo",
-            **common_data,
-        ),
-        FreeDSTemperatureSensor(
-            name="TRIAC Temperature",
-            unit=UnitOfTemperature.CELSIUS,
-            device_class=SensorDeviceClass.TEMPERATURE,
-            # icon="mdi:thermometer",
-            state_class=SensorStateClass.MEASUREMENT,
-            entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Temperature",
-            json_field="tempTriac",
-            **common_data,
-        ),
-        FreeDSTemperatureSensor(
+        FreeDSSensorEntityDescription(
+            key="invTemp",
+            json_section="Inverter",
             name="Inverter Temperature",
-            unit=UnitOfTemperature.CELSIUS,
+            native_unit_of_measurement=UnitOfTemperature.CELSIUS,
             device_class=SensorDeviceClass.TEMPERATURE,
-            # icon="mdi:thermometer",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="invTemp",
-            **common_data,
-        ),
-        FreeDSTemperatureSensor(
-            name="Custom Temperature",
-            unit=UnitOfTemperature.CELSIUS,
-            device_class=SensorDeviceClass.TEMPERATURE,
-            # icon="mdi:thermometer",
-            state_class=SensorStateClass.MEASUREMENT,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Temperature",
-            json_field="tempCustom",
-            **common_data,
+            entity_class=FreeDSTemperatureSensor,
         ),
-        # FreeDSSensor(
+        # FreeDSSensorEntityDescription(
+        #     key="invSoC",
         #     name="Inverter state of charge",
-        #     unit=PERCENTAGE,
+        #     native_unit_of_measurement=PERCENTAGE,
         #     device_class=SensorDeviceClass.BATTERY,
-        #     # icon="mdi:resistor",
         #     state_class=SensorStateClass.MEASUREMENT,
-        #     # entity_category=EntityCategory.DIAGNOSTIC,
-        #     json_field="invSoC",
-        #     **common_data
         # ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="pv1v",
+            json_section="Inverter",
             name="Inverter Line 1 Voltage",
-            unit=UnitOfElectricPotential.VOLT,
+            native_unit_of_measurement=UnitOfElectricPotential.VOLT,
             device_class=SensorDeviceClass.VOLTAGE,
-            # icon="mdi:resistor",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="pv1v",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="pv1c",
+            json_section="Inverter",
             name="Inverter Line 1 Current",
-            unit=UnitOfElectricCurrent.AMPERE,
+            native_unit_of_measurement=UnitOfElectricCurrent.AMPERE,
             device_class=SensorDeviceClass.CURRENT,
-            # icon="mdi:resistor",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="pv1c",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="pv1w",  # "pw1" in 1.0.7rev2 (typo)
+            json_section="Inverter",
             name="Inverter Line 1 Power",
-            unit=UnitOfPower.WATT,
+            native_unit_of_measurement=UnitOfPower.WATT,
             device_class=SensorDeviceClass.POWER,
-            # icon="mdi:resistor",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="pv1w",
-            # json_field="pw1", # Typo in 1.0.7rev2!
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="pv2v",
+            json_section="Inverter",
             name="Inverter Line 2 Voltage",
-            unit=UnitOfElectricPotential.VOLT,
+            native_unit_of_measurement=UnitOfElectricPotential.VOLT,
             device_class=SensorDeviceClass.VOLTAGE,
-            # icon="mdi:resistor",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="pv2v",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="pv2c",
+            json_section="Inverter",
             name="Inverter Line 2 Current",
-            unit=UnitOfElectricCurrent.AMPERE,
+            native_unit_of_measurement=UnitOfElectricCurrent.AMPERE,
             device_class=SensorDeviceClass.CURRENT,
-            # icon="mdi:resistor",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="pv2c",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="pv2w",
+            json_section="Inverter",
             name="Inverter Line 2 Power",
-            unit=UnitOfPower.WATT,
+            native_unit_of_measurement=UnitOfPower.WATT,
             device_class=SensorDeviceClass.POWER,
-            # icon="mdi:resistor",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Inverter",
-            json_field="pv2w",
-            # json_field="pw1", # Typo in 1.0.7rev2!
-            **common_data,
         ),
-        FreeDSNumericSensor(
+    ),
+    "Web": (
+        FreeDSSensorEntityDescription(
+            key="loadCalcWatts",
+            json_section="Web",
+            name="Surplus Load",
+            native_unit_of_measurement=UnitOfPower.WATT,
+            device_class=SensorDeviceClass.POWER,
+            state_class=SensorStateClass.MEASUREMENT,
+        ),
+        FreeDSSensorEntityDescription(
+            key="pwmfrec",
+            json_section="Web",
+            name="PWM frequency",
+            native_unit_of_measurement=UnitOfFrequency.HERTZ,
+            device_class=SensorDeviceClass.FREQUENCY,
+            icon="mdi:square-wave",
+            state_class=SensorStateClass.MEASUREMENT,
+            entity_category=EntityCategory.DIAGNOSTIC,
+            entity_class=FreeDSPWMFrequencySensor,
+        ),
+        FreeDSSensorEntityDescription(
+            key="pwm",
+            json_section="Web",
+            name="PWM %",
+            native_unit_of_measurement=PERCENTAGE,
+            icon="mdi:square-wave",
+            state_class=SensorStateClass.MEASUREMENT,
+        ),
+        FreeDSSensorEntityDescription(
+            key="workingMode",  # "wversion" in 1.0.x, see SSE_FIELDS_1_0
+            json_section="Web",
+            name="Working Mode",
+            device_class=SensorDeviceClass.ENUM,
+            icon="mdi:lan",
+            entity_category=EntityCategory.DIAGNOSTIC,
+            entity_class=FreeDSWorkingModeSensor,
+        ),
+    ),
+    "Temperature": (
+        FreeDSSensorEntityDescription(
+            key="tempTermo",
+            json_section="Temperature",
+            name="Heater Temperature",
+            native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+            device_class=SensorDeviceClass.TEMPERATURE,
+            icon="mdi:thermometer-water",
+            state_class=SensorStateClass.MEASUREMENT,
+            entity_class=FreeDSTemperatureSensor,
+        ),
+        FreeDSSensorEntityDescription(
+            key="tempTriac",
+            json_section="Temperature",
+            name="TRIAC Temperature",
+            native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+            device_class=SensorDeviceClass.TEMPERATURE,
+            state_class=SensorStateClass.MEASUREMENT,
+            entity_category=EntityCategory.DIAGNOSTIC,
+            entity_class=FreeDSTemperatureSensor,
+        ),
+        FreeDSSensorEntityDescription(
+            key="tempCustom",
+            json_section="Temperature",
+            name="Custom Temperature",
+            native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+            device_class=SensorDeviceClass.TEMPERATURE,
+            state_class=SensorStateClass.MEASUREMENT,
+            entity_class=FreeDSTemperatureSensor,
+        ),
+    ),
+    "Energy": (
+        FreeDSSensorEntityDescription(
+            key="KwToday",
+            json_section="Energy",
             name="Surplus Energy (Today)",
-            unit=UnitOfEnergy.KILO_WATT_HOUR,
+            native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
             device_class=SensorDeviceClass.ENERGY,
-            # icon="mdi:resistor",
             state_class=SensorStateClass.TOTAL_INCREASING,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Energy",
-            json_field="KwToday",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="KwYesterday",
+            json_section="Energy",
             name="Surplus Energy (Yesterday)",
-            unit=UnitOfEnergy.KILO_WATT_HOUR,
+            native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
             device_class=SensorDeviceClass.ENERGY,
-            # icon="mdi:resistor",
             state_class=SensorStateClass.TOTAL_INCREASING,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Energy",
-            json_field="KwYesterday",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="KwTotal",
+            json_section="Energy",
             name="Surplus Energy (Total)",
-            unit=UnitOfEnergy.KILO_WATT_HOUR,
+            native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
             device_class=SensorDeviceClass.ENERGY,
-            # icon="mdi:resistor",
             state_class=SensorStateClass.TOTAL_INCREASING,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Energy",
-            json_field="KwTotal",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="KwExportToday",
+            json_section="Energy",
             name="Exported Energy (Today)",
-            unit=UnitOfEnergy.KILO_WATT_HOUR,
+            native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
             device_class=SensorDeviceClass.ENERGY,
             icon="mdi:transmission-tower-import",
             state_class=SensorStateClass.TOTAL_INCREASING,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Energy",
-            json_field="KwExportToday",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="KwExportYesterday",
+            json_section="Energy",
             name="Exported Energy (Yesterday)",
-            unit=UnitOfEnergy.KILO_WATT_HOUR,
+            native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
             device_class=SensorDeviceClass.ENERGY,
             icon="mdi:transmission-tower-import",
             state_class=SensorStateClass.TOTAL_INCREASING,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Energy",
-            json_field="KwExportYesterday",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="KwExportTotal",
+            json_section="Energy",
             name="Exported Energy (Total)",
-            unit=UnitOfEnergy.KILO_WATT_HOUR,
+            native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
             device_class=SensorDeviceClass.ENERGY,
             icon="mdi:transmission-tower-import",
             state_class=SensorStateClass.TOTAL_INCREASING,
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Energy",
-            json_field="KwExportTotal",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+    ),
+    "Meter": (
+        FreeDSSensorEntityDescription(
+            key="mvoltage",
+            json_section="Meter",
             name="AC Voltage",
-            unit=UnitOfElectricPotential.VOLT,
+            native_unit_of_measurement=UnitOfElectricPotential.VOLT,
             device_class=SensorDeviceClass.VOLTAGE,
-            # icon="mdi:sine-wave",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Meter",
-            json_field="mvoltage",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="mcurrent",
+            json_section="Meter",
             name="AC Current",
-            unit=UnitOfElectricCurrent.AMPERE,
+            native_unit_of_measurement=UnitOfElectricCurrent.AMPERE,
             device_class=SensorDeviceClass.CURRENT,
-            # icon="mdi:sine-wave",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Meter",
-            json_field="mcurrent",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="mfrequency",
+            json_section="Meter",
             name="AC Frequency",
-            unit=UnitOfFrequency.HERTZ,
+            native_unit_of_measurement=UnitOfFrequency.HERTZ,
             device_class=SensorDeviceClass.FREQUENCY,
-            # icon="mdi:sine-wave",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Meter",
-            json_field="mfrequency",
-            **common_data,
         ),
-        FreeDSNumericSensor(
+        FreeDSSensorEntityDescription(
+            key="mpowerFactor",
+            json_section="Meter",
             name="Power Factor",
-            unit=PERCENTAGE,
+            native_unit_of_measurement=PERCENTAGE,
             device_class=SensorDeviceClass.POWER_FACTOR,
-            # icon="mdi:sine-wave",
             state_class=SensorStateClass.MEASUREMENT,
             entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Meter",
-            json_field="mpowerFactor",
-            **common_data,
         ),
-        FreeDSWorkingModeSensor(
-            name="Working Mode",
-            unit=None,
-            device_class=SensorDeviceClass.ENUM,
-            icon="mdi:lan",
-            # state_class=None,
-            entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Web",
-            # json_field="wversion", # Name change between 1.0.x and 1.1-beta
-            json_field="workingMode",
-            **common_data,
-        ),
-    ]
-
-    async_add_entities(sensors)
-
-
-class FreeDSSensor(FreeDSEntity, SensorEntity):
-    """An individual FreeDSsensor entry."""
-
-    def __init__(self, state_class=None, unit=None, **kwargs):
-        # Init FreeDSEntity
-        super().__init__(**kwargs)
-
-        # Instance attributes built into SensorEntity:
-        self._attr_state_class = state_class
-        self._attr_native_value = None
-        self._attr_native_unit_of_measurement = unit
-
-        # All sensors should start as unavailable. Some of them will never be,
-        # depending on the FreeDS Working Mode.
-        self._attr_available = False
-
-    def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
-
-        value = super()._handle_coordinator_update()
-
-        if value is not None and (
-            not self._attr_available or value != self._attr_native_value
-        ):
-            self._attr_available = True
-            self._attr_native_value = value
-            self.async_write_ha_state()
-
-    @property
-    def available(self):
-        return self._attr_available and self._attr_native_value is not None
-
-
-class FreeDSNumericSensor(FreeDSSensor):
-    """A FreeDS Sensor which ignores non-numerical values"""
-
-    def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
-
-        try:
-            value = float(self.coordinator.data[self.json_section][self.json_field])
-        except:
-            value = None
-
-        if value is not None and self.coordinator.last_update_success:
-            if not self._attr_available or value != self._attr_native_value:
-                self._attr_available = True
-                self._attr_native_value = value
-                self.async_write_ha_state()
-        else:
-            self._attr_available = False
-            self._attr_native_value = value
-            self.async_write_ha_state()
-
-
-class FreeDSTemperatureSensor(FreeDSSensor):
-    # As FreeDSSensor, but handles the literal "-127.0" string as being
-    # not available. FreeDS sends "-127.0" as the temperature value when
-    # there is no temperature probe.
-
-    @property
-    def available(self):
-        return self._attr_available and self._attr_native_value != "-127.0"
-
-
-class FreeDSPWMFrequencySensor(FreeDSSensor):
-    # As FreeDSSensor, but the value displayed is one tenth of the received one.
-    # For whatever reason, FreeDS reports pwm frequency values in decihertz, not
-    # in hertz/kilohertz.
-
-    @property
-    def native_value(self):
-        return int(self._attr_native_value) / 10
-
-
-class FreeDSWorkingModeSensor(FreeDSSensor):
-    # As FreeDSSensor, but translates the (known) numerical working modes into
-    # readable strings, as per the defined constants. e.g. working mode 25
-    # gets translated to "Shelly EM"
-
-    @property
-    def native_value(self):
-        if self._attr_native_value is None:
-            return None
-        elif self.coordinator.mode == "websocket":
-            return (
-                WORKING_MODES_1_1.get(self._attr_native_value)
-                or self._attr_native_value
-            )
-        else:
-            return (
-                WORKING_MODES_1_0.get(self._attr_native_value)
-                or self._attr_native_value
-            )
+    ),
+}
+
+# {firmware generation: {section: descriptions}}
+SENSORS_BY_FIRMWARE = descriptions_by_firmware(SENSORS)
+
+DIAGNOSTIC_SENSORS = (
+    FreeDSDiagnosticSensorEntityDescription(
+        key="messages_per_second",
+        attribute="messages_received",
+        name="Messages per second",
+        native_unit_of_measurement="msg/s",
+        icon="mdi:message-processing",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_class=FreeDSRateSensor,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="messages_received",
+        name="Messages received",
+        icon="mdi:message-processing",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="bytes_received",
+        name="Bytes received",
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="parse_failures",
+        name="Parse failures",
+        icon="mdi:message-alert",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="recovered_payloads",
+        name="Recovered payloads",
+        icon="mdi:message-alert",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="reconnects",
+        name="Reconnections",
+        icon="mdi:lan-disconnect",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="transport",
+        attribute="mode",
+        name="Transport",
+        icon="mdi:lan",
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="last_message_age",
+        name="Last message age",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="dispatched_callbacks",
+        name="Entity updates dispatched",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="skipped_callbacks",
+        name="Entity updates skipped",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="poll_count",
+        name="Polls",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="connection_setups",
+        name="Poll connections",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    FreeDSDiagnosticSensorEntityDescription(
+        key="poll_latency",
+        name="Poll latency",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+)
@@ -0,0 +1,133 @@
+"""FreeDS services, for debugging"""
+
+import asyncio
+import cProfile
+import logging
+import tracemalloc
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+from .latency import LatencyTracer
+from .profiling import TRACEMALLOC_FRAMES, write_profile
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_LATENCY = "latency"
+SERVICE_PROFILE = "profile"
+
+LATENCY_SCHEMA = vol.Schema(
+    {
+        vol.Optional("trace"): cv.boolean,
+        vol.Optional("reset", default=False): cv.boolean,
+    }
+)
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("duration", default=60): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=3600)
+        ),
+        vol.Optional("freeds_id"): cv.string,
+    }
+)
+
+
+def _coordinators(hass):
+    """The coordinator of every configured FreeDS, by FreeDS ID"""
+    return {
+        freeds_id: common_data["coordinator"]
+        for freeds_id, common_data in hass.data.get(DOMAIN, {}).items()
+    }
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Registers the FreeDS services"""
+
+    @callback
+    def async_latency(call: ServiceCall):
+        """Reports the latency percentiles of every FreeDS, optionally
+        starting/stopping the tracing (until the next restart) or resetting it"""
+        trace = call.data.get("trace")
+        report = {}
+        for freeds_id, coordinator in _coordinators(hass).items():
+            if trace is False:
+                coordinator.latency = None
+            elif trace and coordinator.latency is None:
+                coordinator.latency = LatencyTracer()
+
+            latency = coordinator.latency
+            if latency is None:
+                report[freeds_id] = None
+                continue
+
+            report[freeds_id] = latency.report()
+            _LOGGER.info(f"{coordinator.name} latency: {report[freeds_id]}")
+            if call.data["reset"]:
+                latency.clear()
+
+        return report
+
+    async def async_profile(call: ServiceCall):
+        """Profiles the FreeDS tasks of one or every FreeDS for a while, then
+        writes a pstats file and a top allocations report"""
+        coordinators = _coordinators(hass)
+        freeds_id = call.data.get("freeds_id")
+        if freeds_id is not None:
+            if freeds_id not in coordinators:
+                raise HomeAssistantError(f"No FreeDS with ID {freeds_id}")
+            coordinators = {freeds_id: coordinators[freeds_id]}
+        if any(c.profiler is not None for c in coordinators.values()):
+            raise HomeAssistantError("FreeDS profiling is already running")
+
+        duration = call.data["duration"]
+        _LOGGER.info(f"Profiling {', '.join(coordinators)} for {duration:g} s")
+
+        # Unlike the profiler, tracemalloc can't be limited to some tasks:
+        # it traces the whole process, and the report is filtered afterwards.
+        traced = tracemalloc.is_tracing()
+        if not traced:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        before = await hass.async_add_executor_job(tracemalloc.take_snapshot)
+
+        profiler = cProfile.Profile()
+        for coordinator in coordinators.values():
+            coordinator.profiler = profiler
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            for coordinator in coordinators.values():
+                coordinator.profiler = None
+            after = await hass.async_add_executor_job(tracemalloc.take_snapshot)
+            if not traced:
+                tracemalloc.stop()
+
+        name = hass.config.path(f"freeds_profile_{dt_util.now():%Y%m%d_%H%M%S}")
+        files = {"pstats": f"{name}.pstats", "allocations": f"{name}_allocations.txt"}
+        await hass.async_add_executor_job(
+            write_profile, profiler, before, after, files["pstats"], files["allocations"]
+        )
+        _LOGGER.info(f"FreeDS profile written to {files['pstats']} and {files['allocations']}")
+        return files
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PROFILE,
+        async_profile,
+        schema=PROFILE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_LATENCY,
+        async_latency,
+        schema=LATENCY_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
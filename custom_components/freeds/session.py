@@ -0,0 +1,51 @@
+"""HTTP session shared by all FreeDS devices"""
+
+import aiohttp
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import callback
+
+from .const import DOMAIN
+
+DATA_SESSION = f"{DOMAIN}_session"
+
+# FreeDS devices are ESP32s with a tiny TCP stack: a long-lived SSE stream
+# plus the odd command or probe is all they need from a single client.
+CONNECTIONS_PER_HOST = 2
+# Hostnames (often mDNS ones) of devices rarely change
+DNS_CACHE_TTL = 300
+
+# No total timeout, since SSE streams are endless; a stream that stays
+# silent for too long is considered dead.
+timeout = aiohttp.ClientTimeout(total=None, sock_read=3)
+
+
+@callback
+def async_get_session(hass):
+    """Returns the integration's aiohttp session, creating it if needed."""
+    session = hass.data.get(DATA_SESSION)
+    if session is None or session.closed:
+        # Home Assistant's shared session can't take a connector of its own,
+        # so the integration manages one, with limits suited to a fleet of
+        # embedded devices.
+        connector = aiohttp.TCPConnector(
+            limit_per_host=CONNECTIONS_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        hass.data[DATA_SESSION] = session
+
+        @callback
+        def close_session(event):
+            hass.async_create_task(session.close())
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, close_session)
+
+    return session
+
+
+async def async_close_session(hass):
+    """Closes the integration's aiohttp session, if any."""
+    session = hass.data.pop(DATA_SESSION, None)
+    if session is not None:
+        await session.close()
@@ -0,0 +1,161 @@
+"""Incremental EventSource (SSE) stream parser"""
+
+import re
+
+# Lines in an EventSource stream can end in CRLF, LF or a lone CR,
+# see https://html.spec.whatwg.org/multipage/server-sent-events.html#parsing-an-event-stream
+_EOL = re.compile(rb"\r\n|\r|\n")
+
+
+class SSEEvent:
+    """A complete event, as dispatched by the EventSource spec."""
+
+    # The data is a bytes-like object (a memoryview, for single-line data),
+    # meant to be fed to a JSON decoder as is.
+
+    __slots__ = ("event", "data", "id")
+
+    def __init__(self, event, data, id):
+        self.event = event
+        self.data = data
+        self.id = id
+
+    def __repr__(self):
+        return (
+            f"SSEEvent(event={self.event!r}, id={self.id!r}, data={bytes(self.data)!r})"
+        )
+
+
+class SSEParser:
+    """Turns arbitrarily-sized chunks of an EventSource stream into events."""
+
+    # aiohttp's readany() returns whatever the socket had available, which
+    # might be half an event, several events, or an event split right in
+    # the middle of a CRLF. The parser keeps any incomplete line in a buffer
+    # until the rest of it arrives.
+    #
+    # The buffer is trimmed once per chunk (not once per line), and the search
+    # for the next line terminator never re-scans bytes that are already
+    # known not to contain one, so feeding N bytes costs O(N) regardless of
+    # how the stream is chunked.
+
+    __slots__ = (
+        "_buffer",
+        "_scan_from",
+        "_skip_lf",
+        "_event_type",
+        "_data",
+        "last_event_id",
+        "retry",
+        "comments",
+    )
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._scan_from = 0
+        self._skip_lf = False
+        self._event_type = None
+        self._data = []
+        self.last_event_id = None
+        # Reconnection time (in milliseconds) as last set by a "retry:" field
+        self.retry = None
+        # Number of comment lines received. FreeDS (like most SSE servers)
+        # does not send any, but they're the standard keepalive mechanism.
+        self.comments = 0
+
+    def reset(self):
+        """Discards any partial line/event, e.g. before reconnecting.
+
+        As per spec, the last event ID and the reconnection time are kept, so
+        they can be used when re-establishing the connection.
+        """
+        self._buffer.clear()
+        self._scan_from = 0
+        self._skip_lf = False
+        self._event_type = None
+        self._data = []
+
+    def feed(self, chunk):
+        """Feed a chunk of bytes; returns a list of complete events (maybe empty)."""
+        buffer = self._buffer
+        buffer += chunk
+        end = len(buffer)
+        pos = 0
+        events = []
+
+        if self._skip_lf and end:
+            # The previous chunk ended in a CR; a LF right after it belongs
+            # to the same line terminator.
+            self._skip_lf = False
+            if buffer[0] == 0x0A:
+                pos = 1
+
+        search = _EOL.search
+        match = search(buffer, max(pos, self._scan_from))
+        with memoryview(buffer) as view:
+            while match is not None:
+                eol_start, eol_end = match.span()
+                if eol_end == end and buffer[eol_start:eol_end] == b"\r":
+                    self._skip_lf = True
+                # Copied once, out of the buffer (which is about to be trimmed)
+                self._process_line(view[pos:eol_start].tobytes(), events)
+                pos = eol_end
+                match = search(buffer, pos)
+
+        if pos:
+            del buffer[:pos]
+        self._scan_from = len(buffer)
+
+        return events
+
+    def _process_line(self, line, events):
+        if not line:
+            self._dispatch(events)
+            return
+
+        if line[0] == 0x3A:  # ":"
+            self.comments += 1
+            return
+
+        colon = line.find(b":")
+        if colon == -1:
+            field = line
+            start = len(line)
+        else:
+            field = line[:colon]
+            start = colon + 1
+            if line[start : start + 1] == b" ":
+                start += 1
+
+        if field == b"data":
+            # A view rather than a copy: the data is decoded straight from it
+            self._data.append(memoryview(line)[start:])
+            return
+
+        value = line[start:]
+        if field == b"event":
+            self._event_type = value.decode("utf-8", "replace")
+        elif field == b"id":
+            if b"\x00" not in value:
+                self.last_event_id = value.decode("utf-8", "replace")
+        elif field == b"retry":
+            if value.isdigit():
+                self.retry = int(value)
+        # Any other field name is ignored, as per spec.
+
+    def _dispatch(self, events):
+        data = self._data
+        event_type = self._event_type
+        self._data = []
+        self._event_type = None
+
+        if not data:
+            return
+
+        events.append(
+            SSEEvent(
+                event_type or "message",
+                data[0] if len(data) == 1 else b"\n".join(data),
+                self.last_event_id,
+            )
+        )
@@ -1,6 +1,8 @@
 """Platform for sensor integration."""
 from __future__ import annotations
 
+from dataclasses import dataclass
+
 from homeassistant.components.switch import (
     SwitchDeviceClass,
     SwitchEntity,
@@ -29,96 +31,91 @@ from homeassistant.const import (
 import random
 
 from .const import DOMAIN
-from .entity import FreeDSEntity
+from .entity import (
+    FreeDSEntity,
+    FreeDSEntityDescription,
+    descriptions_by_firmware,
+    descriptions_for,
+)
 
 import traceback
 
 
-async def async_setup_entry(hass, config_entry, async_add_entities):
-    """Add switches for passed config_entry in HA."""
+@dataclass(frozen=True, kw_only=True)
+class FreeDSSwitchEntityDescription(FreeDSEntityDescription, SwitchEntityDescription):
+    """Describes a FreeDS switch, toggled through /tooglebuttons"""
+
+    button_idx: int
+    device_class: SwitchDeviceClass | None = SwitchDeviceClass.SWITCH
 
-    # Fetch coordinator and device_info, needs to be passed to each and
-    # every constructor.
-    # "data" is a dict like {coordinator, device_info, freeds_id}
-    common_data = hass.data[DOMAIN][config_entry.data["uniqueid"]]
 
-    switches = [
-        FreeDSSwitch(
+# The switches of a FreeDS, by section (every firmware has them all)
+SWITCHES = {
+    "Web": (
+        FreeDSSwitchEntityDescription(
+            key="POn",
+            json_section="Web",
             name="PWM Enabled",
-            device_class=SwitchDeviceClass.SWITCH,
             icon="mdi:square-wave",
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Web",
-            json_field="POn",
             button_idx=6,
-            **common_data,
         ),
-        FreeDSSwitch(
+        FreeDSSwitchEntityDescription(
+            key="PwmMan",
+            json_section="Web",
             name="PWM Manual Mode",
-            device_class=SwitchDeviceClass.SWITCH,
             icon="mdi:square-wave",
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Web",
-            json_field="PwmMan",
             button_idx=7,
-            **common_data,
-        ),
-        FreeDSSwitch(
-            name="Relay 1",
-            device_class=SwitchDeviceClass.SWITCH,
-            icon="mdi:connection",
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Relays",
-            json_field="R01",
-            button_idx=1,
-            **common_data,
-        ),
-        FreeDSSwitch(
-            name="Relay 2",
-            device_class=SwitchDeviceClass.SWITCH,
-            icon="mdi:connection",
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Relays",
-            json_field="R02",
-            button_idx=2,
-            **common_data,
         ),
-        FreeDSSwitch(
-            name="Relay 3",
-            device_class=SwitchDeviceClass.SWITCH,
-            icon="mdi:connection",
-            # entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    "Relays": tuple(
+        FreeDSSwitchEntityDescription(
+            key=f"R0{relay}",
             json_section="Relays",
-            json_field="R03",
-            button_idx=3,
-            **common_data,
-        ),
-        FreeDSSwitch(
-            name="Relay 4",
-            device_class=SwitchDeviceClass.SWITCH,
+            name=f"Relay {relay}",
             icon="mdi:connection",
-            # entity_category=EntityCategory.DIAGNOSTIC,
-            json_section="Relays",
-            json_field="R04",
-            button_idx=4,
-            **common_data,
-        ),
-    ]
+            button_idx=relay,
+        )
+        for relay in range(1, 5)
+    ),
+}
+
+# {firmware generation: {section: descriptions}}
+SWITCHES_BY_FIRMWARE = descriptions_by_firmware(SWITCHES)
 
-    async_add_entities(switches)
+
+async def async_setup_entry(hass, config_entry, async_add_entities):
+    """Add switches for passed config_entry in HA."""
+
+    # Fetch coordinator and device_info, needs to be passed to each and
+    # every constructor.
+    # "data" is a dict like {coordinator, device_info, freeds_id}
+    common_data = hass.data[DOMAIN][config_entry.data["uniqueid"]]
+
+    descriptions = descriptions_for(
+        SWITCHES_BY_FIRMWARE, SWITCHES, config_entry.data.get("mode")
+    )
+    async_add_entities(
+        [
+            FreeDSSwitch(description, **common_data)
+            for section in descriptions.values()
+            for description in section
+        ]
+    )
 
 
 class FreeDSSwitch(FreeDSEntity, SwitchEntity):
     """An individual FreeDSSwitch entry, used for relays and enabling PWM."""
 
-    def __init__(self, button_idx=None, **kwargs):
+    entity_description: FreeDSSwitchEntityDescription
+
+    def __init__(self, description, **kwargs):
         # Init FreeDSEntity
-        super().__init__(**kwargs)
+        super().__init__(description, **kwargs)
 
         # Instance attributes built into SwitchEntity
         self._attr_is_on = None
 
-        self._button_idx = button_idx
+        self._button_idx = description.button_idx
 
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
@@ -132,14 +129,28 @@ class FreeDSSwitch(FreeDSEntity, SwitchEntity):
                 self._attr_is_on = value
                 self.async_write_ha_state()
 
-    async def async_turn_on(self):
-        if self.is_on:
-            pass
-        else:
-            return await self.coordinator.async_send_toggle_button(self._button_idx)
-
-    async def async_turn_off(self):
-        if self.is_on:
-            return await self.coordinator.async_send_toggle_button(self._button_idx)
-        else:
-            pass
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # Once a command is settled, the reported state shows again
+        self.async_on_remove(
+            self.coordinator.commands.add_button(
+                self._button_idx,
+                self.json_section,
+                self.json_field,
+                self.async_write_ha_state,
+            )
+        )
+
+    @property
+    def is_on(self):
+        # Optimistic: while a command is pending, show the state it asked for
+        wanted = self.coordinator.commands.wanted(self._button_idx)
+        return self._attr_is_on if wanted is None else wanted
+
+    async def async_turn_on(self, **kwargs):
+        self.coordinator.commands.request(self._button_idx, True)
+        self.async_write_ha_state()
+
+    async def async_turn_off(self, **kwargs):
+        self.coordinator.commands.request(self._button_idx, False)
+        self.async_write_ha_state()
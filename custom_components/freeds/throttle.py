@@ -0,0 +1,59 @@
+"""Filtering of sensor state writes: deadbands and write intervals"""
+
+
+def parse_deadband(text):
+    """Parses "5" or "2%" into (deadband, relative); raises ValueError"""
+    text = str(text).strip()
+    relative = text.endswith("%")
+    if relative:
+        text = text[:-1]
+    deadband = float(text)
+    if deadband < 0:
+        raise ValueError(f"Negative deadband: {deadband}")
+    return deadband, relative
+
+
+class WriteFilter:
+    """Decides when a new sensor value is worth a state write."""
+
+    # A 1 W jitter on the grid power would otherwise mean a state write, a
+    # state_changed event and a recorder row every second. A new value is
+    # written when it's further than the deadband from the last written
+    # value, but no more often than every min_interval seconds. Values within
+    # the deadband are written anyway once max_interval seconds have passed
+    # since the last write, so the state never lags behind for long.
+
+    __slots__ = ("deadband", "relative", "min_interval", "max_interval", "_value", "_at")
+
+    def __init__(self, deadband=0, relative=False, min_interval=0, max_interval=None):
+        self.deadband = deadband
+        self.relative = relative
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._value = None
+        self._at = None
+
+    def check(self, value, now):
+        """Returns 0 to write value now, a delay (seconds) to write it later,
+        or None if it's not worth writing."""
+        last = self._value
+        if last is None:
+            return 0
+        if value == last:
+            return None
+
+        elapsed = now - self._at
+        threshold = self.deadband * abs(last) / 100 if self.relative else self.deadband
+        if abs(value - last) <= threshold and (
+            self.max_interval is None or elapsed < self.max_interval
+        ):
+            return None
+
+        if elapsed < self.min_interval:
+            return self.min_interval - elapsed
+        return 0
+
+    def written(self, value, now):
+        """Records that value has been written at the given time."""
+        self._value = value
+        self._at = now
@@ -0,0 +1,18 @@
+"""Test configuration for the FreeDS integration"""
+
+# Modules are imported as "freeds.*" rather than "custom_components.freeds.*",
+# so that modules which don't depend on Home Assistant can be tested without
+# running the package's __init__.py. Relative imports keep working.
+
+import os
+import sys
+import types
+
+PACKAGE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "freeds"
+)
+
+if "freeds" not in sys.modules:
+    _package = types.ModuleType("freeds")
+    _package.__path__ = [PACKAGE_DIR]
+    sys.modules["freeds"] = _package
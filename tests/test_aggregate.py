@@ -0,0 +1,41 @@
+"""Tests for the windowed aggregation of sensor values"""
+
+import pytest
+
+from freeds.aggregate import WindowAggregator
+
+
+def test_time_weighted_mean():
+    aggregator = WindowAggregator()
+    aggregator.add(100, 0)
+    aggregator.add(400, 9)
+    # 100 for 9 s, 400 for 1 s
+    assert aggregator.close(10) == (pytest.approx(130), 100, 400, 2)
+
+
+def test_value_carries_over_to_next_window():
+    aggregator = WindowAggregator()
+    aggregator.add(100, 0)
+    aggregator.add(400, 5)
+    aggregator.close(10)
+
+    # No samples at all: the last value held for the whole window
+    assert aggregator.close(20) == (pytest.approx(400), 400, 400, 0)
+
+    aggregator.add(0, 25)
+    assert aggregator.close(30) == (pytest.approx(200), 0, 400, 1)
+
+
+def test_empty_and_cleared():
+    aggregator = WindowAggregator()
+    assert aggregator.close(10) is None
+
+    aggregator.add(100, 10)
+    aggregator.clear()
+    assert aggregator.close(20) is None
+
+
+def test_single_instant_sample():
+    aggregator = WindowAggregator()
+    aggregator.add(100, 10)
+    assert aggregator.close(10) == (100, 100, 100, 1)
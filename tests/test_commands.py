@@ -0,0 +1,163 @@
+"""Tests for the toggle command queue"""
+
+import asyncio
+
+from freeds import commands
+from freeds.commands import CommandQueue
+
+
+class FakeDevice:
+    """Buttons toggled by send(), reporting their state after `lag` seconds"""
+
+    def __init__(self, lag=0.01, ignore=0):
+        self.state = {"R01": 0, "R02": 0}
+        self.reported = dict(self.state)
+        self.lag = lag
+        # Number of toggles to ignore, like a device that misses requests
+        self.ignore = ignore
+        self.toggles = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.waiters = []
+
+    async def send(self, button_idx, retry=False):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        self.toggles.append(button_idx)
+        if self.ignore:
+            self.ignore -= 1
+            return
+        field = f"R0{button_idx + 1}"
+        self.state[field] = 1 - self.state[field]
+        asyncio.get_running_loop().call_later(self.lag, self.report)
+
+    def report(self):
+        self.reported = dict(self.state)
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(self.reported)
+
+    def read(self, section, field):
+        return self.reported[field]
+
+    def wait_for_update(self):
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        return waiter
+
+
+def run_queue(device, test):
+    async def run():
+        queue = CommandQueue(device.send, device.read, device.wait_for_update)
+        queue.add_button(0, "Relays", "R01", lambda: None)
+        queue.add_button(1, "Relays", "R02", lambda: None)
+        await test(queue)
+        queue.cancel()
+
+    asyncio.run(run())
+
+
+async def settled(queue):
+    while queue.wanted(0) is not None or queue.wanted(1) is not None:
+        await asyncio.sleep(0.005)
+
+
+def test_single_toggle():
+    device = FakeDevice()
+
+    async def test(queue):
+        queue.request(0, True)
+        assert queue.wanted(0) is True
+        await settled(queue)
+        # Confirmed once the device reported it, after its 10 ms lag
+        assert queue.commands_confirmed == 1
+        assert queue.command_latency >= 0.01
+
+    run_queue(device, test)
+    assert device.toggles == [0]
+    assert device.state["R01"] == 1
+
+
+def test_no_toggle_when_already_in_state():
+    device = FakeDevice()
+
+    async def test(queue):
+        queue.request(0, False)
+        await settled(queue)
+
+    run_queue(device, test)
+    assert device.toggles == []
+
+
+def test_burst_is_coalesced():
+    device = FakeDevice(lag=0.05)
+
+    async def test(queue):
+        # e.g. a double click, then an automation
+        queue.request(0, True)
+        queue.request(0, False)
+        queue.request(0, True)
+        await settled(queue)
+        assert queue.commands_coalesced == 2
+
+    run_queue(device, test)
+    assert device.toggles == [0]
+    assert device.state["R01"] == 1
+
+
+def test_stale_reports_are_not_retried():
+    device = FakeDevice(lag=0.05)
+
+    async def test(queue):
+        queue.request(0, True)
+        await asyncio.sleep(0.02)
+        # A report from before the toggle took effect
+        device.report()
+        await settled(queue)
+
+    run_queue(device, test)
+    assert device.toggles == [0]
+    assert device.state["R01"] == 1
+
+
+def test_retry_when_device_disagrees(monkeypatch):
+    monkeypatch.setattr(commands, "SETTLE_TIMEOUT", 0.05)
+    device = FakeDevice(ignore=1)
+
+    async def test(queue):
+        queue.request(0, True)
+        await settled(queue)
+        assert queue.commands_retried == 1
+
+    run_queue(device, test)
+    assert device.toggles == [0, 0]
+    assert device.state["R01"] == 1
+
+
+def test_gives_up(monkeypatch):
+    monkeypatch.setattr(commands, "SETTLE_TIMEOUT", 0.01)
+    device = FakeDevice(ignore=100)
+
+    async def test(queue):
+        queue.request(0, True)
+        await settled(queue)
+        assert queue.commands_failed == 1
+
+    run_queue(device, test)
+    assert len(device.toggles) == commands.MAX_RETRIES + 1
+
+
+def test_commands_are_serialized():
+    device = FakeDevice()
+
+    async def test(queue):
+        queue.request(0, True)
+        queue.request(1, True)
+        await settled(queue)
+
+    run_queue(device, test)
+    assert sorted(device.toggles) == [0, 1]
+    assert device.max_in_flight == 1
@@ -0,0 +1,473 @@
+"""Tests for the FreeDS coordinator's per-field dispatch"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from freeds.coordinator import FreeDSCoordinator, changed_fields
+from freeds.latency import LatencyTracer
+from freeds.recording import (
+    JSON_BODY,
+    SSE_CHUNK,
+    WEBSOCKET_MESSAGE,
+    StreamRecorder,
+)
+from freeds.sse import SSEEvent
+
+
+def test_changed_fields_unchanged():
+    data = {"Inverter": {"wsolar": 1, "wgrid": 2}, "Relays": {"R01": 0}}
+    copy = {"Inverter": {"wsolar": 1, "wgrid": 2}, "Relays": {"R01": 0}}
+
+    assert changed_fields(data, copy) == set()
+
+
+def test_changed_fields_single_field():
+    old = {"Inverter": {"wsolar": 1, "wgrid": 2}, "Relays": {"R01": 0}}
+    new = {"Inverter": {"wsolar": 1, "wgrid": 3}, "Relays": {"R01": 0}}
+
+    assert changed_fields(old, new) == {("Inverter", None), ("Inverter", "wgrid")}
+
+
+def test_changed_fields_added_and_removed_fields():
+    old = {"Inverter": {"wsolar": 1, "pv2w": None}}
+    new = {"Inverter": {"wsolar": 1, "wbattery": 5}}
+
+    assert changed_fields(old, new) == {
+        ("Inverter", None),
+        ("Inverter", "pv2w"),
+        ("Inverter", "wbattery"),
+    }
+
+
+def test_changed_fields_removed_section():
+    old = {"Inverter": {"wsolar": 1}, "Relays": {"R01": 0, "R02": 1}}
+    new = {"Inverter": {"wsolar": 1}}
+
+    assert changed_fields(old, new) == {
+        ("Relays", None),
+        ("Relays", "R01"),
+        ("Relays", "R02"),
+    }
+
+
+def test_changed_fields_non_dict_section():
+    assert changed_fields({"Web": None}, {"Web": {"pwm": 1}}) == {
+        ("Web", None),
+        ("Web", "pwm"),
+    }
+
+
+class Listener:
+    def __init__(self, coordinator, context):
+        self.calls = 0
+        coordinator.async_add_listener(self, context)
+
+    def __call__(self):
+        self.calls += 1
+
+
+def run_with_coordinator(test):
+    async def run():
+        hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        coordinator = FreeDSCoordinator(hass, "freeds.invalid")
+        # Don't start the network loop
+        coordinator.running = True
+        try:
+            test(coordinator)
+        finally:
+            await coordinator.session.close()
+
+    asyncio.run(run())
+
+
+def test_dispatch_only_to_changed_fields():
+    def test(coordinator):
+        wsolar = Listener(coordinator, ("Inverter", "wsolar"))
+        wgrid = Listener(coordinator, ("Inverter", "wgrid"))
+        relay = Listener(coordinator, ("Relays", "R01"))
+
+        # First snapshot: everyone
+        coordinator.async_set_updated_data(
+            {"Inverter": {"wsolar": 1, "wgrid": 2}, "Relays": {"R01": 0}}
+        )
+        assert (wsolar.calls, wgrid.calls, relay.calls) == (1, 1, 1)
+
+        coordinator.async_set_updated_data(
+            {"Inverter": {"wsolar": 1, "wgrid": 3}, "Relays": {"R01": 0}}
+        )
+        assert (wsolar.calls, wgrid.calls, relay.calls) == (1, 2, 1)
+        assert coordinator.dispatched_callbacks == 4
+        assert coordinator.skipped_callbacks == 2
+
+    run_with_coordinator(test)
+
+
+def test_dispatch_section_wide_listener():
+    def test(coordinator):
+        # e.g. the backlight, which depends on "Oled" and "screenBrightness"
+        light = Listener(coordinator, ("Web", None))
+
+        coordinator.async_set_updated_data({"Web": {"Oled": 1}, "Relays": {}})
+        coordinator.async_set_updated_data({"Web": {"Oled": 1}, "Relays": {"R01": 1}})
+        assert light.calls == 1
+
+        coordinator.async_set_updated_data({"Web": {"Oled": 0}, "Relays": {"R01": 1}})
+        assert light.calls == 2
+
+    run_with_coordinator(test)
+
+
+def test_dispatch_to_new_listeners():
+    def test(coordinator):
+        data = {"Relays": {"R01": 1, "R02": 0}}
+        first = Listener(coordinator, ("Relays", "R01"))
+        coordinator.async_set_updated_data(data)
+
+        # A listener added later gets the next snapshot even if its field
+        # didn't change; but only that one.
+        late = Listener(coordinator, ("Relays", "R02"))
+        coordinator.async_set_updated_data(dict(data))
+        assert (first.calls, late.calls) == (1, 1)
+
+        coordinator.async_set_updated_data(dict(data))
+        assert (first.calls, late.calls) == (1, 1)
+
+    run_with_coordinator(test)
+
+
+def test_dispatch_everyone_after_error():
+    def test(coordinator):
+        data = {"Relays": {"R01": 1}}
+        relay = Listener(coordinator, ("Relays", "R01"))
+        coordinator.async_set_updated_data(data)
+
+        coordinator.async_set_update_error(Exception("offline"))
+        assert relay.calls == 2
+
+        # Same data as before the error, but entities must become available
+        coordinator.async_set_updated_data(dict(data))
+        assert relay.calls == 3
+
+    run_with_coordinator(test)
+
+
+def test_merge_partial_sections():
+    def test(coordinator):
+        wsolar = Listener(coordinator, ("Inverter", "wsolar"))
+        relay = Listener(coordinator, ("Relays", "R01"))
+
+        coordinator.async_merge_updated_data({"Inverter": {"wsolar": 1}})
+        coordinator.async_merge_updated_data({"Relays": {"R01": 0}})
+        coordinator.async_merge_updated_data({"Relays": {"R01": 1}})
+
+        # The Relays messages neither removed nor re-notified Inverter
+        assert coordinator.data == {"Inverter": {"wsolar": 1}, "Relays": {"R01": 1}}
+        assert wsolar.calls == 1
+        assert relay.calls == 3
+
+    run_with_coordinator(test)
+
+
+def test_merge_starts_over_after_error():
+    def test(coordinator):
+        coordinator.async_merge_updated_data({"Inverter": {"wsolar": 1}})
+        coordinator.async_set_update_error(Exception("offline"))
+
+        coordinator.async_merge_updated_data({"Relays": {"R01": 1}})
+        assert coordinator.data == {"Relays": {"R01": 1}}
+
+    run_with_coordinator(test)
+
+
+def test_traffic_counters():
+    def test(coordinator):
+        Listener(coordinator, ("Inverter", "wsolar"))
+        coordinator._handle_sse_event(SSEEvent("jsonweb", b'{"wsolar": 1}', None))
+        coordinator._handle_sse_event(SSEEvent("jsonweb", b'{"wsolar": 1', None))
+        assert coordinator._decode_json_body(b'\x00{"Inverter": {}}\r\n0') == {
+            "Inverter": {}
+        }
+        with pytest.raises(ValueError):
+            coordinator._decode_json_body(b"<html>")
+
+        assert coordinator.messages_received == 2
+        assert coordinator.parse_failures == 2
+        assert coordinator.recovered_payloads == 1
+        assert 0 <= coordinator.last_message_age < 1
+
+    run_with_coordinator(test)
+
+
+def test_latency_tracing():
+    def test(coordinator):
+        coordinator.latency = LatencyTracer()
+        Listener(coordinator, ("Inverter", "wsolar"))
+        coordinator._handle_sse_event(SSEEvent("jsonweb", b'{"wsolar": 1}', None))
+        coordinator.async_merge_updated_data({"Inverter": {"wsolar": 2}})
+
+        counts = {
+            stage: histogram.count
+            for stage, histogram in coordinator.latency.stages.items()
+        }
+        assert counts == {
+            "read": 0,
+            "decode": 1,
+            "normalize": 2,
+            "dispatch": 2,
+            "write": 0,
+        }
+
+    run_with_coordinator(test)
+
+
+def test_replay(tmp_path):
+    path = str(tmp_path / "freeds.rec")
+    recorder = StreamRecorder(path)
+    # An event split across two chunks, then websocket and /json payloads
+    recorder.record(SSE_CHUNK, b'event: jsonweb\r\ndata: {"wsolar"', now=10)
+    recorder.record(SSE_CHUNK, b': 1, "R01": 1}\r\n\r\n', now=10)
+    recorder.record(WEBSOCKET_MESSAGE, b'{"Inverter": {"wsolar": 2}}', now=10.1)
+    recorder.record(WEBSOCKET_MESSAGE, b'{"Inverter": ', now=10.2)
+    recorder.record(JSON_BODY, b'{"Inverter": {"wsolar": 3}}', now=10.3)
+    recorder.close()
+
+    async def run():
+        hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        coordinator = FreeDSCoordinator(
+            hass, "freeds.invalid", replay_path=path, replay_speed=0
+        )
+        seen = []
+        coordinator.running = True
+        coordinator.async_add_listener(
+            lambda: seen.append(coordinator.data["Inverter"]["wsolar"]),
+            ("Inverter", "wsolar"),
+        )
+        try:
+            assert await coordinator.query_mode() == "replay"
+            await coordinator.loop_replay()
+        finally:
+            await coordinator.async_shutdown()
+
+        assert seen == [1, 2, 3]
+        # A /json body is a whole snapshot
+        assert coordinator.data == {"Inverter": {"wsolar": 3}}
+        assert coordinator.messages_received == 4
+        assert coordinator.parse_failures == 1
+
+    asyncio.run(run())
+
+
+def test_reconnect_now_cuts_backoff_short():
+    async def run():
+        hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        coordinator = FreeDSCoordinator(hass, "freeds.invalid")
+        coordinator.running = True
+        try:
+            # e.g. an SSE server asking for a minute between reconnections
+            sleep = asyncio.create_task(coordinator._sleep_before_reconnecting(60))
+            await asyncio.sleep(0.01)
+            coordinator.async_reconnect_now()
+            await asyncio.wait_for(sleep, 1)
+        finally:
+            await coordinator.async_shutdown()
+
+    asyncio.run(run())
+
+
+def test_watchdog_marks_stale_data():
+    async def run():
+        hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        coordinator = FreeDSCoordinator(hass, "freeds.invalid", stale_after=0.1)
+        coordinator.running = True
+        try:
+            for _ in range(4):
+                coordinator.async_set_updated_data({"Relays": {"R01": 1}})
+                await asyncio.sleep(0.05)
+            # Data kept arriving: one timer, never fired
+            assert coordinator.last_update_success
+            assert coordinator._watchdog is not None
+
+            await asyncio.sleep(0.2)
+            assert not coordinator.last_update_success
+            assert coordinator.data == {}
+            assert coordinator._watchdog is None
+        finally:
+            await coordinator.async_shutdown()
+
+    asyncio.run(run())
+
+
+def test_aggregate_windows():
+    results = []
+
+    async def run():
+        hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        coordinator = FreeDSCoordinator(hass, "freeds.invalid", aggregation_window=0.05)
+        coordinator.running = True
+        try:
+            remove = coordinator.async_add_aggregate(
+                "Inverter", "wgrid", results.append
+            )
+            for wgrid in (100, 200, 300):
+                coordinator.async_set_updated_data({"Inverter": {"wgrid": wgrid}})
+            await asyncio.sleep(0.08)
+            remove()
+            await asyncio.sleep(0.08)
+        finally:
+            await coordinator.async_shutdown()
+
+    asyncio.run(run())
+    assert len(results) == 1
+    mean, minimum, maximum, samples = results[0]
+    assert (minimum, maximum, samples) == (100, 300, 3)
+    assert 100 <= mean <= 300
+
+
+def run_against_device(routes, test):
+    """Runs test(coordinator) against a local server answering by path
+
+    routes maps paths to raw HTTP responses; other paths get a 404.
+    """
+
+    async def handle(reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            path = request.split(b" ", 2)[1].decode()
+            writer.write(
+                routes.get(
+                    path,
+                    b"HTTP/1.1 404 Not Found\r\nConnection: close\r\n"
+                    b"Content-Length: 0\r\n\r\n",
+                )
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        detected = []
+        hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        coordinator = FreeDSCoordinator(
+            hass,
+            "127.0.0.1",
+            port=port,
+            on_mode_detected=lambda *args: detected.append(args),
+        )
+        async with server:
+            try:
+                await test(coordinator, detected)
+            finally:
+                await coordinator.async_shutdown()
+
+    asyncio.run(run())
+
+
+JSON_OK = (
+    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+    b"Connection: close\r\nContent-Length: 0\r\n\r\n"
+    b'{"Inverter": {"wsolar": 1}}'
+)
+TOGGLE_OK = (
+    b"HTTP/1.1 200 OK\r\nConnection: close\r\nContent-Length: 2\r\n\r\nOK"
+)
+API_COMMON_OK = (
+    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+    b"Connection: close\r\n\r\n"
+    b'{"version": "1.1.0-beta16", "title": "FreeDS (freeds_ab12)"}'
+)
+
+
+def test_poll_soon_wakes_getjson_loop():
+    async def test(coordinator, detected):
+        polled = []
+        coordinator.running = True
+        coordinator.async_add_listener(lambda: polled.append(1), ("Inverter", "wsolar"))
+        # Only poll every minute, unless asked to
+        coordinator.poll_interval.min_interval = 60
+        coordinator.poll_interval.max_interval = 60
+        coordinator._mode = "getjson"
+        coordinator.fleet.startup_window = 0
+        task = asyncio.create_task(coordinator.loop())
+        try:
+            while not polled:
+                await asyncio.sleep(0.01)
+            # A burst of commands: a single extra poll
+            for _ in range(5):
+                coordinator.async_poll_soon()
+            await asyncio.sleep(0.5)
+            assert coordinator.poll_count == 2
+        finally:
+            task.cancel()
+
+    run_against_device({"/json": JSON_OK}, test)
+
+
+def test_commands_over_websocket_fall_back_to_http():
+    class FakeWebsocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send(self, message):
+            self.sent.append(message)
+
+    async def test(coordinator, detected):
+        websocket = FakeWebsocket()
+        coordinator._websocket = websocket
+
+        await coordinator.async_send_toggle_button(2)
+        assert websocket.sent == ['{"command":"tooglebuttons","data":2}']
+        assert coordinator.command_transport == "websocket"
+
+        # Not confirmed by the device: HTTP from now on
+        await coordinator.async_send_toggle_button(2, retry=True)
+        await coordinator.async_send_toggle_button(3)
+        assert len(websocket.sent) == 1
+        assert coordinator.command_transport == "http"
+        assert coordinator.commands_via_websocket == 1
+        assert coordinator.commands_via_http == 2
+
+    run_against_device(
+        {"/tooglebuttons?data=2": TOGGLE_OK, "/tooglebuttons?data=3": TOGGLE_OK},
+        test,
+    )
+
+
+def test_query_mode_prefers_getjson():
+    async def test(coordinator, detected):
+        assert await coordinator.query_mode() == "getjson"
+        assert detected == [("getjson", None)]
+
+    run_against_device({"/json": JSON_OK, "/api/common": API_COMMON_OK}, test)
+
+
+def test_query_mode_websocket_with_firmware_version():
+    async def test(coordinator, detected):
+        assert await coordinator.query_mode() == "websocket"
+        assert detected == [("websocket", "1.1.0-beta16")]
+
+    run_against_device({"/api/common": API_COMMON_OK}, test)
+
+
+def test_query_mode_uses_stored_mode():
+    async def test(coordinator, detected):
+        coordinator._mode = "sse"
+        assert await coordinator.query_mode() == "sse"
+        assert detected == []
+
+    run_against_device({}, test)
+
+
+def test_query_mode_nothing_answers():
+    async def test(coordinator, detected):
+        assert await coordinator.query_mode() is None
+        assert detected == []
+
+    run_against_device({}, test)
@@ -0,0 +1,137 @@
+"""Tests for adding entities once the FreeDS reports their field"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from freeds.coordinator import FreeDSCoordinator
+from freeds.entity import async_add_entities_when_reported
+from freeds.sensor import FreeDSTemperatureSensor
+
+
+class Entity:
+    def __init__(self, json_section, json_field):
+        self.json_section = json_section
+        self.json_field = json_field
+
+    def is_reported(self, value):
+        return value is not None
+
+
+class Probe(Entity):
+    is_reported = FreeDSTemperatureSensor.is_reported
+
+
+def run_with_coordinator(test):
+    async def run():
+        hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        coordinator = FreeDSCoordinator(hass, "freeds.invalid")
+        # Don't start the network loop
+        coordinator.running = True
+        try:
+            test(coordinator)
+        finally:
+            await coordinator.session.close()
+
+    asyncio.run(run())
+
+
+def test_add_reported_fields_only():
+    def test(coordinator):
+        wsolar = Entity("Inverter", "wsolar")
+        wbattery = Entity("Inverter", "wbattery")
+        probe = Probe("Temperatures", "tempCustom")
+        added = []
+        async_add_entities_when_reported(
+            coordinator, [wsolar, wbattery, probe], added.extend
+        )
+        assert added == []
+
+        coordinator.async_set_updated_data(
+            {"Inverter": {"wsolar": 1}, "Temperatures": {"tempCustom": "-127.0"}}
+        )
+        assert added == [wsolar]
+
+        # A field showing up later gets its entity then
+        coordinator.async_set_updated_data(
+            {
+                "Inverter": {"wsolar": 1, "wbattery": 5},
+                "Temperatures": {"tempCustom": "21.5"},
+            }
+        )
+        assert added == [wsolar, wbattery, probe]
+
+    run_with_coordinator(test)
+
+
+def test_add_from_current_data():
+    def test(coordinator):
+        coordinator.async_set_updated_data({"Relays": {"R01": 1}})
+        relay = Entity("Relays", "R01")
+        added = []
+        async_add_entities_when_reported(coordinator, [relay], added.extend)
+
+        assert added == [relay]
+        # Nothing pending: no listener left behind
+        assert not coordinator._listeners
+
+    run_with_coordinator(test)
+
+
+def test_unchanged_sections_not_looked_at_again():
+    def test(coordinator):
+        class Counting(Entity):
+            checks = 0
+
+            def is_reported(self, value):
+                Counting.checks += 1
+                return value is not None
+
+        entity = Counting("Inverter", "wbattery")
+        added = []
+        stop = async_add_entities_when_reported(coordinator, [entity], added.extend)
+
+        inverter = {"wsolar": 1}
+        coordinator.async_set_updated_data({"Inverter": inverter})
+        coordinator.async_set_updated_data({"Inverter": inverter, "Web": {"pwm": 2}})
+        assert Counting.checks == 1
+
+        stop()
+        stop()
+        coordinator.async_set_updated_data({"Inverter": {"wbattery": 5}})
+        assert added == []
+
+    run_with_coordinator(test)
+
+
+def test_descriptions_by_firmware():
+    from freeds.sensor import SENSORS, SENSORS_BY_FIRMWARE
+
+    def fields(sections):
+        return {d.key for descriptions in sections.values() for d in descriptions}
+
+    # 1.0.x doesn't send the battery power
+    assert fields(SENSORS) - fields(SENSORS_BY_FIRMWARE["1.0"]) == {"wbattery"}
+    assert fields(SENSORS_BY_FIRMWARE["2.0"]) == fields(SENSORS)
+
+    for section, descriptions in SENSORS.items():
+        assert all(d.context == (section, d.key) for d in descriptions)
+
+
+def test_entities_share_descriptions():
+    from freeds.sensor import SENSORS, FreeDSNumericSensor
+
+    description = SENSORS["Inverter"][0]
+    coordinator = SimpleNamespace(async_add_listener=None)
+    first, second = (
+        FreeDSNumericSensor(description, freeds_id=freeds_id, coordinator=coordinator)
+        for freeds_id in ("ab12", "cd34")
+    )
+
+    assert first.entity_description is second.entity_description
+    assert (first.unique_id, second.unique_id) == ("ab12_wsolar", "cd34_wsolar")
+    assert (first.name, first.native_unit_of_measurement) == ("Solar Power", "W")
+    assert (first.json_section, first.json_field) == ("Inverter", "wsolar")
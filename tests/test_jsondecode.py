@@ -0,0 +1,23 @@
+"""Tests for the JSON decoders"""
+
+import pytest
+
+from freeds.jsondecode import DECODERS, loads
+from freeds.sse import SSEParser
+
+
+@pytest.mark.parametrize("name", sorted(DECODERS))
+@pytest.mark.parametrize("kind", [bytes, bytearray, memoryview, bytes.decode])
+def test_decoders_take_any_buffer(name, kind):
+    assert DECODERS[name](kind(b'{"wsolar": 1200.5}')) == {"wsolar": 1200.5}
+
+
+@pytest.mark.parametrize("name", sorted(DECODERS))
+def test_decoders_raise_value_error(name):
+    with pytest.raises(ValueError):
+        DECODERS[name](memoryview(b'{"wsolar":'))
+
+
+def test_sse_event_data_decodes_as_is():
+    (event,) = SSEParser().feed(b'event: jsonweb\ndata: {"wsolar":1}\n\n')
+    assert loads(event.data) == {"wsolar": 1}
@@ -0,0 +1,46 @@
+"""Tests for the per-stage latency histograms"""
+
+import pytest
+
+from freeds.latency import STAGES, LatencyHistogram, LatencyTracer
+
+
+def test_percentiles():
+    histogram = LatencyHistogram()
+    for _ in range(90):
+        histogram.add(0.001)
+    for _ in range(9):
+        histogram.add(0.010)
+    histogram.add(0.5)
+
+    # Bucket bounds overestimate by less than a quarter octave
+    assert 0.001 <= histogram.percentile(50) < 0.001 * 1.19
+    assert 0.010 <= histogram.percentile(95) < 0.010 * 1.19
+    assert 0.010 <= histogram.percentile(99) < 0.010 * 1.19
+    assert histogram.percentile(100) == 0.5
+    assert histogram.count == 100
+    assert histogram.total == pytest.approx(0.68)
+
+
+def test_out_of_range_latencies():
+    histogram = LatencyHistogram()
+    histogram.add(0)
+    assert histogram.percentile(50) == 0
+    histogram.add(1000)
+    assert histogram.percentile(100) == 1000
+    assert len(histogram.counts) == 96
+
+
+def test_tracer_report_and_clear():
+    tracer = LatencyTracer()
+    assert tracer.report() == {stage: {"count": 0} for stage in STAGES}
+
+    start = tracer.lap("decode", 0)
+    assert start > 0
+    report = tracer.report()["decode"]
+    assert report["count"] == 1
+    assert set(report) == {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"}
+
+    tracer.clear()
+    assert tracer.report()["decode"] == {"count": 0}
+    assert tracer.stages["decode"].percentile(50) is None
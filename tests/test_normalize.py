@@ -0,0 +1,70 @@
+"""Tests for the normalization of transport payloads into snapshots"""
+
+from freeds.const import SSE_FIELDS_1_0
+from freeds.normalize import SnapshotNormalizer
+
+
+def event(**fields):
+    payload = {
+        key: 0 for section in SSE_FIELDS_1_0.values() for key in section.values()
+    }
+    payload.update(fields)
+    return payload
+
+
+def test_flat_event_is_sectioned():
+    data = SnapshotNormalizer().flat(event(wversion=9, wsolar=1200, R02=1), {})
+    assert set(data) == set(SSE_FIELDS_1_0)
+    assert data["Web"]["workingMode"] == 9
+    assert "wversion" not in data["Web"]
+    assert data["Inverter"]["wsolar"] == 1200
+    assert data["Relays"]["R02"] == 1
+
+
+def test_missing_fields_are_none():
+    data = SnapshotNormalizer().flat({"wsolar": 1200}, {})
+    assert data["Inverter"]["wsolar"] == 1200
+    assert data["Inverter"]["wgrid"] is None
+    assert data["Web"]["workingMode"] is None
+
+
+def test_flat_reuses_unchanged_sections():
+    normalizer = SnapshotNormalizer()
+    first = normalizer.flat(event(wsolar=1200), {})
+    second = normalizer.flat(event(wsolar=1300), first)
+
+    assert second["Inverter"] is not first["Inverter"]
+    assert second["Inverter"]["wsolar"] == 1300
+    for section in set(SSE_FIELDS_1_0) - {"Inverter"}:
+        assert second[section] is first[section]
+
+
+def test_flat_static_event_returns_previous_snapshot():
+    normalizer = SnapshotNormalizer()
+    first = normalizer.flat(event(wsolar=1200), {})
+    assert normalizer.flat(event(wsolar=1200), first) is first
+
+
+def test_flat_after_data_was_reset():
+    # After an error the coordinator's data is {}: nothing can be reused
+    normalizer = SnapshotNormalizer()
+    normalizer.flat(event(wsolar=1200), {})
+    data = normalizer.flat(event(wsolar=1200), {})
+    assert data["Inverter"]["wsolar"] == 1200
+
+
+def test_single_field_section():
+    normalizer = SnapshotNormalizer({"Web": {"workingMode": "wversion"}})
+    assert normalizer.flat({"wversion": 3}, {}) == {"Web": {"workingMode": 3}}
+
+
+def test_sectioned_reuses_unchanged_sections():
+    normalizer = SnapshotNormalizer()
+    first = normalizer.sectioned(
+        {"Inverter": {"wsolar": 1200}, "Relays": {"R01": 0}}, {}
+    )
+    second = normalizer.sectioned(
+        {"Inverter": {"wsolar": 1300}, "Relays": {"R01": 0}}, first
+    )
+    assert second["Relays"] is first["Relays"]
+    assert second["Inverter"] == {"wsolar": 1300}
@@ -0,0 +1,81 @@
+"""Tests for the profiling of the FreeDS tasks"""
+
+import asyncio
+import cProfile
+import pstats
+import tracemalloc
+from types import SimpleNamespace
+
+from freeds.profiling import ProfiledCoroutine, write_profile
+
+
+def freeds_work():
+    return [str(i) for i in range(100)]
+
+
+def other_work():
+    return [str(i) for i in range(100)]
+
+
+def profiled_functions(profiler):
+    return {name for _, _, name in pstats.Stats(profiler).stats}
+
+
+def test_only_the_wrapped_task_is_profiled():
+    owner = SimpleNamespace(profiler=None)
+
+    async def freeds_loop():
+        for _ in range(3):
+            freeds_work()
+            await asyncio.sleep(0)
+        return "done"
+
+    async def other_loop():
+        for _ in range(3):
+            other_work()
+            await asyncio.sleep(0)
+
+    async def run():
+        owner.profiler = cProfile.Profile()
+        task = asyncio.create_task(ProfiledCoroutine(freeds_loop(), owner))
+        await asyncio.gather(task, other_loop())
+        return task.result()
+
+    assert asyncio.run(run()) == "done"
+    functions = profiled_functions(owner.profiler)
+    assert "freeds_work" in functions
+    assert "other_work" not in functions
+
+
+def test_not_profiling():
+    owner = SimpleNamespace(profiler=None)
+
+    async def loop():
+        await asyncio.sleep(0)
+        return freeds_work()
+
+    async def run():
+        return await asyncio.create_task(ProfiledCoroutine(loop(), owner))
+
+    assert len(asyncio.run(run())) == 100
+
+
+def test_write_profile(tmp_path):
+    profiler = cProfile.Profile()
+    tracemalloc.start(5)
+    try:
+        before = tracemalloc.take_snapshot()
+        profiler.enable()
+        kept = freeds_work()
+        profiler.disable()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    write_profile(
+        profiler, before, after, tmp_path / "p.pstats", tmp_path / "alloc.txt"
+    )
+    assert "freeds_work" in profiled_functions(str(tmp_path / "p.pstats"))
+    # This test isn't FreeDS code: nothing to report
+    assert (tmp_path / "alloc.txt").read_text().startswith("Memory allocated")
+    assert kept
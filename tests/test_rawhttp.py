@@ -0,0 +1,139 @@
+"""Tests for the tolerant /json HTTP client"""
+
+import asyncio
+import json
+
+import pytest
+
+from freeds.rawhttp import HTTPProtocolError, RawHTTPClient, decode_json_body
+
+BODY = json.dumps({"Inverter": {"wsolar": 1234}}).encode()
+
+
+def run_against(responses, test):
+    """Runs test(client) against a server answering the given raw responses
+
+    Each accepted connection answers one request per item of the (shared)
+    list of responses, until a response contains "Connection: close".
+    """
+    responses = list(responses)
+    requests = []
+
+    async def handle(reader, writer):
+        try:
+            while responses:
+                requests.append(await reader.readuntil(b"\r\n\r\n"))
+                response = responses.pop(0)
+                writer.write(response)
+                await writer.drain()
+                if b"Connection: close" in response:
+                    break
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = RawHTTPClient("127.0.0.1", port, headers={"Authorization": "Basic x"})
+        async with server:
+            try:
+                await test(client)
+            finally:
+                await client.close()
+
+    asyncio.run(run())
+    return requests
+
+
+def test_compliant_response():
+    response = (
+        b"HTTP/1.1 200 OK\r\nConnection: close\r\n"
+        b"Content-Length: %d\r\n\r\n" % len(BODY) + BODY
+    )
+
+    async def test(client):
+        result = await client.get("/json")
+        assert result.status == 200
+        assert result.body == BODY
+        assert not result.reused
+
+    requests = run_against([response], test)
+    assert requests[0].startswith(b"GET /json HTTP/1.1\r\n")
+    assert b"Connection: close\r\n" in requests[0]
+    assert b"Authorization: Basic x\r\n" in requests[0]
+
+
+def test_data_after_connection_close():
+    # As sent by firmwares 1.1.0021 and 2.0.0
+    response = (
+        b"HTTP/1.1 200 OK\r\nConnection: close\r\nContent-Length: 0\r\n\r\n" + BODY
+    )
+
+    async def test(client):
+        result = await client.get("/json")
+        assert result.status == 200
+        assert decode_json_body(result.body) == {"Inverter": {"wsolar": 1234}}
+
+    run_against([response], test)
+
+
+def test_keepalive_reuses_connection():
+    response = b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(BODY) + BODY
+
+    async def test(client):
+        for i in range(3):
+            result = await client.get("/json", keepalive=True)
+            assert result.body == BODY
+            assert result.reused == (i > 0)
+        assert client.connection_setups == 1
+
+    run_against([response] * 3, test)
+
+
+def test_keepalive_chunked():
+    response = (
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        b"%x\r\n%s\r\n" % (len(BODY[:10]), BODY[:10])
+        + b"%x;ext=1\r\n%s\r\n" % (len(BODY[10:]), BODY[10:])
+        + b"0\r\nX-Trailer: 1\r\n\r\n"
+    )
+
+    async def test(client):
+        assert (await client.get("/json", keepalive=True)).body == BODY
+        assert (await client.get("/json", keepalive=True)).reused
+
+    run_against([response] * 2, test)
+
+
+def test_server_closing_keepalive_connection():
+    # The device ignores the keep-alive request
+    response = (
+        b"HTTP/1.1 200 OK\r\nConnection: close\r\n"
+        b"Content-Length: %d\r\n\r\n" % len(BODY) + BODY
+    )
+
+    async def test(client):
+        await client.get("/json", keepalive=True)
+        result = await client.get("/json", keepalive=True)
+        assert not result.reused
+        assert client.connection_setups == 2
+
+    run_against([response] * 2, test)
+
+
+def test_garbage_instead_of_status_line():
+    async def test(client):
+        with pytest.raises(HTTPProtocolError):
+            await client.get("/json")
+
+    run_against([b"{garbage}\r\n\r\nConnection: close"], test)
+
+
+def test_decode_json_body_with_garbage():
+    assert decode_json_body(b'\x00\r\n{"a": 1}\r\n\x00') == {"a": 1}
+    assert decode_json_body(b'{"a": 1}') == {"a": 1}
+
+    with pytest.raises(ValueError):
+        decode_json_body(b"no json here")
@@ -0,0 +1,62 @@
+"""Tests for the raw data recordings"""
+
+import os
+
+import pytest
+
+from freeds.recording import (
+    JSON_BODY,
+    MAGIC,
+    SSE_CHUNK,
+    WEBSOCKET_MESSAGE,
+    StreamRecorder,
+    read_records,
+)
+
+
+def test_record_and_read_back(tmp_path):
+    path = str(tmp_path / "freeds.rec")
+    recorder = StreamRecorder(path)
+    recorder.record(SSE_CHUNK, b"event: jsonweb\r\n", now=1.5)
+    recorder.record(WEBSOCKET_MESSAGE, b'{"Web": {}}', now=2.0)
+    recorder.close()
+
+    # Appends to an existing recording
+    recorder = StreamRecorder(path)
+    recorder.record(JSON_BODY, b"", now=3.25)
+    recorder.close()
+
+    assert list(read_records(path)) == [
+        (1.5, SSE_CHUNK, b"event: jsonweb\r\n"),
+        (2.0, WEBSOCKET_MESSAGE, b'{"Web": {}}'),
+        (3.25, JSON_BODY, b""),
+    ]
+
+
+def test_rotation(tmp_path):
+    path = str(tmp_path / "freeds.rec")
+    recorder = StreamRecorder(path, max_bytes=len(MAGIC) + 2 * (13 + 10), backups=2)
+    for i in range(7):
+        recorder.record(JSON_BODY, b"%010d" % i, now=i)
+    recorder.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["freeds.rec", "freeds.rec.1", "freeds.rec.2"]
+    assert [t for t, _, _ in read_records(path)] == [6]
+    assert [t for t, _, _ in read_records(path + ".1")] == [4, 5]
+    assert [t for t, _, _ in read_records(path + ".2")] == [2, 3]
+
+
+def test_truncated_and_invalid_recordings(tmp_path):
+    path = str(tmp_path / "freeds.rec")
+    recorder = StreamRecorder(path)
+    recorder.record(JSON_BODY, b"{}", now=1)
+    recorder.record(JSON_BODY, b"{}", now=2)
+    recorder.close()
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 1)
+    assert [t for t, _, _ in read_records(path)] == [1]
+
+    with open(path, "wb") as file:
+        file.write(b"HTTP/1.1 200 OK\r\n")
+    with pytest.raises(ValueError):
+        list(read_records(path))
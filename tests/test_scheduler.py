@@ -0,0 +1,132 @@
+"""Tests for the adaptive /json polling interval"""
+
+import asyncio
+
+from freeds.scheduler import AdaptivePollInterval, FleetScheduler, ReconnectBackoff
+
+
+def snapshot(wsolar=0, wgrid=0, pwm=0, relay=0):
+    return {
+        "Inverter": {"wsolar": wsolar, "wgrid": wgrid},
+        "Web": {"pwm": pwm, "POn": 1, "PwmMan": 0},
+        "Relays": {"R01": relay, "R02": 0, "R03": 0, "R04": 0},
+    }
+
+
+def test_backs_off_while_static():
+    interval = AdaptivePollInterval(1, 30, 50)
+    assert interval.update(snapshot()) == 1
+
+    delays = [interval.update(snapshot()) for _ in range(20)]
+    assert delays == sorted(delays)
+    assert delays[0] > 1
+    assert delays[-1] == 30
+
+
+def test_fast_when_power_moves():
+    interval = AdaptivePollInterval(1, 30, 50)
+    for _ in range(10):
+        interval.update(snapshot(wsolar=1000))
+    assert interval.interval > 1
+
+    # Small jitter keeps backing off, a big change polls fast again
+    assert interval.update(snapshot(wsolar=1020)) > 1
+    assert interval.update(snapshot(wsolar=1100)) == 1
+    assert interval.update(snapshot(wsolar=1100, wgrid="-75.5")) == 1
+
+
+def test_fast_when_pwm_or_relay_changes():
+    interval = AdaptivePollInterval(2, 60, 50)
+    interval.update(snapshot())
+    interval.update(snapshot())
+    assert interval.update(snapshot(pwm=10)) == 2
+
+    interval.update(snapshot(pwm=10))
+    assert interval.update(snapshot(pwm=10, relay=1)) == 2
+
+
+def test_poke_and_failures():
+    interval = AdaptivePollInterval(1, 10, 50)
+    interval.update(snapshot())
+    for _ in range(10):
+        interval.failed()
+    assert interval.interval == 10
+
+    interval.poke()
+    assert interval.interval == 1
+
+
+def test_missing_fields_are_ignored():
+    interval = AdaptivePollInterval(1, 30, 50)
+    interval.update({"Relays": {}})
+    assert interval.update({"Relays": {}}) > 1
+
+
+def test_fleet_phases_are_stable_and_spread():
+    fleet = FleetScheduler()
+    keys = [f"192.168.1.{i}:80" for i in range(40)]
+    phases = [fleet.phase(key) for key in keys]
+
+    assert phases == [fleet.phase(key) for key in keys]
+    assert all(0 <= phase < 1 for phase in phases)
+    # 40 devices don't all land in the same tenth of the window
+    assert len({int(phase * 10) for phase in phases}) > 5
+
+    delays = [fleet.startup_delay(key) for key in keys]
+    assert all(0 <= delay < fleet.startup_window for delay in delays)
+
+
+def test_fleet_delay_bounds():
+    fleet = FleetScheduler(spread=0.1, jitter=0.1)
+    delays = {fleet.delay("freeds.local:80", 10) for _ in range(100)}
+
+    assert all(8 <= delay <= 12 for delay in delays)
+    assert len(delays) > 1
+
+
+def test_fleet_caps_connection_attempts():
+    fleet = FleetScheduler(max_connecting=2)
+    in_flight = 0
+    peak = 0
+
+    async def connect():
+        nonlocal in_flight, peak
+        async with fleet.connecting():
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    async def run():
+        await asyncio.gather(*(connect() for _ in range(10)))
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_backoff_first_retry_is_immediate():
+    backoff = ReconnectBackoff(base=1, cap=60)
+    assert backoff.failed(0) == 0
+
+
+def test_backoff_is_capped_with_full_jitter():
+    backoff = ReconnectBackoff(base=1, cap=60)
+    backoff.failed(0)
+    limits = [1, 2, 4, 8, 16, 32] + [60] * 20
+    delays = [backoff.failed(0) for _ in limits]
+    assert all(0 <= delay <= limit for delay, limit in zip(delays, limits))
+    # Jitter: not all of the capped delays are the same
+    assert len(set(delays[6:])) > 1
+
+
+def test_backoff_resets_and_measures_recovery():
+    backoff = ReconnectBackoff()
+    backoff.succeeded(5)
+    assert backoff.recovery_time is None
+
+    backoff.failed(10)
+    backoff.failed(12)
+    backoff.succeeded(40)
+    assert backoff.recovery_time == 30
+    assert backoff.recoveries == 1
+    assert backoff.failed(50) == 0
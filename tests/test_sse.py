@@ -0,0 +1,144 @@
+"""Tests for the incremental EventSource parser"""
+
+from freeds.sse import SSEParser
+
+
+def feed_bytewise(parser, stream):
+    events = []
+    for i in range(len(stream)):
+        events += parser.feed(stream[i : i + 1])
+    return events
+
+
+def test_single_event():
+    parser = SSEParser()
+    events = parser.feed(b'event: jsonweb\r\ndata: {"wsolar":1}\r\n\r\n')
+
+    assert len(events) == 1
+    assert events[0].event == "jsonweb"
+    assert events[0].data == b'{"wsolar":1}'
+
+
+def test_event_split_across_reads():
+    parser = SSEParser()
+    assert parser.feed(b"event: jsonweb\r\nda") == []
+    assert parser.feed(b"ta: {}\r\n") == []
+    events = parser.feed(b"\r\n")
+
+    assert [(e.event, e.data) for e in events] == [("jsonweb", b"{}")]
+
+
+def test_several_events_in_one_read():
+    parser = SSEParser()
+    events = parser.feed(b"data: 1\n\ndata: 2\n\nevent: uptime\ndata: 3\n\n")
+
+    assert [(e.event, e.data) for e in events] == [
+        ("message", b"1"),
+        ("message", b"2"),
+        ("uptime", b"3"),
+    ]
+
+
+def test_crlf_split_between_reads():
+    # A CR at the end of one read and the LF at the start of the next one are
+    # a single line terminator, not a line terminator plus an empty line.
+    parser = SSEParser()
+    assert parser.feed(b"data: a\r") == []
+    assert parser.feed(b"\ndata: b\r") == []
+    events = parser.feed(b"\n\r\n")
+
+    assert [e.data for e in events] == [b"a\nb"]
+
+
+def test_lone_cr_line_endings():
+    parser = SSEParser()
+    events = parser.feed(b"data: a\rdata: b\r\r")
+
+    assert [e.data for e in events] == [b"a\nb"]
+
+
+def test_multiline_data():
+    parser = SSEParser()
+    events = parser.feed(b"data: {\ndata:  \"a\": 1\ndata\ndata: }\n\n")
+
+    # Only the first space after the colon is stripped; a "data" line without
+    # a colon adds an empty line.
+    assert [e.data for e in events] == [b'{\n "a": 1\n\n}']
+
+
+def test_id_field():
+    parser = SSEParser()
+    events = parser.feed(b"id: 42\ndata: a\n\ndata: b\n\n")
+
+    assert [e.id for e in events] == ["42", "42"]
+    assert parser.last_event_id == "42"
+
+
+def test_id_with_nul_is_ignored():
+    parser = SSEParser()
+    events = parser.feed(b"id: 1\n\nid: 2\x003\ndata: a\n\n")
+
+    assert [e.id for e in events] == ["1"]
+    assert parser.last_event_id == "1"
+
+
+def test_retry_field():
+    parser = SSEParser()
+    parser.feed(b"retry: 3000\n\n")
+    assert parser.retry == 3000
+
+    # Non-numeric values are ignored, keeping the previous one
+    parser.feed(b"retry: soon\nretry: 12.5\nretry: -1\n\n")
+    assert parser.retry == 3000
+
+
+def test_comments():
+    parser = SSEParser()
+    events = parser.feed(b": heartbeat\n:\ndata: a\n: in the middle\n\n")
+
+    assert [e.data for e in events] == [b"a"]
+    assert parser.comments == 3
+
+
+def test_empty_events_are_not_dispatched():
+    parser = SSEParser()
+    assert parser.feed(b"event: jsonweb\n\n\n\n") == []
+
+    # The event type doesn't leak into the next event
+    events = parser.feed(b"data: a\n\n")
+    assert [e.event for e in events] == ["message"]
+
+
+def test_unknown_fields_are_ignored():
+    parser = SSEParser()
+    events = parser.feed(b"foo: bar\ndata: a\n\n")
+
+    assert [e.data for e in events] == [b"a"]
+
+
+def test_bytewise_feed_matches_whole_feed():
+    stream = (
+        b": hello\r\nid: 7\r\nretry: 1500\nevent: jsonweb\r"
+        b'data: {"a":\r\ndata: 1}\r\n\r\ndata: x\n\n'
+    )
+    whole = SSEParser().feed(stream)
+    parser = SSEParser()
+    bytewise = feed_bytewise(parser, stream)
+
+    assert [(e.event, e.data, e.id) for e in bytewise] == [
+        (e.event, e.data, e.id) for e in whole
+    ]
+    assert len(whole) == 2
+    assert parser.retry == 1500
+    assert parser.comments == 1
+
+
+def test_reset_keeps_id_and_retry():
+    parser = SSEParser()
+    parser.feed(b"id: 5\nretry: 2000\ndata: a\n\ndata: partial")
+    parser.reset()
+
+    assert parser.last_event_id == "5"
+    assert parser.retry == 2000
+    # The partial event from before the reset is gone
+    assert [e.data for e in parser.feed(b"data: b\n\n")] == [b"b"]
@@ -0,0 +1,81 @@
+"""Tests for the sensor state write filter"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from freeds.throttle import WriteFilter, parse_deadband
+
+
+def test_parse_deadband():
+    assert parse_deadband("5") == (5.0, False)
+    assert parse_deadband(" 2.5 %") == (2.5, True)
+    assert parse_deadband(0) == (0.0, False)
+    for text in ("", "%", "five", "-1"):
+        with pytest.raises(ValueError):
+            parse_deadband(text)
+
+
+def test_first_value_is_written():
+    assert WriteFilter(5).check(1000, 0) == 0
+
+
+def test_absolute_deadband():
+    write_filter = WriteFilter(5)
+    write_filter.written(1000, 0)
+    assert write_filter.check(1000, 1) is None
+    assert write_filter.check(1004, 1) is None
+    assert write_filter.check(996, 1) is None
+    assert write_filter.check(1006, 1) == 0
+
+
+def test_relative_deadband():
+    write_filter = WriteFilter(2, relative=True)
+    write_filter.written(230, 0)
+    assert write_filter.check(233, 1) is None
+    assert write_filter.check(235, 1) == 0
+
+
+def test_heartbeat_after_max_interval():
+    write_filter = WriteFilter(5, max_interval=300)
+    write_filter.written(1000, 0)
+    assert write_filter.check(1001, 299) is None
+    assert write_filter.check(1001, 300) == 0
+    # An unchanged value is never worth a write
+    assert write_filter.check(1000, 1000) is None
+
+
+def test_min_interval_delays_writes():
+    write_filter = WriteFilter(5, min_interval=10)
+    write_filter.written(1000, 0)
+    assert write_filter.check(2000, 4) == 6
+    assert write_filter.check(2000, 10) == 0
+
+
+def test_sensor_writes_only_significant_changes():
+    from freeds.sensor import FreeDSNumericSensor, FreeDSSensorEntityDescription
+
+    async def run():
+        coordinator = SimpleNamespace(
+            data={}, last_update_success=True, async_add_listener=None
+        )
+        sensor = FreeDSNumericSensor(
+            FreeDSSensorEntityDescription(key="wgrid", json_section="Inverter"),
+            coordinator=coordinator,
+        )
+        sensor.hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        sensor.write_filter = WriteFilter(5, min_interval=0.05)
+        writes = []
+        sensor.async_write_ha_state = lambda: writes.append(sensor.native_value)
+
+        for wgrid in (1000, 1002, 998, 1010, 1020):
+            coordinator.data = {"Inverter": {"wgrid": wgrid}}
+            sensor._handle_coordinator_update()
+
+        # 1010 is significant, but too soon after 1000: 1020 is written later
+        assert writes == [1000]
+        await asyncio.sleep(0.1)
+        assert writes == [1000, 1020]
+
+    asyncio.run(run())